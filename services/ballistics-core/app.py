@@ -1,17 +1,39 @@
 from __future__ import annotations
 
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
 try:
-    from fastapi import FastAPI, HTTPException
+    from fastapi import FastAPI, Header, HTTPException
+    from fastapi.responses import Response, StreamingResponse
 except ModuleNotFoundError:  # pragma: no cover - fallback for constrained environments
     class HTTPException(Exception):
-        def __init__(self, status_code: int, detail: str):
+        def __init__(self, status_code: int, detail: str, headers=None):
             super().__init__(detail)
             self.status_code = status_code
             self.detail = detail
+            self.headers = headers
+
+    def Header(default=None, **_kwargs):  # noqa: N802 - mirrors fastapi.Header
+        return default
+
+    class Response:
+        def __init__(self, content: bytes = b"", status_code: int = 200, headers=None, media_type=None):
+            self.body = content
+            self.status_code = status_code
+            self.headers = dict(headers or {})
+            self.media_type = media_type
+
+    class StreamingResponse:
+        def __init__(self, content, media_type: str | None = None):
+            self.body_iterator = content
+            self.media_type = media_type
 
     class FastAPI:  # minimal fallback for local runtime without external deps
-        def __init__(self, title: str):
+        def __init__(self, title: str, lifespan=None):
             self.title = title
+            self.lifespan = lifespan
 
         def get(self, _path: str):
             def decorator(func):
@@ -25,71 +47,284 @@ except ModuleNotFoundError:  # pragma: no cover - fallback for constrained envir
 
             return decorator
 
+        def delete(self, _path: str):
+            def decorator(func):
+                return func
+
+            return decorator
+
+from ballistics import metrics, offload, profiling, warmup
+from ballistics.batch import fill_batch_altitudes, solve_fire_mission_batch
 from ballistics.corrections import apply_correction
-from ballistics.logging_setup import configure_logger
-from ballistics.models import CorrectionRequest, FireMissionRequest, TriangulationRequest
-from ballistics.protocol import save_protocol
-from ballistics.solver import solve_fire_mission
+from ballistics.coverage import coverage_cache, get_coverage, stream_coverage
+from ballistics.logging_setup import configure_logger, shutdown_logging
+from ballistics.models import (
+    BatchFireMissionRequest,
+    CorrectionRequest,
+    CoverageRequest,
+    FireMissionRequest,
+    TriangulationPoint,
+    TriangulationRequest,
+)
+from ballistics.protocol import (
+    DEFAULT_PAGE_SIZE,
+    export_protocols,
+    query_protocols,
+    save_protocol,
+    shutdown_protocols,
+)
+from ballistics.offload import PoolSaturated, PoolTimeout
+from ballistics.protocol_writer import ProtocolQueueFull
+from ballistics.solution_cache import solution_cache
+from ballistics.solver import fill_altitudes, solve_fire_mission
+from ballistics.table_service import TABLE_FORMATS, etag_matches, load_encoded_table
 from ballistics.triangulation import triangulate
+from ballistics.triangulation_sessions import sessions as triangulation_sessions
 
-app = FastAPI(title="Ballistics Core API")
 logger = configure_logger()
 
 
+@asynccontextmanager
+async def lifespan(_app):
+    if profiling.is_enabled():
+        profiling.install_signal_handler()
+    # Workers forked by ballistics.serve start warm; otherwise /ready reports 503 until this is done.
+    warmup.warm_in_background()
+    offload.start_pools()
+    yield
+    offload.shutdown_pools()
+    if not shutdown_protocols():
+        logger.error("Protocol writer did not drain before shutdown")
+    shutdown_logging()
+
+
+app = FastAPI(title="Ballistics Core API", lifespan=lifespan)
+
+
+def _record_protocol(
+    mission_id: str, operation: str, input_data: dict, result_data: dict, started: float | None = None
+) -> str:
+    try:
+        protocol = save_protocol(
+            mission_id=mission_id,
+            operation=operation,
+            input_data=input_data,
+            result_data=result_data,
+        )
+    except ProtocolQueueFull as exc:
+        logger.error("Protocol queue is full, rejecting %s for mission %s", operation, mission_id)
+        raise HTTPException(status_code=503, detail="protocol queue is full") from exc
+    metrics.operations_total.inc(operation=operation)
+    duration_ms = round((time.perf_counter() - started) * 1000, 3) if started is not None else None
+    logger.info(
+        "%s completed for mission %s",
+        operation,
+        mission_id,
+        extra={"mission_id": mission_id, "operation": operation, "duration_ms": duration_ms},
+    )
+    return protocol.protocol_id
+
+
+async def _record_offloaded(mission_id: str, operation: str, req, result, started: float) -> str:
+    # Serializing and enqueueing (which blocks under the "block" policy) stay off the event loop.
+    return await asyncio.to_thread(
+        profiling.call,
+        lambda: _record_protocol(
+            mission_id, operation, req.model_dump(mode="json"), result.model_dump(mode="json"), started
+        ),
+    )
+
+
+def _overloaded(exc: PoolSaturated | PoolTimeout) -> HTTPException:
+    logger.warning("Rejected under load: %s", exc)
+    if isinstance(exc, PoolTimeout):
+        return HTTPException(status_code=504, detail=str(exc))
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+
+
 @app.get("/")
 def root():
     return {"service": "ballistics-core", "status": "ok"}
 
 
+@app.get("/ready")
+def ready_endpoint():
+    state = warmup.readiness()
+    if state["status"] != "ready":
+        raise HTTPException(status_code=503, detail=f"ballistics-core is {state['status']}")
+    return state
+
+
 @app.get("/favicon.ico")
 def favicon():
     return {"favicon": "not-configured"}
 
 
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(content=metrics.render().encode("utf-8"), media_type=metrics.CONTENT_TYPE)
+
+
+def _require_profiling() -> None:
+    if not profiling.is_enabled():
+        raise HTTPException(status_code=404, detail=f"profiling is disabled, set {profiling.ENABLE_ENV}=1")
+
+
+@app.post("/admin/profile")
+def profile_start_endpoint(requests: int | None = None, seconds: float | None = None):
+    _require_profiling()
+    try:
+        return profiling.start(requests=requests, seconds=seconds)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+
+@app.get("/admin/profile")
+def profile_status_endpoint():
+    _require_profiling()
+    return profiling.status()
+
+
+@app.delete("/admin/profile")
+def profile_stop_endpoint():
+    _require_profiling()
+    result = profiling.stop()
+    if result is None:
+        raise HTTPException(status_code=404, detail="no profile is running")
+    return result
+
+
+@app.get("/tables")
+@metrics.instrument_endpoint("GET /tables")
+def table_endpoint(path: str, format: str = "json", if_none_match: str | None = Header(default=None)):
+    if format not in TABLE_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be json or binary")
+    try:
+        table = load_encoded_table(path)
+        body = table.body(format)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception as exc:  # pragma: no cover - defensive API guard
+        logger.exception("Unexpected error while loading table %s", path)
+        raise HTTPException(status_code=500, detail="internal server error") from exc
+
+    etag = table.etag(format)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    media_type = "application/octet-stream" if format == "binary" else "application/json"
+    return Response(content=body, headers=headers, media_type=media_type)
+
+
 @app.post("/solve-fire-mission")
-def solve_fire_mission_endpoint(req: FireMissionRequest):
+@metrics.instrument_endpoint("POST /solve-fire-mission")
+async def solve_fire_mission_endpoint(req: FireMissionRequest):
+    started = time.perf_counter()
     try:
-        result = solve_fire_mission(req)
+        # Filled in once, here: the cache key and the protocol both need the altitudes the solution used.
+        req = fill_altitudes(req)
+        # Requests in one solution cache bucket get the same answer, so concurrent ones share a solve;
+        # each still gets its own range and azimuth.
+        result = await offload.run("solve", solve_fire_mission, req, key=("solve", solution_cache.key(req)))
+        result = solution_cache.with_request_geometry(req, result)
+    except (PoolSaturated, PoolTimeout) as exc:
+        raise _overloaded(exc) from exc
     except FileNotFoundError as exc:
         logger.error("Fire mission failed due to missing data: %s", exc)
         raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except ValueError as exc:
+        logger.error("Fire mission validation error: %s", exc)
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     except Exception as exc:  # pragma: no cover - defensive API guard
         logger.exception("Unexpected error during fire mission solving")
         raise HTTPException(status_code=500, detail="internal server error") from exc
 
-    protocol = save_protocol(
-        mission_id=req.mission_id,
-        operation="solve-fire-mission",
-        input_data=req.model_dump(mode="json"),
-        result_data=result.model_dump(mode="json"),
-    )
-    return {"solution": result, "protocol_id": protocol.protocol_id}
+    protocol_id = await _record_offloaded(req.mission_id, "solve-fire-mission", req, result, started)
+    return {"solution": result, "protocol_id": protocol_id}
+
+
+@app.post("/solve-fire-mission/batch")
+@metrics.instrument_endpoint("POST /solve-fire-mission/batch")
+async def solve_fire_mission_batch_endpoint(req: BatchFireMissionRequest):
+    started = time.perf_counter()
+    try:
+        req = fill_batch_altitudes(req)
+        result = await offload.run("solve", solve_fire_mission_batch, req)
+    except (PoolSaturated, PoolTimeout) as exc:
+        raise _overloaded(exc) from exc
+    except FileNotFoundError as exc:
+        logger.error("Batch fire mission failed due to missing data: %s", exc)
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except ValueError as exc:
+        logger.error("Batch fire mission validation error: %s", exc)
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception as exc:  # pragma: no cover - defensive API guard
+        logger.exception("Unexpected error during batch fire mission solving")
+        raise HTTPException(status_code=500, detail="internal server error") from exc
+
+    protocol_id = await _record_offloaded(req.mission_id, "solve-fire-mission-batch", req, result, started)
+    return {"result": result, "protocol_id": protocol_id}
+
+
+@app.post("/coverage")
+@metrics.instrument_endpoint("POST /coverage")
+async def coverage_endpoint(req: CoverageRequest):
+    try:
+        raster = await offload.run("coverage", get_coverage, req, key=("coverage", coverage_cache.key(req)))
+        lines = stream_coverage(raster, req.tile_size)
+    except (PoolSaturated, PoolTimeout) as exc:
+        raise _overloaded(exc) from exc
+    except FileNotFoundError as exc:
+        logger.error("Coverage failed due to missing data: %s", exc)
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except ValueError as exc:
+        logger.error("Coverage validation error: %s", exc)
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        logger.error("Coverage is unavailable: %s", exc)
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    except Exception as exc:  # pragma: no cover - defensive API guard
+        logger.exception("Unexpected error during coverage computation")
+        raise HTTPException(status_code=500, detail="internal server error") from exc
+    return StreamingResponse(lines, media_type="application/x-ndjson")
 
 
 @app.post("/apply-correction")
+@metrics.instrument_endpoint("POST /apply-correction")
+@profiling.profiled
 def apply_correction_endpoint(req: CorrectionRequest):
+    started = time.perf_counter()
     try:
         result = apply_correction(req)
     except Exception as exc:  # pragma: no cover - defensive API guard
         logger.exception("Unexpected error during correction applying")
         raise HTTPException(status_code=500, detail="internal server error") from exc
-    protocol = save_protocol(
-        mission_id=req.mission_id,
-        operation="apply-correction",
-        input_data=req.model_dump(mode="json"),
-        result_data=result.model_dump(mode="json"),
+    protocol_id = _record_protocol(
+        req.mission_id,
+        "apply-correction",
+        req.model_dump(mode="json"),
+        result.model_dump(mode="json"),
+        started,
     )
-    return {"solution": result, "protocol_id": protocol.protocol_id}
+    return {"solution": result, "protocol_id": protocol_id}
 
 
 @app.post("/triangulation/{method}")
-def triangulation_endpoint(method: str, req: TriangulationRequest):
+@metrics.instrument_endpoint("POST /triangulation/{method}")
+async def triangulation_endpoint(method: str, req: TriangulationRequest):
+    started = time.perf_counter()
     if method not in {"sound", "crater"}:
         raise HTTPException(status_code=400, detail="method must be sound or crater")
 
     req = req.model_copy(update={"method": method})
     try:
-        result = triangulate(req)
+        result = await offload.run("solve", triangulate, req)
+    except (PoolSaturated, PoolTimeout) as exc:
+        raise _overloaded(exc) from exc
     except ValueError as exc:
         logger.error("Triangulation validation error: %s", exc)
         raise HTTPException(status_code=400, detail=str(exc)) from exc
@@ -97,10 +332,80 @@ def triangulation_endpoint(method: str, req: TriangulationRequest):
         logger.exception("Unexpected error during triangulation")
         raise HTTPException(status_code=500, detail="internal server error") from exc
 
-    protocol = save_protocol(
-        mission_id=req.mission_id,
-        operation=f"triangulation-{method}",
-        input_data=req.model_dump(mode="json"),
-        result_data=result.model_dump(mode="json"),
+    protocol_id = await _record_offloaded(req.mission_id, f"triangulation-{method}", req, result, started)
+    return {"result": result, "protocol_id": protocol_id}
+
+
+@app.post("/triangulation/{method}/sessions/{mission_id}")
+@metrics.instrument_endpoint("POST /triangulation/{method}/sessions/{mission_id}")
+@profiling.profiled
+def triangulation_session_update_endpoint(method: str, mission_id: str, point: TriangulationPoint):
+    started = time.perf_counter()
+    if method not in {"sound", "crater"}:
+        raise HTTPException(status_code=400, detail="method must be sound or crater")
+
+    try:
+        session = triangulation_sessions.add(mission_id, method, point)
+    except ValueError as exc:
+        logger.error("Triangulation session validation error: %s", exc)
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    result = session["result"]
+    protocol_id = _record_protocol(
+        mission_id,
+        f"triangulation-{method}-session",
+        point.model_dump(mode="json"),
+        {**session, "result": result.model_dump(mode="json") if result is not None else None},
+        started,
     )
-    return {"result": result, "protocol_id": protocol.protocol_id}
+    return {**session, "protocol_id": protocol_id}
+
+
+@app.get("/triangulation/{method}/sessions/{mission_id}")
+@metrics.instrument_endpoint("GET /triangulation/{method}/sessions/{mission_id}")
+def triangulation_session_endpoint(method: str, mission_id: str, refit: bool = False):
+    session = triangulation_sessions.get(mission_id, method, refit=refit)
+    if session is None:
+        raise HTTPException(status_code=404, detail="triangulation session not found or expired")
+    return session
+
+
+@app.delete("/triangulation/{method}/sessions/{mission_id}")
+@metrics.instrument_endpoint("DELETE /triangulation/{method}/sessions/{mission_id}")
+def triangulation_session_delete_endpoint(method: str, mission_id: str):
+    if not triangulation_sessions.discard(mission_id, method):
+        raise HTTPException(status_code=404, detail="triangulation session not found or expired")
+    return {"mission_id": mission_id, "method": method, "deleted": True}
+
+
+@app.get("/protocols")
+@metrics.instrument_endpoint("GET /protocols")
+def list_protocols_endpoint(
+    mission_id: str | None = None,
+    operation: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    cursor: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+):
+    try:
+        return query_protocols(
+            mission_id=mission_id, operation=operation, since=since, until=until, cursor=cursor, limit=limit
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.get("/protocols/export")
+@metrics.instrument_endpoint("GET /protocols/export")
+def export_protocols_endpoint(
+    mission_id: str | None = None,
+    operation: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+):
+    try:
+        lines = export_protocols(mission_id=mission_id, operation=operation, since=since, until=until)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return StreamingResponse(lines, media_type="application/x-ndjson")
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import math
+from dataclasses import replace
+
+from .data_store import find_ballistic_table_file, load_gun_profile, load_npz_table, load_terrain
+from .metrics import timed
+from .models import (
+    BatchFireMissionRequest,
+    BatchFireMissionResult,
+    BatchSolution,
+    Coordinates,
+    FireMissionRequest,
+    FireMissionResult,
+)
+from .solver import (
+    WEATHER_MODELS,
+    mils_per_radian,
+    solve_fire_mission,
+    solve_with_table,
+    table_range_scale,
+    terrain_height,
+    wear_factor,
+)
+from .table_engine import HAS_NUMPY, BallisticTable, np
+
+MAX_BATCH_SOLUTIONS = 10_000
+
+
+def _aim_altitude(req: BatchFireMissionRequest, index: int) -> float:
+    alt_m = req.aim_points[index].alt_m
+    return req.target_alt_m if alt_m is None else alt_m
+
+
+def fill_batch_altitudes(req: BatchFireMissionRequest) -> BatchFireMissionRequest:
+    """``req`` with omitted gun and aim point altitudes read from the terrain heightmap.
+
+    Aim points without ``alt_m`` take ``target_alt_m`` when it is given, as before.
+    """
+    missing_guns = any(gun.alt_m is None for gun in req.guns)
+    missing_points = [] if req.target_alt_m is not None else [
+        index for index, point in enumerate(req.aim_points) if point.alt_m is None
+    ]
+    if not missing_guns and not missing_points:
+        return req
+    terrain = load_terrain()
+    if terrain is None:
+        raise ValueError("Gun and aim point altitudes are required when no terrain heightmap is configured")
+
+    guns = [
+        gun if gun.alt_m is not None else replace(gun, alt_m=terrain_height(terrain, gun.position, f"gun {gun.gun_id}"))
+        for gun in req.guns
+    ]
+    aim_points = list(req.aim_points)
+    heights = terrain.heights([(aim_points[index].x, aim_points[index].y) for index in missing_points])
+    for index, height in zip(missing_points, heights):
+        point = aim_points[index]
+        if height is None:
+            raise ValueError(f"No terrain height at aim point {index} ({point.x:.1f}, {point.y:.1f})")
+        aim_points[index] = replace(point, alt_m=height)
+    return replace(req, guns=guns, aim_points=aim_points)
+
+
+def _range_error(range_m: float, trajectory: str, charge: int) -> str:
+    return f"Range {range_m:.1f} m is outside {trajectory} trajectory limits for charge {charge}"
+
+
+def _result(solutions: list[BatchSolution]) -> BatchFireMissionResult:
+    solved = sum(1 for item in solutions if item.solution is not None)
+    return BatchFireMissionResult(solutions=solutions, solved=solved, failed=len(solutions) - solved)
+
+
+def _solve_vectorized(
+    req: BatchFireMissionRequest, table: BallisticTable, mils_per_rad: float, velocity: float
+) -> list[BatchSolution]:
+    branch = table.branch(req.charge)
+    gun_x = np.array([gun.position.x for gun in req.guns], dtype=float)[:, None]
+    gun_y = np.array([gun.position.y for gun in req.guns], dtype=float)[:, None]
+    gun_alt = np.array([gun.alt_m for gun in req.guns], dtype=float)[:, None]
+    aim_x = np.array([point.x for point in req.aim_points], dtype=float)[None, :]
+    aim_y = np.array([point.y for point in req.aim_points], dtype=float)[None, :]
+    aim_alt = np.array([_aim_altitude(req, i) for i in range(len(req.aim_points))], dtype=float)[None, :]
+
+    dx = aim_x - gun_x
+    dy = aim_y - gun_y
+    range_m = np.hypot(dx, dy)
+    azimuth_deg = (np.degrees(np.arctan2(dx, dy)) + 360.0) % 360.0
+
+    wind_angle = np.radians(req.weather.wind_direction_deg - azimuth_deg)
+    wind_cross = req.weather.wind_speed_ms * np.sin(wind_angle)
+    wind_head = req.weather.wind_speed_ms * np.cos(wind_angle)
+
+    # Same barrel wear and two-pass head wind corrections as solver.solve_with_table, over every gun x aim point pair.
+    table_range = range_m * table_range_scale(velocity)
+    mask, rows = branch.interpolate_many(table_range)
+    for _ in range(2):
+        step_mask, rows = branch.interpolate_many(table_range - wind_head * rows["rdelta1"])
+        mask &= step_mask
+
+    site_mils = np.arctan2(aim_alt - gun_alt, np.maximum(1.0, range_m)) * mils_per_rad
+    elevation = (rows["elevation"] + site_mils).tolist()
+    flight_time = (rows["tof"] * velocity).tolist()
+    drift = (wind_cross * rows["drift1"] * velocity).tolist()
+    azimuth = azimuth_deg.tolist()
+    ranges = range_m.tolist()
+    reachable = mask.tolist()
+
+    solutions: list[BatchSolution] = []
+    for gun_index, gun in enumerate(req.guns):
+        for point_index in range(len(req.aim_points)):
+            if not reachable[gun_index][point_index]:
+                error = _range_error(ranges[gun_index][point_index], table.trajectory, req.charge)
+                solutions.append(BatchSolution(gun_id=gun.gun_id, aim_point_index=point_index, error=error))
+                continue
+
+            solution = FireMissionResult(
+                azimuth_deg=round(azimuth[gun_index][point_index], 3),
+                elevation_mils=round(elevation[gun_index][point_index], 3),
+                flight_time_s=round(flight_time[gun_index][point_index], 3),
+                range_m=round(ranges[gun_index][point_index], 3),
+                drift_m=round(drift[gun_index][point_index], 3),
+            )
+            solutions.append(BatchSolution(gun_id=gun.gun_id, aim_point_index=point_index, solution=solution))
+    return solutions
+
+
+def _solve_with_table_pairs(
+    req: BatchFireMissionRequest, table: BallisticTable, mils_per_rad: float, velocity: float
+) -> list[BatchSolution]:
+    solutions: list[BatchSolution] = []
+    for gun in req.guns:
+        for point_index, point in enumerate(req.aim_points):
+            dx = point.x - gun.position.x
+            dy = point.y - gun.position.y
+            azimuth_deg = (math.degrees(math.atan2(dx, dy)) + 360.0) % 360.0
+            try:
+                solution = solve_with_table(
+                    table,
+                    req.charge,
+                    math.hypot(dx, dy),
+                    azimuth_deg,
+                    _aim_altitude(req, point_index) - gun.alt_m,
+                    req.weather,
+                    mils_per_rad,
+                    velocity,
+                )
+            except ValueError as exc:
+                solutions.append(BatchSolution(gun_id=gun.gun_id, aim_point_index=point_index, error=str(exc)))
+                continue
+            solutions.append(BatchSolution(gun_id=gun.gun_id, aim_point_index=point_index, solution=solution))
+    return solutions
+
+
+def _solve_pairwise(req: BatchFireMissionRequest) -> list[BatchSolution]:
+    solutions: list[BatchSolution] = []
+    for gun in req.guns:
+        for point_index, point in enumerate(req.aim_points):
+            single = FireMissionRequest(
+                mission_id=req.mission_id,
+                shooter=gun.position,
+                target=Coordinates(x=point.x, y=point.y),
+                shooter_alt_m=gun.alt_m,
+                target_alt_m=_aim_altitude(req, point_index),
+                weather=req.weather,
+                ammo_type=req.ammo_type,
+                charge=req.charge,
+                barrel_profile_id=req.barrel_profile_id,
+                trajectory=req.trajectory,
+                weather_model=req.weather_model,
+            )
+            try:
+                solution = solve_fire_mission(single)
+            except ValueError as exc:
+                solutions.append(BatchSolution(gun_id=gun.gun_id, aim_point_index=point_index, error=str(exc)))
+                continue
+            solutions.append(BatchSolution(gun_id=gun.gun_id, aim_point_index=point_index, solution=solution))
+    return solutions
+
+
+@timed("solve_fire_mission_batch")
+def solve_fire_mission_batch(req: BatchFireMissionRequest) -> BatchFireMissionResult:
+    pair_count = len(req.guns) * len(req.aim_points)
+    if pair_count == 0:
+        raise ValueError("At least one gun and one aim point are required")
+    if pair_count > MAX_BATCH_SOLUTIONS:
+        raise ValueError(f"Batch is limited to {MAX_BATCH_SOLUTIONS} gun x aim point solutions")
+    if req.weather_model not in WEATHER_MODELS:
+        raise ValueError(f"weather_model must be one of {WEATHER_MODELS}")
+    req = fill_batch_altitudes(req)
+
+    table_file = find_ballistic_table_file(req.ammo_type.value, req.barrel_profile_id, req.trajectory)
+    # Point-mass solutions depend on each pair's altitude delta and wind angle; solving them one by
+    # one through the solution cache keeps them identical to single missions.
+    if table_file is None or req.weather_model == "point_mass":
+        return _result(_solve_pairwise(req))
+
+    table = load_npz_table(table_file)
+    if table.branch(req.charge) is None:
+        raise ValueError(f"Charge {req.charge} is not available in {table.trajectory} trajectory table")
+
+    profile = load_gun_profile(req.barrel_profile_id)
+    mils_per_rad = mils_per_radian(profile)
+    velocity = wear_factor(profile)
+    if HAS_NUMPY:
+        return _result(_solve_vectorized(req, table, mils_per_rad, velocity))
+    return _result(_solve_with_table_pairs(req, table, mils_per_rad, velocity))
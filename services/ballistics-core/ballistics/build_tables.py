@@ -0,0 +1,337 @@
+"""Generate NPZ ballistic tables from gun and projectile profiles.
+
+    python -m ballistics.build_tables [--workers N] [--force] [projectile dirs ...]
+
+Without paths every ``tables/<gun>/<projectile>/profile.json`` is built, skipping projectiles that
+already have ``ballistic_*.npz`` tables unless ``--force`` is given. Each charge is swept over all
+elevations by the point-mass model (ballistics.trajectory at the table's own time step) in a
+worker process and checkpointed to ``<projectile>/.build/``, so an interrupted run resumes with
+the charges that are still missing. Once every charge of a projectile is done its
+``ballistic_{low,high,direct}.npz`` files are written in the layout of ``tables/M777/M107_155MM_HE``.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import time
+import zipfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable
+
+from . import data_store
+from .solver import DEFAULT_MILS_PER_CIRCLE
+from .table_engine import read_npz, write_npz
+from .trajectory import DEFAULT_DT, DEFAULT_MAX_TIME_S, PointMassModel
+
+PROFILE_NAME = "profile.json"
+CHECKPOINT_DIR = ".build"
+DEFAULT_STEP_MIL = 0.5
+DEFAULT_WIND_EPS = 1.0
+# Per-charge columns in the order of the M777 tables; drift1/rdelta1 are per 1 m/s of wind.
+SWEEP_COLUMNS = ("range", "tof", "maxy", "drift1", "rdelta1")
+
+
+@dataclass
+class ProjectileSpec:
+    """Everything a table build needs, read from the gun's and the projectile's profile.json."""
+
+    directory: Path
+    mass_kg: float
+    air_drag: float
+    velocities: dict[int, float]
+    # Elevation span (mil) per trajectory table; None is the elevation of the highest charge's
+    # maximum range, which separates the low and high branches.
+    spans: dict[str, tuple[float | None, float | None]]
+    mils_per_circle: float = DEFAULT_MILS_PER_CIRCLE
+    step_mil: float = DEFAULT_STEP_MIL
+    dt: float = DEFAULT_DT
+    ttl: float = DEFAULT_MAX_TIME_S
+    wind_eps: float = DEFAULT_WIND_EPS
+    sources: list[Path] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return f"{self.directory.parent.name}/{self.directory.name}"
+
+    @property
+    def meta(self) -> dict[str, float]:
+        return {
+            "step_mil": self.step_mil,
+            "dt": self.dt,
+            "ttl": self.ttl,
+            "air_drag": self.air_drag,
+            "mass": self.mass_kg,
+            "wind_eps": self.wind_eps,
+        }
+
+    def elevations(self) -> list[float]:
+        bounds = [bound for span in self.spans.values() for bound in span if bound is not None]
+        start, end = min(bounds), max(bounds)
+        return [start + index * self.step_mil for index in range(round((end - start) / self.step_mil) + 1)]
+
+    def checkpoint(self, charge: int) -> Path:
+        # The digest ties a checkpoint to the parameters it was computed with, every elevation included.
+        parameters = [self.meta, self.velocities[charge], self.mils_per_circle, self.elevations()]
+        digest = hashlib.sha1(json.dumps(parameters).encode("utf-8")).hexdigest()[:12]
+        return self.directory / CHECKPOINT_DIR / f"charge-{charge}-{digest}.npz"
+
+    def outputs(self) -> list[Path]:
+        return sorted(self.directory.glob("ballistic_*.npz"))
+
+
+def _number(profile: dict, name: str, path: Path, default: float | None = None) -> float:
+    value = profile.get(name, default)
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise ValueError(f"{path}: {name} must be a number")
+    return float(value)
+
+
+def load_spec(projectile_dir: Path) -> ProjectileSpec:
+    profile_path = projectile_dir / PROFILE_NAME
+    gun_path = projectile_dir.parent / PROFILE_NAME
+    if not profile_path.is_file():
+        raise FileNotFoundError(f"Projectile profile missing: {profile_path}")
+    profile = json.loads(profile_path.read_text(encoding="utf-8"))
+    gun = json.loads(gun_path.read_text(encoding="utf-8")) if gun_path.is_file() else {}
+
+    per_charge = profile.get("muzzle_velocity_by_charge")
+    if not isinstance(per_charge, dict) or not per_charge:
+        raise ValueError(f"{profile_path}: muzzle_velocity_by_charge is required")
+    velocities = {int(charge): _number(per_charge, charge, profile_path) for charge in per_charge}
+
+    mil_system = gun.get("mil_system") or {}
+    spans = profile.get("trajectories")
+    if spans is None:
+        min_elevation = max(0.0, float(gun.get("min_elevation_mil", 0.0)))
+        max_elevation = float(gun.get("max_elevation_mil", float(mil_system.get("mils_per_circle", 6400)) / 4))
+        spans = {"low": [min_elevation, None], "high": [None, max_elevation]}
+    if not isinstance(spans, dict) or any(
+        name not in ("low", "high", "direct") or not isinstance(span, list) or len(span) != 2 for name, span in spans.items()
+    ):
+        raise ValueError(f"{profile_path}: trajectories must map low/high/direct to [start_mil, end_mil]")
+    if all(bound is None for span in spans.values() for bound in span):
+        raise ValueError(f"{profile_path}: trajectories need at least one elevation bound")
+
+    spec = ProjectileSpec(
+        directory=projectile_dir,
+        mass_kg=_number(profile, "mass_kg", profile_path),
+        air_drag=_number(profile, "air_drag", profile_path),
+        velocities=dict(sorted(velocities.items())),
+        spans={name: tuple(span) for name, span in spans.items()},
+        mils_per_circle=float(mil_system.get("mils_per_circle", DEFAULT_MILS_PER_CIRCLE)),
+        step_mil=_number(profile, "step_mil", profile_path, DEFAULT_STEP_MIL),
+        dt=_number(profile, "dt", profile_path, DEFAULT_DT),
+        ttl=_number(profile, "ttl", profile_path, DEFAULT_MAX_TIME_S),
+        wind_eps=_number(profile, "wind_eps", profile_path, DEFAULT_WIND_EPS),
+        sources=[profile_path, gun_path],
+    )
+    if spec.mass_kg <= 0 or spec.air_drag < 0 or spec.step_mil <= 0 or spec.dt <= 0 or spec.wind_eps <= 0:
+        raise ValueError(f"{profile_path}: mass_kg, step_mil, dt and wind_eps must be > 0, air_drag >= 0")
+    return spec
+
+
+def sweep_charge(spec: ProjectileSpec, charge: int) -> tuple[dict[str, array], float]:
+    """Fly every elevation of ``spec`` for ``charge``: calm, with a crosswind and with a head wind.
+
+    Runs in a worker process; returns the SWEEP_COLUMNS and the seconds it took.
+    """
+    started = time.perf_counter()
+    elevations = spec.elevations()
+    count = len(elevations)
+    radians = [elevation * 2 * math.pi / spec.mils_per_circle for elevation in elevations]
+    eps = spec.wind_eps
+    flown = PointMassModel(spec.meta, step_scale=1).integrate(
+        [spec.velocities[charge]] * (3 * count),
+        radians * 3,
+        head_wind_ms=[0.0] * (2 * count) + [eps] * count,
+        cross_wind_ms=[0.0] * count + [eps] * count + [0.0] * count,
+    )
+    ranges = [float(value) for value in flown["range"]]
+    calm = ranges[:count]
+    columns = {
+        "range": array("d", calm),
+        "tof": array("d", (float(value) for value in flown["tof"][:count])),
+        "maxy": array("d", (float(value) for value in flown["maxy"][:count])),
+        "drift1": array("d", (float(value) / eps for value in flown["drift"][count : 2 * count])),
+        "rdelta1": array("d", ((head - base) / eps for head, base in zip(ranges[2 * count :], calm))),
+    }
+    return columns, time.perf_counter() - started
+
+
+def _read_checkpoint(spec: ProjectileSpec, path: Path) -> dict[str, array] | None:
+    """The checkpointed sweep, or None if it is unreadable or does not cover ``spec.elevations()``."""
+    try:
+        columns = dict(read_npz(path))
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return None
+    count = len(spec.elevations())
+    if any(len(columns.get(column, ())) != count for column in SWEEP_COLUMNS):
+        return None
+    return columns
+
+
+def _write_atomic(path: Path, arrays: dict[str, array]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    write_npz(temporary, arrays)
+    os.replace(temporary, path)
+
+
+def _split_elevation(spec: ProjectileSpec, sweeps: dict[int, dict[str, array]]) -> float:
+    elevations = spec.elevations()
+    ranges = sweeps[max(sweeps)]["range"]
+    finite = [index for index, value in enumerate(ranges) if math.isfinite(value)]
+    if not finite:
+        raise ValueError(f"{spec.name}: no elevation of charge {max(sweeps)} reaches the ground")
+    return elevations[max(finite, key=ranges.__getitem__)]
+
+
+def assemble_tables(spec: ProjectileSpec, sweeps: dict[int, dict[str, array]]) -> dict[str, dict[str, array]]:
+    """The NPZ arrays per trajectory name; spans with fewer than two elevations are left out."""
+    elevations = spec.elevations()
+    split = None
+    tables: dict[str, dict[str, array]] = {}
+    for name, (start, end) in spec.spans.items():
+        if start is None or end is None:
+            split = _split_elevation(spec, sweeps) if split is None else split
+        start = split if start is None else start
+        end = split if end is None else end
+        rows = [index for index, elevation in enumerate(elevations) if start - 1e-9 <= elevation <= end + 1e-9]
+        if len(rows) < 2:
+            continue
+        arrays = {
+            "elev_mil": array("f", (elevations[row] for row in rows)),
+            "charges_id": array("i", sweeps),
+            **{f"meta_{key}": array("f", [value]) for key, value in spec.meta.items()},
+        }
+        for charge, sweep in sweeps.items():
+            for column in SWEEP_COLUMNS:
+                arrays[f"{column}_c{charge}"] = array("f", (sweep[column][row] for row in rows))
+        tables[name] = arrays
+    return tables
+
+
+def _report(message: str) -> None:
+    print(message, flush=True)
+
+
+def build(
+    specs: Iterable[ProjectileSpec],
+    workers: int | None = None,
+    force: bool = False,
+    report: Callable[[str], None] = _report,
+) -> list[Path]:
+    """Build the tables of ``specs``; returns the files written.
+
+    ``workers=1`` sweeps in this process, otherwise a ProcessPoolExecutor with ``workers``
+    processes (default: one per core) runs one charge per task.
+    """
+    specs = list(specs)
+    sweeps: dict[Path, dict[int, dict[str, array]]] = {spec.directory: {} for spec in specs}
+    tasks: list[tuple[ProjectileSpec, int]] = []
+    for spec in specs:
+        for charge in spec.velocities:
+            checkpoint = spec.checkpoint(charge)
+            columns = _read_checkpoint(spec, checkpoint) if not force and checkpoint.is_file() else None
+            if columns is not None:
+                sweeps[spec.directory][charge] = columns
+                report(f"resumed    {spec.name} charge {charge} from {checkpoint.name}")
+                continue
+            if checkpoint.is_file():
+                checkpoint.unlink()
+                if not force:
+                    report(f"discarded  {spec.name} charge {charge}: {checkpoint.name} does not match the profile")
+            tasks.append((spec, charge))
+
+    started = time.perf_counter()
+
+    def finished(done: int, spec: ProjectileSpec, charge: int, columns: dict[str, array], elapsed: float) -> None:
+        _write_atomic(spec.checkpoint(charge), columns)
+        sweeps[spec.directory][charge] = columns
+        total_elapsed = time.perf_counter() - started
+        remaining = total_elapsed / done * (len(tasks) - done)
+        report(
+            f"[{done}/{len(tasks)}] {spec.name} charge {charge}: {len(columns['range'])} elevations "
+            f"in {elapsed:.1f} s (elapsed {total_elapsed:.0f} s, ~{remaining:.0f} s left)"
+        )
+
+    if workers == 1:
+        for done, (spec, charge) in enumerate(tasks, 1):
+            finished(done, spec, charge, *sweep_charge(spec, charge))
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(sweep_charge, spec, charge): (spec, charge) for spec, charge in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                spec, charge = futures[future]
+                finished(done, spec, charge, *future.result())
+
+    written: list[Path] = []
+    for spec in specs:
+        for name, arrays in assemble_tables(spec, dict(sorted(sweeps[spec.directory].items()))).items():
+            target = spec.directory / f"ballistic_{name}.npz"
+            _write_atomic(target, arrays)
+            written.append(target)
+            report(f"wrote      {target} ({len(arrays['elev_mil'])} elevations, {len(spec.velocities)} charges)")
+        shutil.rmtree(spec.directory / CHECKPOINT_DIR, ignore_errors=True)
+    return written
+
+
+def default_projectiles() -> list[Path]:
+    return sorted(path.parent for path in data_store.TABLES_DIR.glob(f"*/*/{PROFILE_NAME}"))
+
+
+def missing_profiles() -> list[Path]:
+    """Projectile directories with neither tables nor a profile to build them from."""
+    return sorted(
+        path
+        for path in data_store.TABLES_DIR.glob("*/*")
+        if path.is_dir()
+        and not path.name.startswith(".")
+        and not (path / PROFILE_NAME).is_file()
+        and not any(path.glob("ballistic_*.npz"))
+    )
+
+
+def run(paths: Iterable[Path], workers: int | None = None, force: bool = False) -> int:
+    specs: list[ProjectileSpec] = []
+    failed = 0
+    for path in paths:
+        try:
+            spec = load_spec(path)
+        except (OSError, ValueError) as exc:
+            print(f"error      {path}: {exc}")
+            failed += 1
+            continue
+        if not force and spec.outputs():
+            print(f"up-to-date {spec.name} (--force rebuilds)")
+            continue
+        specs.append(spec)
+    if specs:
+        build(specs, workers=workers, force=force)
+    return 1 if failed else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ballistics.build_tables", description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", type=Path, help="projectile directories (default: all with a profile.json)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--force", action="store_true", help="rebuild existing tables and ignore checkpoints")
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be >= 1")
+    if not args.paths:
+        for path in missing_profiles():
+            print(f"no profile {path.relative_to(data_store.TABLES_DIR)}")
+    return run(args.paths or default_projectiles(), workers=args.workers, force=args.force)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Hashable
+
+FileSignature = tuple[int, int]
+
+
+def file_signature(path: Path) -> FileSignature | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class _Flight:
+    """One in-progress load that concurrent misses on the same key wait for."""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+    def result(self) -> Any:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.RLock()
+        self._flights: dict[Hashable, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.coalesced = 0
+
+    # Single flight: the first miss on a key computes it outside the lock, later misses wait for
+    # that result (or error) instead of repeating the load. Errors are handed to the waiters only.
+    def _join_flight(self, key: Hashable) -> tuple[_Flight, bool]:
+        """Under ``self._lock``: the in-progress flight for ``key`` and whether the caller leads it."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return flight, False
+        flight = self._flights[key] = _Flight()
+        return flight, True
+
+    def _land_flight(self, key: Hashable, flight: _Flight, value: Any = None, error: BaseException | None = None) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.value, flight.error = value, error
+        flight.done.set()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Entries are dropped when the file's mtime or size changes. A file is re-stat'ed at most
+# once per revalidate_interval_s, so hot lookups do not touch the filesystem at all.
+class FileCache(LRUCache):
+    def __init__(self, maxsize: int = 128, revalidate_interval_s: float = 1.0):
+        super().__init__(maxsize)
+        self.revalidate_interval_s = revalidate_interval_s
+        self.invalidations = 0
+
+    def get_or_load(self, path: Path, loader: Callable[[Path], Any]) -> Any:
+        with self._lock:
+            entry = self._data.get(path)
+            now = time.monotonic()
+            if entry is not None:
+                signature, value, checked_at = entry
+                if now - checked_at < self.revalidate_interval_s:
+                    self._data.move_to_end(path)
+                    self.hits += 1
+                    return value
+
+                current = file_signature(path)
+                if current == signature:
+                    self._data[path] = (signature, value, now)
+                    self._data.move_to_end(path)
+                    self.hits += 1
+                    return value
+
+                del self._data[path]
+                self.invalidations += 1
+
+            self.misses += 1
+            flight, leader = self._join_flight(path)
+        if not leader:
+            return flight.result()
+
+        try:
+            signature = file_signature(path)
+            if signature is None:
+                raise FileNotFoundError(path)
+            value = loader(path)
+        except BaseException as exc:
+            self._land_flight(path, flight, error=exc)
+            raise
+        self.put(path, (signature, value, now))
+        self._land_flight(path, flight, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self.invalidations = 0
+
+    def stats(self) -> dict[str, float]:
+        stats = super().stats()
+        stats["invalidations"] = self.invalidations
+        return stats
@@ -0,0 +1,74 @@
+"""Compile NPZ and legacy JSON ballistic tables into memory-mappable .btbl files.
+
+    python -m ballistics.compile_tables [--check] [--force] [paths ...]
+
+Without paths every ``tables/**/*.npz``, ``tables/**/charge-*.json`` and
+``data/ballistic-tables/*.json`` is compiled. Each output is written next to its source and is
+used by the service only while the source's mtime and size still match.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Iterable
+
+from . import compiled_format, data_store
+from .table_engine import compile_table
+
+
+def default_sources() -> list[Path]:
+    sources = sorted(data_store.TABLES_DIR.rglob("*.npz"))
+    sources += sorted(data_store.TABLES_DIR.rglob("charge-*.json"))
+    sources += sorted(data_store.BALLISTIC_TABLE_DIR.glob("*.json"))
+    return sources
+
+
+def compile_source(source: Path) -> bytes:
+    if source.suffix.lower() == ".npz":
+        return compile_table(source)
+    if source.suffix.lower() == ".json":
+        return compiled_format.encode_document(json.loads(source.read_text(encoding="utf-8")), source)
+    raise ValueError(f"Unsupported table source: {source}")
+
+
+def write_compiled(source: Path) -> Path:
+    target = compiled_format.compiled_path(source)
+    temporary = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    temporary.write_bytes(compile_source(source))
+    os.replace(temporary, target)
+    return target
+
+
+def is_up_to_date(source: Path) -> bool:
+    return compiled_format.open_current(source) is not None
+
+
+def run(sources: Iterable[Path], check: bool = False, force: bool = False) -> int:
+    stale = 0
+    for source in sources:
+        if not force and is_up_to_date(source):
+            print(f"up-to-date {source}")
+            continue
+        if check:
+            print(f"stale      {source}")
+            stale += 1
+            continue
+        target = write_compiled(source)
+        print(f"compiled   {source} -> {target.name} ({target.stat().st_size} bytes)")
+    return 1 if stale else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ballistics.compile_tables", description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", type=Path, help="table files to compile (default: all known tables)")
+    parser.add_argument("--check", action="store_true", help="only report missing or stale compiled tables")
+    parser.add_argument("--force", action="store_true", help="recompile even if the output is current")
+    args = parser.parse_args(argv)
+    return run(args.paths or default_sources(), check=args.check, force=args.force)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
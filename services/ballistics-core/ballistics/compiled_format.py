@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Sequence
+
+# Layout of a compiled table (all integers little-endian):
+#   0   magic b"BTBL"
+#   4   uint16 format version, uint16 reserved
+#   8   uint32 header length
+#   12  UTF-8 JSON header {"attributes": {...}, "arrays": {name: {"dtype", "offset", "count"}}}
+#   ... zero padding; array data starts on a 64-byte boundary, every array on a 16-byte boundary,
+#       offsets in the header are absolute byte offsets into the file.
+MAGIC = b"BTBL"
+VERSION = 1
+COMPILED_SUFFIX = ".btbl"
+DATA_ALIGNMENT = 64
+ARRAY_ALIGNMENT = 16
+
+_PREFIX = struct.Struct("<4sHHI")
+_DTYPES = {"<f4": "f", "<f8": "d", "<i4": "i"}
+_DTYPE_BY_TYPECODE = {"f": "<f4", "d": "<f8", "i": "<i4"}
+
+
+def _align(value: int, alignment: int) -> int:
+    return value + (-value % alignment)
+
+
+def _as_array(values: Sequence[float]) -> array:
+    if isinstance(values, array):
+        dtype = _DTYPE_BY_TYPECODE.get(values.typecode, "<f8")
+        typecode = _DTYPES[dtype]
+        if values.typecode != typecode:
+            values = array(typecode, values)
+    else:
+        values = array("f", values)
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def encode(arrays: dict[str, Sequence[float]], attributes: dict[str, Any] | None = None) -> bytes:
+    packed = {name: _as_array(values) for name, values in arrays.items()}
+
+    def header_for(data_start: int) -> tuple[bytes, dict[str, dict[str, Any]]]:
+        entries: dict[str, dict[str, Any]] = {}
+        offset = data_start
+        for name, values in packed.items():
+            offset = _align(offset, ARRAY_ALIGNMENT)
+            entries[name] = {"dtype": _DTYPE_BY_TYPECODE[values.typecode], "offset": offset, "count": len(values)}
+            offset += len(values) * values.itemsize
+        header = {"attributes": attributes or {}, "arrays": entries}
+        return json.dumps(header, separators=(",", ":")).encode("utf-8"), entries
+
+    # Offsets live in the header, so the header length decides where data starts; iterate until stable.
+    data_start = DATA_ALIGNMENT
+    while True:
+        header, entries = header_for(data_start)
+        needed = _align(_PREFIX.size + len(header), DATA_ALIGNMENT)
+        if needed <= data_start:
+            break
+        data_start = needed
+
+    out = bytearray(_PREFIX.pack(MAGIC, VERSION, 0, len(header)) + header)
+    for name, values in packed.items():
+        out.extend(b"\0" * (entries[name]["offset"] - len(out)))
+        out.extend(values.tobytes())
+    return bytes(out)
+
+
+class CompiledBuffer:
+    def __init__(self, buffer):
+        self._view = memoryview(buffer)
+        magic, version, _reserved, header_len = _PREFIX.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a compiled ballistic table")
+        if version != VERSION:
+            raise ValueError(f"Unsupported compiled table version: {version}")
+        header = json.loads(bytes(self._view[_PREFIX.size : _PREFIX.size + header_len]))
+        self.attributes: dict[str, Any] = header["attributes"]
+        self.entries: dict[str, dict[str, Any]] = header["arrays"]
+
+    def names(self) -> list[str]:
+        return list(self.entries)
+
+    def array(self, name: str) -> Sequence[float]:
+        entry = self.entries[name]
+        typecode = _DTYPES[entry["dtype"]]
+        size = struct.calcsize(typecode) * entry["count"]
+        raw = self._view[entry["offset"] : entry["offset"] + size]
+        if sys.byteorder == "little":
+            return raw.cast(typecode)  # zero-copy view into the mapped file
+        values = array(typecode, raw.tobytes())
+        values.byteswap()
+        return values
+
+    def arrays(self) -> dict[str, Sequence[float]]:
+        return {name: self.array(name) for name in self.entries}
+
+
+def open_compiled(path: Path) -> CompiledBuffer:
+    with path.open("rb") as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    return CompiledBuffer(mapped)
+
+
+def compiled_path(source: Path) -> Path:
+    return source.with_suffix(COMPILED_SUFFIX)
+
+
+def source_attributes(source: Path) -> dict[str, Any]:
+    stat = source.stat()
+    return {"name": source.name, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def is_current(compiled: CompiledBuffer, source: Path) -> bool:
+    try:
+        return compiled.attributes.get("source") == source_attributes(source)
+    except OSError:
+        return False
+
+
+def open_current(source: Path) -> CompiledBuffer | None:
+    """Return the compiled sibling of ``source`` if it was built from the file as it is now."""
+    path = compiled_path(source)
+    if path == source or not path.is_file():
+        return None
+    try:
+        compiled = open_compiled(path)
+    except (OSError, ValueError):
+        return None
+    return compiled if is_current(compiled, source) else None
+
+
+# Legacy JSON tables keep their scalar fields in the header; numeric lists become aligned arrays.
+def encode_document(document: dict[str, Any], source: Path) -> bytes:
+    arrays = {
+        name: array("d", value)
+        for name, value in document.items()
+        if isinstance(value, list) and value and all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in value)
+    }
+    fields = {name: value for name, value in document.items() if name not in arrays}
+    return encode(arrays, {"kind": "json", "fields": fields, "source": source_attributes(source)})
+
+
+def decode_document(compiled: CompiledBuffer) -> dict[str, Any]:
+    if compiled.attributes.get("kind") != "json":
+        raise ValueError("Compiled table does not hold a JSON document")
+    document = dict(compiled.attributes["fields"])
+    for name in compiled.names():
+        document[name] = list(compiled.array(name))
+    return document
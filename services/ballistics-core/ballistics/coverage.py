@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import base64
+import json
+import math
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from . import metrics
+from .data_store import find_ballistic_table_file, load_gun_profile, load_npz_table, load_terrain
+from .metrics import timed
+from .models import CoverageRequest
+from .solution_cache import SourceTrackedCache
+from .solver import SELECTION_KEYS, _limit, mils_per_radian, table_range_scale, terrain_height, wear_factor
+from .table_engine import HAS_NUMPY, TRAJECTORIES, np
+
+COVERAGE_CACHE_SIZE = 16
+COVERAGE_TTL_S = 600.0
+MIN_RESOLUTION_M = 1.0
+MAX_COVERAGE_CELLS = 4_000_000
+MAX_TILE_SIZE = 1024
+# Cell layers as streamed: little-endian, row-major, base64. -1 / NaN mark unreachable cells.
+TILE_ENCODING = {"charge": "int8", "trajectory": "int8", "elevation_mils": "float32", "flight_time_s": "float32"}
+# interpolate_many columns each pass needs; the selection measures are tof and maxy.
+_COLUMNS = ("elevation", "tof", "maxy")
+_WIND_COLUMNS = (*_COLUMNS, "rdelta1")
+
+
+@dataclass
+class CoverageRaster:
+    """Per-cell best solution over a gun's reachable sector.
+
+    Cell (row, col) is centred at ``origin + ((col + 0.5) * resolution, (row + 0.5) * resolution)``;
+    row 0 is the southern edge. ``trajectory`` indexes ``trajectories``.
+    """
+
+    origin_x: float
+    origin_y: float
+    resolution_m: float
+    width: int
+    height: int
+    trajectories: tuple[str, ...]
+    min_range_m: float
+    max_range_m: float
+    heading_center_deg: float
+    traverse_sector_deg: float
+    # True when target altitudes came from the terrain heightmap, cell by cell.
+    terrain: bool
+    charge: Any
+    trajectory: Any
+    elevation_mils: Any
+    flight_time_s: Any
+
+    @property
+    def reachable(self):
+        return self.charge >= 0
+
+    def header(self, tile_size: int) -> dict[str, Any]:
+        return {
+            "type": "coverage",
+            "origin_x": self.origin_x,
+            "origin_y": self.origin_y,
+            "resolution_m": self.resolution_m,
+            "width": self.width,
+            "height": self.height,
+            "tile_size": tile_size,
+            "trajectories": list(self.trajectories),
+            "min_range_m": self.min_range_m,
+            "max_range_m": self.max_range_m,
+            "heading_center_deg": self.heading_center_deg,
+            "traverse_sector_deg": self.traverse_sector_deg,
+            "terrain": self.terrain,
+            "reachable_cells": int(np.count_nonzero(self.reachable)),
+            "encoding": TILE_ENCODING,
+        }
+
+    def tiles(self, tile_size: int) -> Iterator[dict[str, Any]]:
+        """Square tiles in row-major order; tiles without a reachable cell are left out."""
+        for row in range(0, self.height, tile_size):
+            for col in range(0, self.width, tile_size):
+                window = (slice(row, row + tile_size), slice(col, col + tile_size))
+                charge = self.charge[window]
+                if not (charge >= 0).any():
+                    continue
+                yield {
+                    "type": "tile",
+                    "row": row,
+                    "col": col,
+                    "height": charge.shape[0],
+                    "width": charge.shape[1],
+                    **{name: _encode(getattr(self, name)[window]) for name in TILE_ENCODING},
+                }
+
+
+def _encode(values) -> str:
+    return base64.b64encode(np.ascontiguousarray(values).tobytes()).decode("ascii")
+
+
+def _sector_offset(azimuth_deg, center_deg: float):
+    return (azimuth_deg - center_deg + 180.0) % 360.0 - 180.0
+
+
+def _sector_bounds(min_range: float, max_range: float, center_deg: float, sector_deg: float) -> tuple[float, ...]:
+    """Bounding box (dx_min, dx_max, dy_min, dy_max) of the annular sector around the gun."""
+    if sector_deg >= 360:
+        return -max_range, max_range, -max_range, max_range
+    half = sector_deg / 2
+    angles = [center_deg - half, center_deg + half]
+    angles += [angle for angle in (0.0, 90.0, 180.0, 270.0) if abs(_sector_offset(angle, center_deg)) <= half]
+    xs, ys = [], []
+    for angle in angles:
+        sin, cos = math.sin(math.radians(angle)), math.cos(math.radians(angle))
+        for range_m in (min_range, max_range):
+            xs.append(range_m * sin)
+            ys.append(range_m * cos)
+    return min(xs), max(xs), min(ys), max(ys)
+
+
+def _load_tables(req: CoverageRequest) -> list:
+    tables = []
+    for trajectory in TRAJECTORIES:
+        table_file = find_ballistic_table_file(req.ammo_type.value, req.barrel_profile_id, trajectory)
+        if table_file is not None:
+            tables.append(load_npz_table(table_file))
+    if not tables:
+        raise ValueError(f"Coverage needs trajectory tables for {req.barrel_profile_id} {req.ammo_type.value}")
+    return tables
+
+
+@timed("compute_coverage")
+def compute_coverage(req: CoverageRequest) -> CoverageRaster:
+    """Best charge per cell, ranked like solve_fire_mission with charge="auto"."""
+    if not HAS_NUMPY:
+        raise RuntimeError("numpy is required for coverage rasters")
+    if req.resolution_m < MIN_RESOLUTION_M:
+        raise ValueError(f"resolution_m must be >= {MIN_RESOLUTION_M:g}")
+    if req.selection not in SELECTION_KEYS:
+        raise ValueError(f"selection must be one of {tuple(SELECTION_KEYS)}")
+
+    profile = load_gun_profile(req.barrel_profile_id)
+    tables = _load_tables(req)
+    branches = [
+        (table_index, charge, branch)
+        for table_index, table in enumerate(tables)
+        for charge in table.charges
+        if (branch := table.branch(charge)) is not None and len(branch.ranges) >= 2
+    ]
+    # Barrel wear stretches every table range alike (see solver.table_range_scale).
+    velocity = wear_factor(profile)
+    scale = table_range_scale(velocity)
+    table_max = max((branch.max_range for _, _, branch in branches), default=0.0)
+    min_range = max(0.0, _limit(profile, "min_range_m", 0.0))
+    max_range = min(_limit(profile, "max_range_m", math.inf), table_max / scale)
+    if max_range <= min_range:
+        raise ValueError(f"No range is reachable for {req.barrel_profile_id} {req.ammo_type.value}")
+    sector = min(360.0, _limit(profile, "traverse_sector_deg", 360.0))
+    center = req.heading_center_deg if req.heading_center_deg is not None else _limit(profile, "heading_center_deg", 0.0)
+    center %= 360.0
+
+    resolution = req.resolution_m
+    dx_min, dx_max, dy_min, dy_max = _sector_bounds(min_range, max_range, center, sector)
+    col0, col1 = math.floor(dx_min / resolution), math.ceil(dx_max / resolution)
+    row0, row1 = math.floor(dy_min / resolution), math.ceil(dy_max / resolution)
+    width, height = col1 - col0, row1 - row0
+    if width * height > MAX_COVERAGE_CELLS:
+        raise ValueError(f"Coverage raster is limited to {MAX_COVERAGE_CELLS} cells, increase resolution_m")
+
+    # Offsets of the cell centres from the gun, then only the cells inside the sector are solved.
+    dx, dy = np.meshgrid((np.arange(col0, col1) + 0.5) * resolution, (np.arange(row0, row1) + 0.5) * resolution)
+    range_grid = np.hypot(dx, dy)
+    azimuth_grid = np.degrees(np.arctan2(dx, dy)) % 360.0
+    inside = (range_grid >= min_range) & (range_grid <= max_range)
+    if sector < 360:
+        inside &= np.abs(_sector_offset(azimuth_grid, center)) <= sector / 2
+    cells = np.flatnonzero(inside)
+    range_m = range_grid.ravel()[cells]
+    table_range = range_m * scale
+
+    weather = req.weather
+    wind_head = None
+    if weather.wind_speed_ms:
+        wind_head = weather.wind_speed_ms * np.cos(np.radians(weather.wind_direction_deg - azimuth_grid.ravel()[cells]))
+    terrain = load_terrain()
+    shooter_alt = req.shooter_alt_m
+    if shooter_alt is None:
+        shooter_alt = terrain_height(terrain, req.shooter, "shooter") if terrain is not None else 0.0
+    use_terrain = req.target_alt_m is None and terrain is not None
+    if use_terrain:
+        # Cells without a terrain height get NaN elevations and so stay unreachable.
+        centres = np.column_stack((req.shooter.x + dx.ravel()[cells], req.shooter.y + dy.ravel()[cells]))
+        target_alt = terrain.heights(centres)
+    else:
+        target_alt = req.target_alt_m if req.target_alt_m is not None else shooter_alt
+    site_mils = np.arctan2(target_alt - shooter_alt, np.maximum(1.0, range_m)) * mils_per_radian(profile)
+    min_elevation = _limit(profile, "min_elevation_mil", -math.inf)
+    max_elevation = _limit(profile, "max_elevation_mil", math.inf)
+
+    first, second = ("tof", "maxy") if req.selection == "min_time_of_flight" else ("maxy", "tof")
+    best_first = np.full(cells.size, np.inf)
+    best_second = np.full(cells.size, np.inf)
+    best_option = np.full(cells.size, -1, dtype=np.int16)
+    elevation_out = np.full(cells.size, np.nan)
+    flight_time_out = np.full(cells.size, np.nan)
+    # Head wind moves the aimed range by at most |wind| * |rdelta1|; a branch only solves cells
+    # whose ground range is within that margin of its own span.
+    margin = abs(weather.wind_speed_ms) * max(
+        (float(np.max(np.abs(branch.columns["rdelta1"]), initial=0.0)) for _, _, branch in branches), default=0.0
+    )
+    for option, (_, _, branch) in enumerate(branches):
+        subset = np.flatnonzero((table_range >= branch.min_range - margin) & (table_range <= branch.max_range + margin))
+        if not subset.size:
+            continue
+        ranges = table_range[subset]
+        # Same two-pass head wind correction as solver.solve_with_table. The uniform velocity scaling
+        # of tof and maxy leaves the ranking unchanged, so only the output times are scaled.
+        mask, rows = branch.interpolate_many(ranges, _COLUMNS if wind_head is None else _WIND_COLUMNS)
+        if wind_head is not None:
+            head = wind_head[subset]
+            for _ in range(2):
+                step_mask, rows = branch.interpolate_many(ranges - head * rows["rdelta1"], _WIND_COLUMNS)
+                mask &= step_mask
+        elevation = rows["elevation"] + site_mils[subset]
+        primary, secondary = rows[first], rows[second]
+        better = (
+            mask
+            & (elevation >= min_elevation)
+            & (elevation <= max_elevation)
+            & (
+                (primary < best_first[subset])
+                | ((primary == best_first[subset]) & (secondary < best_second[subset]))
+            )
+        )
+        chosen = subset[better]
+        best_first[chosen] = primary[better]
+        best_second[chosen] = secondary[better]
+        best_option[chosen] = option
+        elevation_out[chosen] = elevation[better]
+        flight_time_out[chosen] = rows["tof"][better] * velocity
+
+    option_charge = np.array([charge for _, charge, _ in branches] + [-1], dtype=np.int8)
+    option_trajectory = np.array([table_index for table_index, _, _ in branches] + [-1], dtype=np.int8)
+    layers = {
+        "charge": np.full(width * height, -1, dtype="<i1"),
+        "trajectory": np.full(width * height, -1, dtype="<i1"),
+        "elevation_mils": np.full(width * height, np.nan, dtype="<f4"),
+        "flight_time_s": np.full(width * height, np.nan, dtype="<f4"),
+    }
+    # best_option == -1 picks the trailing -1 sentinel of the option arrays.
+    layers["charge"][cells] = option_charge[best_option]
+    layers["trajectory"][cells] = option_trajectory[best_option]
+    layers["elevation_mils"][cells] = elevation_out
+    layers["flight_time_s"][cells] = flight_time_out
+
+    return CoverageRaster(
+        origin_x=req.shooter.x + col0 * resolution,
+        origin_y=req.shooter.y + row0 * resolution,
+        resolution_m=resolution,
+        width=width,
+        height=height,
+        trajectories=tuple(table.trajectory for table in tables),
+        min_range_m=min_range,
+        max_range_m=max_range,
+        heading_center_deg=center,
+        traverse_sector_deg=sector,
+        terrain=use_terrain,
+        **{name: values.reshape(height, width) for name, values in layers.items()},
+    )
+
+
+class CoverageCache(SourceTrackedCache):
+    """Rasters keyed by gun position, profile and every other input; dropped when a table changes."""
+
+    def __init__(self, maxsize: int = COVERAGE_CACHE_SIZE, ttl_s: float = COVERAGE_TTL_S):
+        super().__init__(maxsize, ttl_s)
+
+    @staticmethod
+    def key(req: CoverageRequest) -> tuple:
+        weather = req.weather
+        return (
+            req.barrel_profile_id,
+            req.ammo_type.value,
+            req.shooter.x,
+            req.shooter.y,
+            req.shooter_alt_m,
+            req.target_alt_m,
+            req.resolution_m,
+            req.heading_center_deg,
+            req.selection,
+            weather.temperature_c,
+            weather.pressure_hpa,
+            weather.humidity_pct,
+            weather.wind_speed_ms,
+            weather.wind_direction_deg,
+        )
+
+
+coverage_cache = CoverageCache()
+metrics.register_cache_stats(lambda: {"coverage.rasters": coverage_cache.stats()})
+
+
+def get_coverage(req: CoverageRequest) -> CoverageRaster:
+    return coverage_cache.get_or_compute(coverage_cache.key(req), lambda: compute_coverage(req))
+
+
+def stream_coverage(raster: CoverageRaster, tile_size: int) -> Iterator[bytes]:
+    """NDJSON: a header line, then one line per tile with a reachable cell."""
+    # Validate eagerly so a bad tile size fails before the response starts streaming.
+    if not 1 <= tile_size <= MAX_TILE_SIZE:
+        raise ValueError(f"tile_size must be between 1 and {MAX_TILE_SIZE}")
+
+    def stream() -> Iterator[bytes]:
+        yield (json.dumps(raster.header(tile_size)) + "\n").encode("utf-8")
+        for tile in raster.tiles(tile_size):
+            yield (json.dumps(tile) + "\n").encode("utf-8")
+
+    return stream()
@@ -1,39 +1,147 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
+
+from . import compiled_format, metrics
+from .cache import FileCache
+from .table_engine import BallisticTable, load_table, table_from_compiled
+from .terrain import TerrainModel, open_terrain
 
 
 ROOT = Path(__file__).resolve().parents[3]
 BALLISTIC_TABLE_DIR = ROOT / "data" / "ballistic-tables"
 GUN_PROFILE_DIR = ROOT / "data" / "gun-profiles"
 TABLES_DIR = ROOT / "tables"
+TERRAIN_DIR = ROOT / "data" / "terrain"
+TERRAIN_HEADER = "heightmap.json"
+# Path of a heightmap header to use instead of TERRAIN_DIR / TERRAIN_HEADER.
+TERRAIN_ENV = "BALLISTICS_TERRAIN"
 
 DEFAULT_PROJECTILE_BY_AMMO = {
     "HE": "M107_155MM_HE",
     "SMOKE": "M110_SMOKE",
 }
 
+DIRECTORY_CACHE_SIZE = 512
+JSON_CACHE_SIZE = 256
+TABLE_CACHE_SIZE = 64
+TERRAIN_CACHE_SIZE = 4
+
+
+@dataclass(frozen=True)
+class _DirectoryListing:
+    directories: dict[str, Path]
+    directories_folded: dict[str, Path]
+    files_folded: dict[str, Path]
+
+
+def _scan_directory(root: Path) -> _DirectoryListing:
+    directories: dict[str, Path] = {}
+    files: dict[str, Path] = {}
+    with os.scandir(root) as entries:
+        for entry in sorted(entries, key=lambda item: item.name):
+            if entry.is_dir():
+                directories[entry.name] = Path(entry.path)
+            elif entry.is_file():
+                files.setdefault(entry.name.lower(), Path(entry.path))
+
+    folded: dict[str, Path] = {}
+    for name, path in directories.items():
+        folded.setdefault(name.lower(), path)
+    return _DirectoryListing(directories=directories, directories_folded=folded, files_folded=files)
+
 
-def _load_json(path: Path, missing_message: str) -> dict[str, Any]:
-    if not path.exists():
-        raise FileNotFoundError(f"{missing_message}: {path}")
+def _read_json(path: Path) -> dict[str, Any]:
     return json.loads(path.read_text(encoding="utf-8"))
 
 
+# Compiled siblings (see ballistics.compile_tables) are used only while they match the source
+# file's mtime and size, so editing a table never serves stale data.
+@metrics.timed("data_store.read_table_json")
+def _read_table_json(path: Path) -> dict[str, Any]:
+    compiled = compiled_format.open_current(path)
+    if compiled is not None:
+        return compiled_format.decode_document(compiled)
+    return _read_json(path)
+
+
+@metrics.timed("data_store.read_table")
+def _read_table(path: Path) -> BallisticTable:
+    compiled = compiled_format.open_current(path)
+    if compiled is not None:
+        return table_from_compiled(compiled)
+    return load_table(path)
+
+
+_directory_index = FileCache(maxsize=DIRECTORY_CACHE_SIZE)
+_json_cache = FileCache(maxsize=JSON_CACHE_SIZE)
+_table_cache = FileCache(maxsize=TABLE_CACHE_SIZE)
+_terrain_cache = FileCache(maxsize=TERRAIN_CACHE_SIZE)
+
+
+class _TrackedSources(threading.local):
+    # A class-level default keeps the untracked lookup free of AttributeError handling.
+    paths: list[Path] | None = None
+
+
+_tracked = _TrackedSources()
+
+
+@contextmanager
+def track_sources() -> Iterator[list[Path]]:
+    """Collects the files and directories read in this thread inside the block.
+
+    Results derived from them (e.g. cached solutions) can then be invalidated when any changes.
+    """
+    previous = _tracked.paths
+    paths: list[Path] = []
+    _tracked.paths = paths
+    try:
+        yield paths
+    finally:
+        _tracked.paths = previous
+
+
+def _track(path: Path) -> None:
+    paths = _tracked.paths
+    if paths is not None:
+        paths.append(path)
+
+
+def _listing(root: Path) -> _DirectoryListing | None:
+    _track(root)
+    try:
+        return _directory_index.get_or_load(root, _scan_directory)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _find_file(directory: Path, name: str) -> Path | None:
+    listing = _listing(directory)
+    if listing is None:
+        return None
+    return listing.files_folded.get(name.lower())
+
+
+def _load_json(path: Path, missing_message: str, loader=_read_json) -> dict[str, Any]:
+    _track(path)
+    try:
+        return _json_cache.get_or_load(path, loader)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"{missing_message}: {path}") from None
+
+
 def _find_directory_case_insensitive(root: Path, name: str) -> Path | None:
-    if not root.exists() or not root.is_dir():
+    listing = _listing(root)
+    if listing is None:
         return None
-    direct = root / name
-    if direct.exists() and direct.is_dir():
-        return direct
-
-    expected = name.lower()
-    for child in root.iterdir():
-        if child.is_dir() and child.name.lower() == expected:
-            return child
-    return None
+    return listing.directories.get(name) or listing.directories_folded.get(name.lower())
 
 
 def _find_projectile_dir(gun_dir: Path, ammo_type: str) -> Path | None:
@@ -53,8 +161,8 @@ def _find_projectile_dir(gun_dir: Path, ammo_type: str) -> Path | None:
 
 
 def _load_muzzle_velocity_from_projectile_profile(projectile_dir: Path, charge: int) -> float | None:
-    profile_path = projectile_dir / "profile.json"
-    if not profile_path.exists():
+    profile_path = _find_file(projectile_dir, "profile.json")
+    if profile_path is None:
         return None
 
     profile = _load_json(profile_path, "Projectile profile missing")
@@ -71,16 +179,26 @@ def _load_muzzle_velocity_from_projectile_profile(projectile_dir: Path, charge:
     return None
 
 
+def _npz_tables(projectile_dir: Path) -> list[Path]:
+    listing = _listing(projectile_dir)
+    if listing is None:
+        return []
+    return sorted(
+        (path for name, path in listing.files_folded.items() if name.endswith(".npz")),
+        key=lambda path: path.name,
+    )
+
+
 def load_ballistic_table(ammo_type: str, charge: int, profile_id: str = "m777") -> dict[str, Any]:
     gun_dir = _find_directory_case_insensitive(TABLES_DIR, profile_id)
     if gun_dir:
         projectile_dir = _find_projectile_dir(gun_dir, ammo_type)
         if projectile_dir:
-            nested_table_file = projectile_dir / f"charge-{charge}.json"
-            if nested_table_file.exists():
-                return _load_json(nested_table_file, "Ballistic table missing")
+            nested_table_file = _find_file(projectile_dir, f"charge-{charge}.json")
+            if nested_table_file is not None:
+                return load_table_document(nested_table_file)
 
-            npz_tables = sorted(projectile_dir.glob("*.npz"))
+            npz_tables = _npz_tables(projectile_dir)
             if npz_tables:
                 muzzle_velocity = _load_muzzle_velocity_from_projectile_profile(projectile_dir, charge)
                 if muzzle_velocity is not None:
@@ -92,15 +210,80 @@ def load_ballistic_table(ammo_type: str, charge: int, profile_id: str = "m777")
                     }
 
     table_file = BALLISTIC_TABLE_DIR / f"{ammo_type.lower()}-charge-{charge}.json"
-    return _load_json(table_file, "Ballistic table missing")
+    return load_table_document(table_file)
+
+
+def load_table_document(path: Path) -> dict[str, Any]:
+    """A legacy JSON ballistic table (``charge-N.json``), from its compiled sibling when current."""
+    return _load_json(path, "Ballistic table missing", _read_table_json)
+
+
+def find_ballistic_table_file(ammo_type: str, profile_id: str, trajectory: str) -> Path | None:
+    gun_dir = _find_directory_case_insensitive(TABLES_DIR, profile_id)
+    if not gun_dir:
+        return None
+
+    projectile_dir = _find_projectile_dir(gun_dir, ammo_type)
+    if not projectile_dir:
+        return None
+
+    return _find_file(projectile_dir, f"ballistic_{trajectory}.npz")
+
+
+def load_npz_table(path: Path) -> BallisticTable:
+    _track(path)
+    try:
+        return _table_cache.get_or_load(path, _read_table)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Ballistic table missing: {path}") from None
 
 
 def load_gun_profile(profile_id: str) -> dict[str, Any]:
     gun_dir = _find_directory_case_insensitive(TABLES_DIR, profile_id)
     if gun_dir:
-        nested_profile_file = gun_dir / "profile.json"
-        if nested_profile_file.exists():
+        nested_profile_file = _find_file(gun_dir, "profile.json")
+        if nested_profile_file is not None:
             return _load_json(nested_profile_file, "Gun profile missing")
 
     profile_file = GUN_PROFILE_DIR / f"{profile_id}.json"
     return _load_json(profile_file, "Gun profile missing")
+
+
+def find_terrain_file() -> Path | None:
+    configured = os.environ.get(TERRAIN_ENV)
+    if configured:
+        return Path(configured)
+    return _find_file(TERRAIN_DIR, TERRAIN_HEADER)
+
+
+def load_terrain() -> TerrainModel | None:
+    """The configured heightmap, or None when there is none. Reloaded when its header changes."""
+    header_path = find_terrain_file()
+    if header_path is None:
+        return None
+    _track(header_path)
+    try:
+        terrain = _terrain_cache.get_or_load(header_path, open_terrain)
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(f"Terrain heightmap missing: {exc.filename or header_path}") from None
+    _track(terrain.data_path)
+    return terrain
+
+
+def cache_stats() -> dict[str, dict[str, float]]:
+    return {
+        "directories": _directory_index.stats(),
+        "json": _json_cache.stats(),
+        "tables": _table_cache.stats(),
+        "terrain": _terrain_cache.stats(),
+    }
+
+
+metrics.register_cache_stats(lambda: {f"data_store.{name}": stats for name, stats in cache_stats().items()})
+
+
+def clear_caches() -> None:
+    _directory_index.clear()
+    _json_cache.clear()
+    _table_cache.clear()
+    _terrain_cache.clear()
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import lzma
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+Position = tuple[int, int]
+
+logger = logging.getLogger("ballistics-core")
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+COMPRESSORS = {"gzip": (".gz", gzip.open), "lzma": (".xz", lzma.open)}
+
+_SEGMENT_RE = re.compile(rf"^{SEGMENT_PREFIX}(\d+){re.escape(SEGMENT_SUFFIX)}(\.gz|\.xz)?$")
+
+
+def segment_sequence(path: Path) -> int | None:
+    match = _SEGMENT_RE.match(path.name)
+    return int(match.group(1)) if match else None
+
+
+def _open_segment(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    if path.suffix == ".xz":
+        return lzma.open(path, "rb")
+    return path.open("rb")
+
+
+def encode_line(payload: dict[str, Any]) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class SegmentJournal:
+    def __init__(
+        self,
+        directory: Path,
+        segment_max_bytes: int = 8 * 1024 * 1024,
+        compression: str | None = "gzip",
+        retention_days: float | None = 90.0,
+        max_segments: int | None = None,
+        fsync: bool = True,
+        stream: str = "",
+        on_expired: Callable[[str, list[int]], None] | None = None,
+    ):
+        if compression is not None and compression not in COMPRESSORS:
+            raise ValueError(f"compression must be one of {sorted(COMPRESSORS)} or None")
+        self.directory = directory
+        # Each writing process owns a stream, a subdirectory only it appends to, seals and expires;
+        # readers address a line by stream and position. "" is the top directory itself.
+        self.stream = stream
+        self.segment_max_bytes = segment_max_bytes
+        self.compression = compression
+        self.retention_days = retention_days
+        self.max_segments = max_segments
+        self.fsync = fsync
+        # Called with the stream and the sequences of the segments retention just removed,
+        # so an index can drop their lines before readers look them up.
+        self.on_expired = on_expired
+
+        self._write_lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._file = None
+        self._sequence = 0
+        self._size = 0
+        self._written = 0
+        self._durable = 0
+        self._sealers: list[threading.Thread] = []
+
+    def stream_directory(self, stream: str | None = None) -> Path:
+        stream = self.stream if stream is None else stream
+        return self.directory / stream if stream else self.directory
+
+    def streams(self) -> list[str]:
+        if not self.directory.exists():
+            return []
+        found = [path.name for path in self.directory.iterdir() if path.is_dir() and self.segments(path.name)]
+        return ([""] if self.segments("") else []) + sorted(found)
+
+    def segments(self, stream: str | None = None) -> list[Path]:
+        directory = self.stream_directory(stream)
+        if not directory.exists():
+            return []
+        # While a segment is being sealed both files exist briefly; the compressed one is complete.
+        found: dict[int, Path] = {}
+        for path in directory.iterdir():
+            sequence = segment_sequence(path)
+            if sequence is not None and (sequence not in found or path.suffix != SEGMENT_SUFFIX):
+                found[sequence] = path
+        return [found[sequence] for sequence in sorted(found)]
+
+    def append(self, payload: dict[str, Any]) -> Position:
+        return self.append_many([payload])[0]
+
+    # Returns the (segment sequence, byte offset) of every appended line, in order.
+    def append_many(self, payloads: Iterable[dict[str, Any]]) -> list[Position]:
+        lines = [encode_line(payload) for payload in payloads]
+        if not lines:
+            return []
+
+        with self._write_lock:
+            handle = self._active_file()
+            positions: list[Position] = []
+            offset = self._size
+            for line in lines:
+                positions.append((self._sequence, offset))
+                offset += len(line)
+            handle.write(b"".join(lines))
+            self._size = offset
+            self._written += 1
+            ticket = self._written
+            if self._size >= self.segment_max_bytes:
+                self._flush(handle)
+                self._durable = ticket
+                self._rollover()
+                return positions
+
+        self._commit(ticket)
+        return positions
+
+    # Group commit: the first writer to reach the commit lock flushes everything written so far,
+    # writers that queued behind it find their ticket already durable and return without an fsync.
+    def _commit(self, ticket: int) -> None:
+        with self._commit_lock:
+            if self._durable >= ticket:
+                return
+            with self._write_lock:
+                if self._file is None:
+                    return
+                target = self._written
+                self._file.flush()
+                # A duplicate descriptor stays valid if a rollover closes the segment meanwhile.
+                descriptor = os.dup(self._file.fileno()) if self.fsync else None
+            if descriptor is not None:
+                try:
+                    os.fsync(descriptor)
+                finally:
+                    os.close(descriptor)
+            self._durable = max(self._durable, target)
+
+    def _flush(self, handle) -> None:
+        handle.flush()
+        if self.fsync:
+            os.fsync(handle.fileno())
+
+    def _active_file(self):
+        if self._file is not None:
+            return self._file
+
+        self.stream_directory().mkdir(parents=True, exist_ok=True)
+        segments = self.segments()
+        for path in segments[:-1]:
+            if path.suffix == SEGMENT_SUFFIX:
+                self._seal(path)
+
+        last = segments[-1] if segments else None
+        if last is not None and last.suffix == SEGMENT_SUFFIX and last.stat().st_size < self.segment_max_bytes:
+            self._sequence = segment_sequence(last)
+        else:
+            self._sequence = (segment_sequence(last) + 1) if last is not None else 1
+        self._file = self._segment_path(self._sequence).open("ab")
+        self._size = self._file.tell()
+        self._apply_retention()
+        return self._file
+
+    def _segment_path(self, sequence: int, stream: str | None = None) -> Path:
+        return self.stream_directory(stream) / f"{SEGMENT_PREFIX}{sequence:08d}{SEGMENT_SUFFIX}"
+
+    def _rollover(self) -> None:
+        sealed = self._segment_path(self._sequence)
+        self._file.close()
+        self._sequence += 1
+        self._file = self._segment_path(self._sequence).open("ab")
+        self._size = 0
+
+        sealer = threading.Thread(target=self._seal, args=(sealed,), name="protocol-journal-seal", daemon=True)
+        self._sealers = [thread for thread in self._sealers if thread.is_alive()]
+        self._sealers.append(sealer)
+        sealer.start()
+        self._apply_retention()
+
+    def _seal(self, path: Path) -> None:
+        if self.compression is None:
+            return
+
+        extension, opener = COMPRESSORS[self.compression]
+        target = path.with_name(path.name + extension)
+        partial = target.with_name(target.name + ".tmp")
+        try:
+            with path.open("rb") as source, opener(partial, "wb") as sink:
+                while chunk := source.read(1024 * 1024):
+                    sink.write(chunk)
+        except FileNotFoundError:
+            partial.unlink(missing_ok=True)  # removed by retention before it was sealed
+            return
+        os.replace(partial, target)
+        path.unlink(missing_ok=True)
+
+    def _apply_retention(self) -> None:
+        active = self._segment_path(self._sequence)
+        sealed = [path for path in self.segments() if segment_sequence(path) != self._sequence]
+        expired: list[Path] = []
+        if self.max_segments is not None and len(sealed) + 1 > self.max_segments:
+            expired.extend(sealed[: len(sealed) + 1 - self.max_segments])
+        if self.retention_days is not None:
+            cutoff = time.time() - self.retention_days * 86400
+            for path in sealed:
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        expired.append(path)
+                except FileNotFoundError:
+                    continue
+
+        removed = []
+        for path in set(expired):
+            if path != active:
+                path.unlink(missing_ok=True)
+                removed.append(segment_sequence(path))
+        if removed and self.on_expired is not None:
+            try:
+                self.on_expired(self.stream, sorted(removed))
+            except Exception:
+                logger.exception("Retention hook failed for %d segments", len(removed))
+
+    def _flush_active(self) -> None:
+        with self._write_lock:
+            if self._file is not None:
+                self._file.flush()
+
+    # Yields (sequence, offset, raw line) for every complete line of a stream strictly after `after`.
+    def scan(self, after: Position | None = None, stream: str | None = None) -> Iterator[tuple[int, int, bytes]]:
+        self._flush_active()
+        for path in self.segments(stream):
+            sequence = segment_sequence(path)
+            if after is not None and sequence < after[0]:
+                continue
+            handle = self._open_for_read(path)
+            if handle is None:
+                continue  # expired while scanning
+            with handle:
+                offset = 0
+                if after is not None and sequence == after[0]:
+                    handle.seek(after[1])
+                    offset = after[1] + len(handle.readline())
+                for line in handle:
+                    if not line.endswith(b"\n"):
+                        break  # torn tail line after a crash, or a write in progress
+                    yield sequence, offset, line
+                    offset += len(line)
+
+    def read_lines(self, positions: Iterable[Position], stream: str | None = None) -> dict[Position, bytes]:
+        self._flush_active()
+        by_segment: dict[int, list[int]] = {}
+        for sequence, offset in positions:
+            by_segment.setdefault(sequence, []).append(offset)
+
+        lines: dict[Position, bytes] = {}
+        for sequence in sorted(by_segment):
+            handle = self._open_for_read(self._segment_path(sequence, stream))
+            if handle is None:
+                continue
+            with handle:
+                # Ascending offsets keep compressed segments to a single forward pass.
+                for offset in sorted(set(by_segment[sequence])):
+                    handle.seek(offset)
+                    line = handle.readline()
+                    if line.endswith(b"\n"):
+                        lines[(sequence, offset)] = line
+        return lines
+
+    def iter_records(self) -> Iterator[dict[str, Any]]:
+        for stream in self.streams():
+            for _, _, line in self.scan(stream=stream):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def _open_for_read(self, path: Path):
+        candidates = [path]
+        if path.suffix == SEGMENT_SUFFIX:
+            candidates.extend(path.with_name(path.name + extension) for extension, _ in COMPRESSORS.values())
+        for candidate in candidates:
+            try:
+                return _open_segment(candidate)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def close(self) -> None:
+        with self._write_lock:
+            if self._file is not None:
+                self._flush(self._file)
+                self._file.close()
+                self._file = None
+        for sealer in self._sealers:
+            sealer.join()
+        self._sealers.clear()
@@ -1,33 +1,126 @@
 from __future__ import annotations
 
+import atexit
+import itertools
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
+from .warmup import worker_name
+
 ROOT = Path(__file__).resolve().parents[3]
 LOG_DIR = ROOT / "logs"
-LOG_DIR.mkdir(parents=True, exist_ok=True)
+# "text" (default) or "json" for one JSON object per line.
+LOG_FORMAT_ENV = "BALLISTICS_LOG_FORMAT"
+# Fraction of INFO records kept under load, e.g. 0.1 keeps every tenth; WARNING and above are never sampled.
+INFO_SAMPLE_ENV = "BALLISTICS_LOG_INFO_SAMPLE"
+TEXT_FORMAT = "%(asctime)s | %(name)s | %(levelname)s | %(message)s"
+CONTEXT_FIELDS = ("mission_id", "operation", "duration_ms")
+
+_listeners: dict[str, tuple[QueueHandler, QueueListener]] = {}
+_exception_formatter = logging.Formatter()
+
+
+class _EnqueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (args may be mutated later); the layout is left to
+        # the formatters on the listener thread, so JSON lines keep the exception as its own field.
+        # This is the logger's only handler, so the record is updated in place instead of copied.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                document[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            document["exception"] = record.exc_text
+        return json.dumps(document, ensure_ascii=False, default=str)
+
+
+class LevelSampler(logging.Filter):
+    """Keeps one record in ``round(1 / rate)`` per sampled level; other levels always pass."""
+
+    def __init__(self, rates: dict[int, float]):
+        super().__init__()
+        self._every = {}
+        for level, rate in rates.items():
+            if not 0 < rate <= 1:
+                raise ValueError("sample rate must be in (0, 1]")
+            self._every[level] = max(1, round(1 / rate))
+        # itertools.count is atomic under the GIL, so request threads never contend on a lock.
+        self._counters = {level: itertools.count() for level in self._every}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = self._every.get(record.levelno)
+        if every is None or every == 1:
+            return True
+        return next(self._counters[record.levelno]) % every == 0
 
 
-def configure_logger(name: str = "ballistics-core") -> logging.Logger:
+def _env_sample_rate() -> float | None:
+    value = os.environ.get(INFO_SAMPLE_ENV)
+    return float(value) if value else None
+
+
+class _LazyRotatingFileHandler(RotatingFileHandler):
+    """Creates its directory and file with the first record, not when the logger is configured."""
+
+    def __init__(self, path: Path):
+        super().__init__(path, maxBytes=1_000_000, backupCount=3, encoding="utf-8", delay=True)
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+
+def configure_logger(
+    name: str = "ballistics-core",
+    json_lines: bool | None = None,
+    info_sample_rate: float | None = None,
+    log_dir: Path | None = None,
+) -> logging.Logger:
+    """Request threads only enqueue records; a QueueListener thread formats and writes them."""
     logger = logging.getLogger(name)
     if logger.handlers:
         return logger
 
+    if json_lines is None:
+        json_lines = os.environ.get(LOG_FORMAT_ENV, "text").lower() == "json"
+    if info_sample_rate is None:
+        info_sample_rate = _env_sample_rate()
+    log_dir = log_dir or LOG_DIR
+
     logger.setLevel(logging.INFO)
-    formatter = logging.Formatter(
-        "%(asctime)s | %(name)s | %(levelname)s | %(message)s"
-    )
+    formatter = JsonLinesFormatter() if json_lines else logging.Formatter(TEXT_FORMAT)
+    suffix = "jsonl" if json_lines else "log"
 
-    info_file = RotatingFileHandler(
-        LOG_DIR / "ballistics-core.log", maxBytes=1_000_000, backupCount=3, encoding="utf-8"
-    )
+    # Forked workers each rotate their own files: a rollover by one would cut the others' lines.
+    stem = f"{name}-{worker}" if (worker := worker_name()) else name
+    info_file = _LazyRotatingFileHandler(log_dir / f"{stem}.{suffix}")
     info_file.setLevel(logging.INFO)
     info_file.setFormatter(formatter)
 
-    error_file = RotatingFileHandler(
-        LOG_DIR / "ballistics-core-errors.log", maxBytes=1_000_000, backupCount=3, encoding="utf-8"
-    )
+    error_file = _LazyRotatingFileHandler(log_dir / f"{stem}-errors.{suffix}")
     error_file.setLevel(logging.ERROR)
     error_file.setFormatter(formatter)
 
@@ -35,9 +128,29 @@ def configure_logger(name: str = "ballistics-core") -> logging.Logger:
     stream.setLevel(logging.INFO)
     stream.setFormatter(formatter)
 
-    logger.addHandler(info_file)
-    logger.addHandler(error_file)
-    logger.addHandler(stream)
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = _EnqueueHandler(records)
+    if info_sample_rate is not None:
+        handler.addFilter(LevelSampler({logging.INFO: info_sample_rate}))
+    listener = QueueListener(records, info_file, error_file, stream, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = (handler, listener)
+
+    logger.addHandler(handler)
     logger.propagate = False
 
     return logger
+
+
+@atexit.register
+def shutdown_logging(name: str | None = None) -> None:
+    """Drains the queued records and stops the listener threads (or only ``name``'s)."""
+    for logger_name in [name] if name is not None else list(_listeners):
+        entry = _listeners.pop(logger_name, None)
+        if entry is None:
+            continue
+        handler, listener = entry
+        logging.getLogger(logger_name).removeHandler(handler)
+        listener.stop()
+        for target in listener.handlers:
+            target.close()
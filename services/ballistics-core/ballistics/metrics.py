@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Iterator
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Solver calls sit in the tens of microseconds, cold table loads and fsyncs in the milliseconds.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Labels = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Labels = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Labels = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: one (non-cumulative) count per bucket plus +Inf, then the sum.
+        self._series: dict[Labels, list[float]] = {}
+
+    def _get_series(self, key: Labels) -> list[float]:
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            return series
+
+    def labels(self, **labels: str) -> "_BoundHistogram":
+        """Resolve the label set once, for hot paths that always observe the same series."""
+        return _BoundHistogram(self, self._get_series(self._key(labels)))
+
+    def observe(self, value: float, **labels: str) -> None:
+        series = self._get_series(self._key(labels))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def time(self, **labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, math.inf), series[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(series[-1])}"
+            yield f"{self.name}_count{labels} {_format_value(cumulative)}"
+
+
+class _BoundHistogram:
+    __slots__ = ("_buckets", "_lock", "_series")
+
+    def __init__(self, histogram: Histogram, series: list[float]):
+        self._buckets = histogram.buckets
+        self._lock = histogram._lock
+        self._series = series
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._series[index] += 1
+            self._series[-1] += value
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: Histogram, labels: dict[str, str]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self._histogram.observe(time.perf_counter() - self._started, **self._labels)
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose samples are read at scrape time, e.g. from cache or queue stats."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Labels = (), kind: str = "gauge"):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self._collectors: list[Callable[[], Iterable[tuple[Labels, float]]]] = []
+
+    def add_collector(self, collect: Callable[[], Iterable[tuple[Labels, float]]]) -> None:
+        with self._lock:
+            self._collectors.append(collect)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            collectors = list(self._collectors)
+        for collect in collectors:
+            for key, value in collect():
+                yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(float(value))}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Labels = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help_text: str, labelnames: Labels = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))  # type: ignore[return-value]
+
+    def callback(self, name: str, help_text: str, labelnames: Labels = (), kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, help_text, labelnames, kind))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            samples = list(metric.samples())
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+function_duration = REGISTRY.histogram(
+    "ballistics_function_duration_seconds", "Duration of ballistics core functions.", ("function",)
+)
+request_duration = REGISTRY.histogram(
+    "ballistics_request_duration_seconds", "HTTP endpoint latency.", ("endpoint",)
+)
+requests_total = REGISTRY.counter("ballistics_requests_total", "HTTP requests by endpoint and status.", ("endpoint", "status"))
+request_errors = REGISTRY.counter(
+    "ballistics_request_errors_total", "HTTP requests that ended with a 4xx/5xx status.", ("endpoint", "status")
+)
+operations_total = REGISTRY.counter(
+    "ballistics_operations_total", "Completed operations (solves, corrections, triangulations).", ("operation",)
+)
+
+_CACHE_FIELDS = {
+    "hit_ratio": REGISTRY.callback("ballistics_cache_hit_ratio", "Cache hit ratio since start.", ("cache",)),
+    "hits": REGISTRY.callback("ballistics_cache_hits_total", "Cache hits.", ("cache",), "counter"),
+    "misses": REGISTRY.callback("ballistics_cache_misses_total", "Cache misses.", ("cache",), "counter"),
+    "evictions": REGISTRY.callback("ballistics_cache_evictions_total", "Cache evictions.", ("cache",), "counter"),
+    "coalesced": REGISTRY.callback(
+        "ballistics_cache_coalesced_total", "Misses that waited for a concurrent load of the same key.", ("cache",), "counter"
+    ),
+    "size": REGISTRY.callback("ballistics_cache_entries", "Entries currently cached.", ("cache",)),
+}
+
+
+def register_cache_stats(collect: Callable[[], dict[str, dict[str, float]]]) -> None:
+    """Expose ``{cache_name: LRUCache.stats()}`` mappings as the ballistics_cache_* metrics."""
+    for field, metric in _CACHE_FIELDS.items():
+        metric.add_collector(
+            lambda field=field: [((name,), stats[field]) for name, stats in sorted(collect().items()) if field in stats]
+        )
+
+
+def timed(function: str):
+    """Record each call of the decorated function in ``ballistics_function_duration_seconds``."""
+
+    def decorator(func):
+        observe = function_duration.labels(function=function).observe
+        clock = time.perf_counter
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(clock() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_endpoint(endpoint: str):
+    """Count and time an endpoint; the status comes from the HTTPException it raises, if any.
+
+    ``async def`` endpoints are timed until their awaited result, queueing in a work pool included.
+    """
+
+    def decorator(func):
+        def record(started: float, status: str) -> None:
+            request_duration.observe(time.perf_counter() - started, endpoint=endpoint)
+            requests_total.inc(endpoint=endpoint, status=status)
+            if int(status) >= 400:
+                request_errors.inc(endpoint=endpoint, status=status)
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                status = "500"
+                try:
+                    response = await func(*args, **kwargs)
+                    status = str(getattr(response, "status_code", 200))
+                    return response
+                except Exception as exc:
+                    status = str(getattr(exc, "status_code", 500))
+                    raise
+                finally:
+                    record(started, status)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status = "500"
+            try:
+                response = func(*args, **kwargs)
+                status = str(getattr(response, "status_code", 200))
+                return response
+            except Exception as exc:
+                status = str(getattr(exc, "status_code", 500))
+                raise
+            finally:
+                record(started, status)
+
+        return wrapper
+
+    return decorator
+
+
+def render() -> str:
+    return REGISTRY.render()
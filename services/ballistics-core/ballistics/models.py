@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import asdict, dataclass, field, replace
+import json
+from dataclasses import MISSING, dataclass, field, fields, is_dataclass, replace
 from datetime import datetime
 from enum import Enum
-from typing import Literal
+from operator import attrgetter
+from types import NoneType
+from typing import Any, Callable, Literal, get_args, get_origin, get_type_hints
 
 
 class AmmoType(str, Enum):
@@ -12,18 +15,33 @@ class AmmoType(str, Enum):
     ILLUM = "ILLUM"
 
 
-def _normalize(value):
-    if isinstance(value, Enum):
-        return value.value
-    if isinstance(value, dict):
-        return {k: _normalize(v) for k, v in value.items()}
-    if isinstance(value, list):
-        return [_normalize(v) for v in value]
-    return value
+class _Model:
+    """pydantic-style helpers over slotted dataclasses.
 
+    ``model_dump`` and ``model_validate`` run per-class encoders/decoders compiled once at import
+    (see _compile_codecs): a dict literal over the fields, converting only enums, datetimes and
+    nested models. Nothing is deep-copied, so lists of plain values are shared with the model.
+    ``model_validate`` only converts types; FastAPI still validates request bodies itself.
+    """
 
-@dataclass
-class WeatherInput:
+    __slots__ = ()
+
+    def model_dump(self, mode: str = "json") -> dict:
+        return self._encode(self)
+
+    def model_dump_json(self) -> str:
+        return json.dumps(self._encode(self), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def model_validate(cls, data: dict):
+        return cls._decode(data)
+
+    def model_copy(self, update: dict | None = None):
+        return replace(self, **(update or {}))
+
+
+@dataclass(slots=True)
+class WeatherInput(_Model):
     temperature_c: float = 15.0
     pressure_hpa: float = 1013.25
     humidity_pct: float = 50
@@ -31,84 +49,246 @@ class WeatherInput:
     wind_direction_deg: float = 0
 
 
-@dataclass
-class Coordinates:
+@dataclass(slots=True)
+class Coordinates(_Model):
     x: float
     y: float
 
 
-@dataclass
-class FireMissionRequest:
+@dataclass(slots=True)
+class FireMissionRequest(_Model):
     mission_id: str
     shooter: Coordinates
     target: Coordinates
-    shooter_alt_m: float
-    target_alt_m: float
+    # Omitted altitudes are read from the terrain heightmap (see ballistics.terrain). Fields
+    # added after the original nine are keyword-only, so positional callers fail loudly
+    # instead of binding an altitude to `weather`.
+    shooter_alt_m: float | None = field(default=None, kw_only=True)
+    target_alt_m: float | None = field(default=None, kw_only=True)
     weather: WeatherInput
     ammo_type: AmmoType
-    charge: int
+    # "auto" tries every charge of every trajectory table and picks one by `selection`;
+    # `trajectory` is then ignored.
+    charge: int | Literal["auto"]
     barrel_profile_id: str
+    trajectory: Literal["low", "high", "direct"] = field(default="low", kw_only=True)
+    selection: Literal["min_time_of_flight", "flattest"] = field(
+        default="min_time_of_flight", kw_only=True
+    )
+    # "point_mass" corrects the table solution by integrating the trajectory in the actual air
+    # density, wind and target altitude (see ballistics.trajectory); needs an NPZ table.
+    weather_model: Literal["table", "point_mass"] = field(default="table", kw_only=True)
 
-    def model_dump(self, mode: str = "json") -> dict:
-        return _normalize(asdict(self))
+
+@dataclass(slots=True)
+class ChargeOption(_Model):
+    charge: int
+    trajectory: str
+    elevation_mils: float
+    flight_time_s: float
+    max_ordinate_m: float
+    drift_m: float
 
 
-@dataclass
-class FireMissionResult:
+@dataclass(slots=True)
+class FireMissionResult(_Model):
     azimuth_deg: float
     elevation_mils: float
     flight_time_s: float
     range_m: float
     drift_m: float
+    # Filled in when the charge was chosen automatically; alternatives are ranked best first.
+    charge: int | None = None
+    trajectory: str | None = None
+    alternatives: list[ChargeOption] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class BatteryGun(_Model):
+    gun_id: str
+    position: Coordinates
+    alt_m: float | None = None
+
+
+@dataclass(slots=True)
+class AimPoint(_Model):
+    x: float
+    y: float
+    alt_m: float | None = None
+
+
+@dataclass(slots=True)
+class BatchFireMissionRequest(_Model):
+    mission_id: str
+    guns: list[BatteryGun]
+    aim_points: list[AimPoint]
+    weather: WeatherInput
+    ammo_type: AmmoType
+    charge: int
+    barrel_profile_id: str
+    trajectory: Literal["low", "high", "direct"] = "low"
+    # Aim points without alt_m use this, or the terrain heightmap when it is omitted too.
+    target_alt_m: float | None = None
+    weather_model: Literal["table", "point_mass"] = "table"
+
+
+@dataclass(slots=True)
+class BatchSolution(_Model):
+    gun_id: str
+    aim_point_index: int
+    solution: FireMissionResult | None = None
+    error: str | None = None
 
-    def model_dump(self, mode: str = "json") -> dict:
-        return _normalize(asdict(self))
 
+@dataclass(slots=True)
+class BatchFireMissionResult(_Model):
+    solutions: list[BatchSolution]
+    solved: int
+    failed: int
 
-@dataclass
-class CorrectionRequest:
+
+@dataclass(slots=True)
+class CoverageRequest(_Model):
+    shooter: Coordinates
+    barrel_profile_id: str
+    # Omitted: the terrain height at the gun, or 0 without a heightmap.
+    shooter_alt_m: float | None = None
+    # Flat terrain at this altitude; omitted: per-cell terrain heights, or the gun's altitude
+    # without a heightmap.
+    target_alt_m: float | None = None
+    ammo_type: AmmoType = AmmoType.HE
+    resolution_m: float = 25.0
+    # Overrides the profile's heading_center_deg for a gun laid on another heading.
+    heading_center_deg: float | None = None
+    weather: WeatherInput = field(default_factory=WeatherInput)
+    selection: Literal["min_time_of_flight", "flattest"] = "min_time_of_flight"
+    tile_size: int = 64
+
+
+@dataclass(slots=True)
+class CorrectionRequest(_Model):
     mission_id: str
     base_solution: FireMissionResult
     observed_impact_offset_m: Coordinates
 
-    def model_dump(self, mode: str = "json") -> dict:
-        return _normalize(asdict(self))
-
 
-@dataclass
-class TriangulationPoint:
+@dataclass(slots=True)
+class TriangulationPoint(_Model):
     observer: Coordinates
     bearing_deg: float
     distance_m: float | None = None
 
 
-@dataclass
-class TriangulationRequest:
+@dataclass(slots=True)
+class TriangulationRequest(_Model):
     mission_id: str
     method: Literal["sound", "crater"]
     points: list[TriangulationPoint] = field(default_factory=list)
+    robust: Literal["none", "huber"] = "huber"
+    bearing_sigma_deg: float | None = None
 
-    def model_dump(self, mode: str = "json") -> dict:
-        return _normalize(asdict(self))
 
-    def model_copy(self, update: dict) -> "TriangulationRequest":
-        return replace(self, **update)
+@dataclass(slots=True)
+class ErrorEllipse(_Model):
+    semi_major_m: float
+    semi_minor_m: float
+    orientation_deg: float
+    confidence_level: float = 0.95
 
 
-@dataclass
-class TriangulationResult:
+@dataclass(slots=True)
+class TriangulationResult(_Model):
     estimated_position: Coordinates
     confidence: float
-
-    def model_dump(self, mode: str = "json") -> dict:
-        return _normalize(asdict(self))
+    covariance_m2: list[list[float]] | None = None
+    error_ellipse: ErrorEllipse | None = None
+    rms_residual_m: float | None = None
+    outliers: list[int] = field(default_factory=list)
 
 
-@dataclass
-class ProtocolRecord:
+@dataclass(slots=True)
+class ProtocolRecord(_Model):
     protocol_id: str
     mission_id: str
     created_at: datetime
     operation: str
     input_data: dict
     result_data: dict
+
+
+def _converters(annotation: Any) -> tuple[Callable | None, Callable | None]:
+    """(encode, decode) for one field type; None where values pass through unchanged."""
+    origin = get_origin(annotation)
+    if origin is list:
+        (item,) = get_args(annotation)
+        encode, decode = _converters(item)
+        return (
+            (lambda values: [encode(value) for value in values]) if encode else None,
+            (lambda values: [decode(value) for value in values]) if decode else None,
+        )
+    if origin is not None:
+        # Optional[X] converts like X; other unions (int | Literal["auto"]) are plain JSON values.
+        options = [option for option in get_args(annotation) if option is not NoneType]
+        if len(options) != 1 or origin is Literal:
+            return None, None
+        encode, decode = _converters(options[0])
+        return (
+            (lambda value: None if value is None else encode(value)) if encode else None,
+            (lambda value: None if value is None else decode(value)) if decode else None,
+        )
+    if isinstance(annotation, type):
+        if issubclass(annotation, _Model):
+            _compile(annotation)
+            return annotation._encode, annotation._decode
+        if issubclass(annotation, Enum):
+            return attrgetter("value"), annotation
+        if issubclass(annotation, datetime):
+            return datetime.isoformat, datetime.fromisoformat
+    return None, None
+
+
+def _compile(cls: type) -> None:
+    if "_encode" in cls.__dict__:
+        return
+    hints = get_type_hints(cls)
+    namespace: dict[str, Any] = {"cls": cls}
+    encoded, required, optional = [], [], []
+    for index, item in enumerate(fields(cls)):
+        encode, decode = _converters(hints[item.name])
+        namespace[f"encode_{index}"] = encode
+        namespace[f"decode_{index}"] = decode
+        value = f"encode_{index}(obj.{item.name})" if encode else f"obj.{item.name}"
+        encoded.append(f"{item.name!r}: {value}")
+        raw = f"data[{item.name!r}]"
+        if item.default is MISSING and item.default_factory is MISSING:
+            required.append(f"{item.name!r}: {f'decode_{index}({raw})' if decode else raw}")
+        else:
+            optional.append(
+                f"    if {item.name!r} in data:\n"
+                f"        kwargs[{item.name!r}] = {f'decode_{index}({raw})' if decode else raw}\n"
+            )
+    source = (
+        f"def encode(obj):\n    return {{{', '.join(encoded)}}}\n"
+        "def decode(data):\n"
+        "    if not isinstance(data, dict):\n"
+        "        raise ValueError(f'{cls.__name__} must be a JSON object')\n"
+        "    try:\n"
+        f"        kwargs = {{{', '.join(required)}}}\n"
+        "    except KeyError as exc:\n"
+        "        raise ValueError(f'{cls.__name__} is missing field {exc.args[0]!r}') from None\n"
+        + "".join(optional)
+        + "    return cls(**kwargs)\n"
+    )
+    exec(source, namespace)  # noqa: S102 - generated from the dataclass fields above
+    cls._encode = staticmethod(namespace["encode"])
+    cls._decode = staticmethod(namespace["decode"])
+
+
+def _compile_codecs() -> None:
+    # The module's own names: dataclass(slots=True) replaces each class with a new one.
+    for value in list(globals().values()):
+        if isinstance(value, type) and issubclass(value, _Model) and is_dataclass(value):
+            _compile(value)
+
+
+_compile_codecs()
@@ -0,0 +1,264 @@
+"""Bounded work pools for the heavy parts of the async endpoints.
+
+Each named pool is a thread (default) or process executor with a cap on requests in flight:
+past ``workers + queue`` new work is rejected with PoolSaturated (503) instead of piling up, and a
+caller stops waiting after ``timeout_s`` (PoolTimeout, 504). Calls given the same ``key`` while one
+is in flight share its result, so a burst of identical solves occupies a single slot.
+
+Pools are configured per name through the environment, e.g. ``BALLISTICS_POOL_SOLVE_WORKERS=8``,
+``BALLISTICS_POOL_SOLVE_QUEUE``, ``BALLISTICS_POOL_SOLVE_TIMEOUT_S`` and
+``BALLISTICS_POOL_COVERAGE_KIND=process``.
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Hashable, TypeVar
+
+from . import metrics, profiling, warmup
+
+POOL_KINDS = ("thread", "process")
+POOL_ENV_PREFIX = "BALLISTICS_POOL_"
+
+T = TypeVar("T")
+
+
+class PoolSaturated(RuntimeError):
+    pass
+
+
+class PoolTimeout(TimeoutError):
+    pass
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    kind: str = "thread"
+    workers: int = 4
+    # Requests allowed to wait for a worker; beyond that new work is rejected.
+    queue: int = 32
+    timeout_s: float = 10.0
+
+    def validate(self, name: str) -> PoolConfig:
+        if self.kind not in POOL_KINDS:
+            raise ValueError(f"pool {name}: kind must be one of {POOL_KINDS}")
+        if self.workers < 1 or self.queue < 0 or self.timeout_s <= 0:
+            raise ValueError(f"pool {name}: workers must be >= 1, queue >= 0 and timeout_s > 0")
+        return self
+
+    @classmethod
+    def from_env(cls, name: str, default: PoolConfig) -> PoolConfig:
+        prefix = f"{POOL_ENV_PREFIX}{name.upper()}_"
+        overrides: dict[str, Any] = {}
+        for field, parse in (("kind", str), ("workers", int), ("queue", int), ("timeout_s", float)):
+            value = os.environ.get(prefix + field.upper())
+            if value:
+                try:
+                    overrides[field] = parse(value)
+                except ValueError as exc:
+                    raise ValueError(f"{prefix}{field.upper()}: {exc}") from exc
+        return replace(default, **overrides).validate(name)
+
+
+# "solve": single and batch fire missions and triangulation; "coverage": reachability rasters,
+# which take seconds and so get a pool of their own that cannot starve the solves.
+DEFAULT_POOLS = {
+    "solve": PoolConfig(workers=min(32, (os.cpu_count() or 1) + 4), queue=64, timeout_s=10.0),
+    "coverage": PoolConfig(workers=2, queue=4, timeout_s=60.0),
+}
+
+
+class _Flight:
+    __slots__ = ("future", "waiter", "waiters")
+
+    def __init__(self, future: Future, waiter: asyncio.Future):
+        self.future = future
+        self.waiter = waiter
+        self.waiters = 0
+
+
+class WorkPool:
+    def __init__(self, name: str, config: PoolConfig):
+        self.name = name
+        self.config = config.validate(name)
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.coalesced = 0
+        self._in_flight = 0
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+        # Only touched from the event loop thread.
+        self._flights: dict[Hashable, _Flight] = {}
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.config.kind == "process":
+                    # Spawned, not forked: the server process runs logging and protocol threads.
+                    # Each process warms its own caches before taking work.
+                    self._executor = ProcessPoolExecutor(
+                        self.config.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=warmup.warm_start,
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(self.config.workers, thread_name_prefix=f"pool-{self.name}")
+            return self._executor
+
+    def _submit(self, func: Callable[..., T], args: tuple) -> Future:
+        with self._lock:
+            if self._in_flight >= self.config.workers + self.config.queue:
+                self.rejected += 1
+                raise PoolSaturated(f"{self.name} pool is saturated, retry later")
+            self._in_flight += 1
+            self.submitted += 1
+        if self.config.kind == "thread":
+            func, args = profiling.request, (func, *args)
+        try:
+            try:
+                future = self._get_executor().submit(func, *args)
+            except BrokenExecutor:
+                # A worker process died (e.g. killed by the OOM killer): start a fresh pool.
+                self._replace_broken_executor()
+                future = self._get_executor().submit(func, *args)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        future.add_done_callback(self._finished)
+        return future
+
+    def _replace_broken_executor(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if not future.cancelled():
+                self.completed += 1
+
+    async def run(self, func: Callable[..., T], *args: Any, key: Hashable | None = None) -> T:
+        """Runs ``func(*args)`` in the pool; ``func`` and its arguments must pickle for process pools."""
+        loop = asyncio.get_running_loop()
+        flight = self._flights.get(key) if key is not None else None
+        if flight is not None and flight.waiter.get_loop() is loop and not flight.future.cancelled():
+            self.coalesced += 1
+        else:
+            future = self._submit(func, args)
+            flight = _Flight(future, asyncio.wrap_future(future, loop=loop))
+            if key is not None:
+                self._flights[key] = flight
+                flight.waiter.add_done_callback(lambda _waiter: self._land(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.waiter), self.config.timeout_s)
+        except TimeoutError as exc:
+            self.timeouts += 1
+            raise PoolTimeout(f"{self.name} pool did not finish within {self.config.timeout_s:g} s") from exc
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.waiter.done():
+                # Nobody waits any more: drop the work if it has not started (a running call
+                # finishes, and in a thread pool still fills the caches).
+                flight.future.cancel()
+
+    def _land(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            in_flight = self._in_flight
+            stats = {
+                "workers": self.config.workers,
+                "in_flight": in_flight,
+                "queued": max(0, in_flight - self.config.workers),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+        stats["timeouts"] = self.timeouts
+        stats["coalesced"] = self.coalesced
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_pools: dict[str, WorkPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> WorkPool:
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = _pools[name] = WorkPool(name, PoolConfig.from_env(name, DEFAULT_POOLS.get(name, PoolConfig())))
+    return pool
+
+
+def configure_pool(name: str, config: PoolConfig) -> WorkPool | None:
+    """Replaces the pool ``name`` (its previous executor is shut down) and returns the old one."""
+    with _pools_lock:
+        previous = _pools.get(name)
+        _pools[name] = WorkPool(name, config)
+    if previous is not None:
+        previous.shutdown(wait=False)
+    return previous
+
+
+def start_pools() -> None:
+    """Creates the default pools so a bad BALLISTICS_POOL_* setting fails at startup."""
+    for name in DEFAULT_POOLS:
+        get_pool(name)
+
+
+def shutdown_pools(wait: bool = True) -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+async def run(pool: str, func: Callable[..., T], *args: Any, key: Hashable | None = None) -> T:
+    return await get_pool(pool).run(func, *args, key=key)
+
+
+def _pool_samples(*fields: str) -> list[tuple[tuple[str, ...], float]]:
+    with _pools_lock:
+        pools = sorted(_pools.items())
+    samples = []
+    for name, pool in pools:
+        stats = pool.stats()
+        if len(fields) == 1:
+            samples.append(((name,), stats[fields[0]]))
+        else:
+            samples.extend(((name, field), stats[field]) for field in fields)
+    return samples
+
+
+metrics.REGISTRY.callback(
+    "ballistics_pool_in_flight", "Work pool calls running or waiting for a worker.", ("pool",)
+).add_collector(lambda: _pool_samples("in_flight"))
+metrics.REGISTRY.callback(
+    "ballistics_pool_queued", "Work pool calls waiting for a worker.", ("pool",)
+).add_collector(lambda: _pool_samples("queued"))
+metrics.REGISTRY.callback(
+    "ballistics_pool_calls_total", "Work pool calls by outcome.", ("pool", "outcome"), "counter"
+).add_collector(lambda: _pool_samples("submitted", "completed", "rejected", "timeouts", "coalesced"))
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import cProfile
+import functools
+import os
+import pstats
+import signal
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parents[3]
+PROFILE_DIR = ROOT / "logs"
+# The admin endpoints and the signal handler exist only when this is set to "1".
+ENABLE_ENV = "BALLISTICS_PROFILING"
+DEFAULT_REQUESTS = 50
+DEFAULT_SECONDS = 30.0
+MAX_REQUESTS = 10_000
+MAX_SECONDS = 600.0
+# Collapsed stacks are rebuilt from cProfile's caller/callee edges; very deep or negligible
+# branches are cut off to keep the output readable.
+MAX_STACK_DEPTH = 64
+MIN_STACK_US = 1
+
+
+def is_enabled() -> bool:
+    return os.environ.get(ENABLE_ENV) == "1"
+
+
+class ProfileSession:
+    """Profiles the next ``requests`` calls and/or everything for ``seconds``, whichever ends first."""
+
+    def __init__(self, requests: int | None, seconds: float | None, directory: Path):
+        self.requests_left = requests
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.directory = directory
+        self.started_at = datetime.now(tz=timezone.utc)
+        self.calls = 0
+        self.skipped = 0
+        self.closed = False
+        self.stats: pstats.Stats | None = None
+        # cProfile (sys.monitoring on 3.12+) allows one active profiler per process, so profiled
+        # calls run one at a time; calls that find it busy pass through unprofiled.
+        self._lock = threading.Lock()
+
+    def run(self, func: Callable, args: tuple, kwargs: dict, count: bool) -> Any:
+        if not self._lock.acquire(blocking=False):
+            self.skipped += 1
+            return func(*args, **kwargs)
+        profile = None
+        try:
+            if self.closed:
+                return func(*args, **kwargs)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler (e.g. a debugger) is active
+                profile = None
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        finally:
+            if profile is not None:
+                self._add(profile, count)
+            self._lock.release()
+            if profile is not None and self.is_done():
+                _finish(self)
+
+    def _add(self, profile: cProfile.Profile, count: bool) -> None:
+        if self.stats is None:
+            self.stats = pstats.Stats(profile)
+        else:
+            self.stats.add(profile)
+        self.calls += 1
+        if count and self.requests_left is not None:
+            self.requests_left -= 1
+
+    def is_done(self) -> bool:
+        if self.requests_left is not None and self.requests_left <= 0:
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def status(self) -> dict[str, Any]:
+        remaining_s = None
+        if self.deadline is not None:
+            remaining_s = round(max(0.0, self.deadline - time.monotonic()), 3)
+        return {
+            "active": not self.closed,
+            "started_at": self.started_at.isoformat(),
+            "requests_remaining": self.requests_left,
+            "seconds_remaining": remaining_s,
+            "profiled_calls": self.calls,
+            "skipped_calls": self.skipped,
+        }
+
+    def write(self) -> dict[str, Any]:
+        with self._lock:
+            self.closed = True
+        result = {**self.status(), "pstats": None, "collapsed": None}
+        if self.stats is None:
+            return result
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = self.directory / f"profile-{self.started_at.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        pstats_path = stem.with_suffix(".pstats")
+        collapsed_path = stem.with_suffix(".collapsed.txt")
+        self.stats.dump_stats(pstats_path)
+        collapsed_path.write_text("".join(f"{line}\n" for line in collapsed_stacks(self.stats)), encoding="utf-8")
+        return {**result, "pstats": str(pstats_path), "collapsed": str(collapsed_path)}
+
+
+def _label(func: tuple[str, int, str]) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        return name.replace(";", ",")
+    return f"{Path(filename).stem}.{name}:{lineno}".replace(";", ",")
+
+
+def collapsed_stacks(stats: pstats.Stats) -> list[str]:
+    """``frame;frame;frame <self microseconds>`` lines for flamegraph.pl / speedscope.
+
+    cProfile keeps only caller -> callee edges, so a function's time is split between its callers in
+    proportion to each edge's cumulative time.
+    """
+    entries = stats.stats  # type: ignore[attr-defined]
+    callees: dict[tuple, dict[tuple, float]] = defaultdict(dict)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3] if isinstance(edge, tuple) else 0.0
+
+    totals: dict[str, float] = defaultdict(float)
+    on_stack: set[tuple] = set()
+
+    def walk(func: tuple, path: tuple[str, ...], cumulative: float) -> None:
+        _, _, self_time, func_cumulative, _ = entries[func]
+        share = min(1.0, cumulative / func_cumulative) if func_cumulative else 0.0
+        stack = (*path, _label(func))
+        totals[";".join(stack)] += self_time * share
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        on_stack.add(func)
+        for callee, edge_cumulative in callees.get(func, {}).items():
+            if callee not in on_stack and callee in entries and edge_cumulative * share * 1e6 >= MIN_STACK_US:
+                walk(callee, stack, edge_cumulative * share)
+        on_stack.discard(func)
+
+    for func, (_, _, _, cumulative, callers) in entries.items():
+        if not callers:
+            walk(func, (), cumulative)
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in sorted(totals.items()) if seconds * 1e6 >= MIN_STACK_US]
+
+
+_session: ProfileSession | None = None
+_last: dict[str, Any] | None = None
+_state_lock = threading.Lock()
+
+
+def start(requests: int | None = None, seconds: float | None = None, directory: Path | None = None) -> dict[str, Any]:
+    global _session
+    if requests is None and seconds is None:
+        requests = DEFAULT_REQUESTS
+    if requests is not None and not 1 <= requests <= MAX_REQUESTS:
+        raise ValueError(f"requests must be between 1 and {MAX_REQUESTS}")
+    if seconds is not None and not 0 < seconds <= MAX_SECONDS:
+        raise ValueError(f"seconds must be > 0 and <= {MAX_SECONDS:g}")
+
+    with _state_lock:
+        if _session is not None:
+            raise RuntimeError("a profile is already running")
+        session = _session = ProfileSession(requests, seconds, directory or PROFILE_DIR)
+    if seconds is not None:
+        timer = threading.Timer(seconds, _finish, args=(session,))
+        timer.daemon = True
+        timer.start()
+    return session.status()
+
+
+def _finish(session: ProfileSession) -> dict[str, Any] | None:
+    global _session, _last
+    with _state_lock:
+        if _session is not session:
+            return None
+        _session = None
+    result = session.write()
+    _last = result
+    return result
+
+
+def stop() -> dict[str, Any] | None:
+    """Ends the running profile and writes its output; None if nothing was running."""
+    session = _session
+    return _finish(session) if session is not None else None
+
+
+def status() -> dict[str, Any]:
+    session = _session
+    if session is not None:
+        return {**session.status(), "last": _last}
+    return {"active": False, "last": _last}
+
+
+def profiled(func: Callable) -> Callable:
+    """Counts each call as a request towards the running profile; a single global check when idle."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return request(func, *args, **kwargs)
+
+    return wrapper
+
+
+def request(func: Callable, *args, **kwargs) -> Any:
+    """Runs ``func`` as one profiled request, e.g. the share of an async endpoint run in a work pool."""
+    session = _session
+    if session is None:
+        return func(*args, **kwargs)
+    return session.run(func, args, kwargs, count=True)
+
+
+def call(func: Callable, *args, **kwargs) -> Any:
+    """Runs ``func`` under the running profile without counting it as a request (background work)."""
+    session = _session
+    if session is None:
+        return func(*args, **kwargs)
+    return session.run(func, args, kwargs, count=False)
+
+
+def install_signal_handler(signum: int | None = None) -> bool:
+    """SIGUSR2 starts a DEFAULT_SECONDS profile, or stops and writes the running one."""
+    signum = signum if signum is not None else getattr(signal, "SIGUSR2", None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def toggle() -> None:
+        if stop() is None:
+            try:
+                start(seconds=DEFAULT_SECONDS)
+            except RuntimeError:
+                pass
+
+    # Work off the signal handler so it never waits on locks held by the interrupted frame.
+    signal.signal(signum, lambda *_: threading.Thread(target=toggle, name="profiler-signal", daemon=True).start())
+    return True
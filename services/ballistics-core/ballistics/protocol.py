@@ -1,19 +1,136 @@
 from __future__ import annotations
 
+import atexit
 import json
-from dataclasses import asdict
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Iterator
 from uuid import uuid4
 
+from . import metrics, warmup
+from .journal import SegmentJournal
 from .models import ProtocolRecord
+from .protocol_index import ProtocolIndex
+from .protocol_writer import ProtocolWriter
 
 
 ROOT = Path(__file__).resolve().parents[3]
 PROTOCOL_DIR = ROOT / "data" / "protocols"
-PROTOCOL_DIR.mkdir(parents=True, exist_ok=True)
+PROTOCOL_INDEX_FILE = "index.sqlite3"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
+_journal: SegmentJournal | None = None
+_index: ProtocolIndex | None = None
+_writer: ProtocolWriter | None = None
+_journal_lock = threading.Lock()
 
+
+def get_journal() -> SegmentJournal:
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                # One stream per forked worker: segment offsets are tracked by the single process appending.
+                _journal = SegmentJournal(PROTOCOL_DIR, stream=warmup.worker_name() or "")
+    return _journal
+
+
+def configure_journal(journal: SegmentJournal | None, index: ProtocolIndex | None = None) -> SegmentJournal | None:
+    global _journal, _index
+    with _journal_lock:
+        previous, _journal = _journal, journal
+        if _index is not None:
+            _index.close()
+        _index = index
+        if journal is not None and index is not None:
+            journal.on_expired = index.forget
+    return previous
+
+
+def get_index() -> ProtocolIndex:
+    global _index
+    if _index is None:
+        journal = get_journal()
+        with _journal_lock:
+            if _index is None:
+                index = ProtocolIndex(journal.directory / PROTOCOL_INDEX_FILE)
+                index.sync(journal)
+                journal.on_expired = index.forget
+                _index = index
+    return _index
+
+
+def _index_written(payloads: list[dict[str, Any]], positions: list[tuple[int, int]]) -> None:
+    get_index().add_many(payloads, positions, get_journal().stream)
+
+
+def get_writer() -> ProtocolWriter:
+    global _writer
+    if _writer is None:
+        get_index()
+        with _journal_lock:
+            if _writer is None:
+                _writer = ProtocolWriter(get_journal, on_written=_index_written)
+    return _writer
+
+
+def configure_writer(writer: ProtocolWriter) -> ProtocolWriter | None:
+    global _writer
+    with _journal_lock:
+        previous, _writer = _writer, writer
+    return previous
+
+
+def writer_stats() -> dict[str, float]:
+    writer = _writer
+    return writer.stats() if writer is not None else {}
+
+
+def _writer_samples(*fields: str) -> list[tuple[tuple[str, ...], float]]:
+    stats = writer_stats()
+    if not stats:
+        return []
+    if len(fields) == 1:
+        return [((), stats[fields[0]])]
+    return [((field,), stats[field]) for field in fields]
+
+
+metrics.REGISTRY.callback(
+    "ballistics_protocol_queue_depth", "Protocol records queued or being written."
+).add_collector(lambda: _writer_samples("depth"))
+metrics.REGISTRY.callback(
+    "ballistics_protocol_writer_lag_seconds", "Age of the oldest protocol record not yet written."
+).add_collector(lambda: _writer_samples("lag_s"))
+metrics.REGISTRY.callback(
+    "ballistics_protocol_records_total", "Protocol records by outcome.", ("outcome",), "counter"
+).add_collector(lambda: _writer_samples("enqueued", "written", "dropped", "rejected", "failed"))
+
+
+def flush_protocols(timeout: float | None = None) -> bool:
+    return _writer.flush(timeout) if _writer is not None else True
+
+
+@atexit.register
+def shutdown_protocols(timeout: float | None = 10.0) -> bool:
+    global _writer
+    with _journal_lock:
+        writer, _writer = _writer, None
+    drained = writer.close(timeout) if writer is not None else True
+    if _journal is not None:
+        _journal.close()
+    if _index is not None:
+        _index.close()
+    return drained
+
+
+def serialize_protocol(record: ProtocolRecord) -> dict[str, Any]:
+    # Not a copy: input_data/result_data are the caller's dicts, fresh from model_dump.
+    return record.model_dump()
+
+
+@metrics.timed("save_protocol")
 def save_protocol(mission_id: str, operation: str, input_data: dict, result_data: dict) -> ProtocolRecord:
     record = ProtocolRecord(
         protocol_id=str(uuid4()),
@@ -24,8 +141,117 @@ def save_protocol(mission_id: str, operation: str, input_data: dict, result_data
         result_data=result_data,
     )
 
-    serialized = asdict(record)
-    serialized["created_at"] = serialized["created_at"].isoformat()
-    output_path = PROTOCOL_DIR / f"{record.protocol_id}.json"
-    output_path.write_text(json.dumps(serialized, indent=2), encoding="utf-8")
+    get_writer().submit(serialize_protocol(record))
     return record
+
+
+def iter_protocols() -> Iterator[dict[str, Any]]:
+    flush_protocols()
+    return get_journal().iter_records()
+
+
+def _parse_time(value: str | None, name: str) -> float | None:
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 timestamp") from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _parse_cursor(cursor: str | None) -> int:
+    if cursor is None:
+        return 0
+    if not cursor.isdigit():
+        raise ValueError("cursor is invalid")
+    return int(cursor)
+
+
+def _indexed_lines(
+    mission_id: str | None,
+    operation: str | None,
+    since: str | None,
+    until: str | None,
+    after_id: int,
+    limit: int,
+) -> tuple[list[bytes], int | None]:
+    journal = get_journal()
+    page: list[bytes] = []
+    # Rows whose segment retention removed after they were queried are skipped; the next rows
+    # fill their place so a page is only short at the end.
+    while True:
+        wanted = limit - len(page)
+        rows = get_index().query(
+            mission_id=mission_id,
+            operation=operation,
+            since=_parse_time(since, "since"),
+            until=_parse_time(until, "until"),
+            after_id=after_id,
+            limit=wanted,
+        )
+        by_stream: dict[str, list[tuple[int, int]]] = {}
+        for _, stream, segment, offset in rows:
+            by_stream.setdefault(stream, []).append((segment, offset))
+        lines = {
+            (stream, position): line
+            for stream, positions in by_stream.items()
+            for position, line in journal.read_lines(positions, stream).items()
+        }
+        keys = [(stream, (segment, offset)) for _, stream, segment, offset in rows]
+        page.extend(lines[key] for key in keys if key in lines)
+        if len(rows) < wanted:
+            return page, None
+        after_id = rows[-1][0]
+        if len(page) == limit:
+            return page, after_id
+
+
+def query_protocols(
+    mission_id: str | None = None,
+    operation: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    cursor: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> dict[str, Any]:
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    flush_protocols(timeout=1.0)
+    lines, last_id = _indexed_lines(mission_id, operation, since, until, _parse_cursor(cursor), limit)
+    return {
+        "items": [json.loads(line) for line in lines],
+        "next_cursor": str(last_id) if last_id is not None else None,
+    }
+
+
+def export_protocols(
+    mission_id: str | None = None,
+    operation: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+) -> Iterator[bytes]:
+    # Validate eagerly so a bad filter fails before the response starts streaming.
+    _parse_time(since, "since")
+    _parse_time(until, "until")
+    flush_protocols(timeout=1.0)
+
+    def stream() -> Iterator[bytes]:
+        after_id: int | None = 0
+        while after_id is not None:
+            lines, after_id = _indexed_lines(mission_id, operation, since, until, after_id, MAX_PAGE_SIZE)
+            yield from lines
+
+    return stream()
+
+
+def load_protocol(protocol_id: str) -> dict[str, Any] | None:
+    flush_protocols()
+    found = get_index().find(protocol_id)
+    if found is None:
+        return None
+    stream, position = found
+    line = get_journal().read_lines([position], stream).get(position)
+    return json.loads(line) if line is not None else None
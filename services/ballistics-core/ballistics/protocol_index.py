@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable
+
+from .journal import Position, SegmentJournal, segment_sequence
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS protocols (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    protocol_id TEXT NOT NULL UNIQUE,
+    mission_id TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    stream TEXT NOT NULL DEFAULT '',
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS protocols_mission ON protocols (mission_id, id);
+CREATE INDEX IF NOT EXISTS protocols_operation ON protocols (operation, id);
+CREATE INDEX IF NOT EXISTS protocols_created ON protocols (created_at, id);
+"""
+_POSITION_INDEX = "CREATE INDEX IF NOT EXISTS protocols_stream_position ON protocols (stream, segment, offset)"
+
+
+def _timestamp(value: str) -> float:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class ProtocolIndex:
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(protocols)")}
+            if "stream" not in columns:
+                # Index files from before per-worker streams: every line is in the top directory.
+                connection.execute("ALTER TABLE protocols ADD COLUMN stream TEXT NOT NULL DEFAULT ''")
+                connection.execute("DROP INDEX IF EXISTS protocols_position")
+            connection.execute(_POSITION_INDEX)
+            self._connection = connection
+        return self._connection
+
+    def add_many(self, payloads: Iterable[dict[str, Any]], positions: Iterable[Position], stream: str = "") -> None:
+        rows = [
+            (
+                payload["protocol_id"],
+                payload["mission_id"],
+                payload["operation"],
+                _timestamp(payload["created_at"]),
+                stream,
+                sequence,
+                offset,
+            )
+            for payload, (sequence, offset) in zip(payloads, positions)
+        ]
+        if not rows:
+            return
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany(
+                    "INSERT OR IGNORE INTO protocols"
+                    " (protocol_id, mission_id, operation, created_at, stream, segment, offset)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def forget(self, stream: str, segments: Iterable[int]) -> None:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany(
+                    "DELETE FROM protocols WHERE stream = ? AND segment = ?",
+                    [(stream, sequence) for sequence in segments],
+                )
+
+    def last_position(self, stream: str = "") -> Position | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT segment, offset FROM protocols WHERE stream = ? ORDER BY segment DESC, offset DESC LIMIT 1",
+                (stream,),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    # Catches the index up with journal lines written after its last entry (e.g. after a crash
+    # between the journal append and the index insert) and forgets segments removed by retention.
+    # Only the journal's own stream: the other streams belong to other processes, which sync them.
+    def sync(self, journal: SegmentJournal, batch_size: int = 1000) -> int:
+        stream = journal.stream
+        segments = journal.segments()
+        if segments:
+            earliest = segment_sequence(segments[0])
+            with self._lock:
+                self._connect().execute("DELETE FROM protocols WHERE stream = ? AND segment < ?", (stream, earliest))
+
+        added = 0
+        payloads: list[dict[str, Any]] = []
+        positions: list[Position] = []
+        for sequence, offset, line in journal.scan(self.last_position(stream)):
+            try:
+                payload = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            payloads.append(payload)
+            positions.append((sequence, offset))
+            if len(payloads) >= batch_size:
+                self.add_many(payloads, positions, stream)
+                added += len(payloads)
+                payloads, positions = [], []
+        self.add_many(payloads, positions, stream)
+        return added + len(payloads)
+
+    def query(
+        self,
+        mission_id: str | None = None,
+        operation: str | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        after_id: int = 0,
+        limit: int = 100,
+    ) -> list[tuple[int, str, int, int]]:
+        clauses = ["id > ?"]
+        params: list[Any] = [after_id]
+        if mission_id is not None:
+            clauses.append("mission_id = ?")
+            params.append(mission_id)
+        if operation is not None:
+            clauses.append("operation = ?")
+            params.append(operation)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        params.append(limit)
+
+        sql = f"SELECT id, stream, segment, offset FROM protocols WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?"
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def find(self, protocol_id: str) -> tuple[str, Position] | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT stream, segment, offset FROM protocols WHERE protocol_id = ?", (protocol_id,)
+            ).fetchone()
+        return (row[0], (row[1], row[2])) if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+from . import metrics, profiling
+from .journal import Position, SegmentJournal
+
+BACKPRESSURE_POLICIES = ("block", "drop-oldest", "reject")
+
+logger = logging.getLogger("ballistics-core")
+
+
+class ProtocolQueueFull(RuntimeError):
+    pass
+
+
+class ProtocolWriter:
+    def __init__(
+        self,
+        journal: SegmentJournal | Callable[[], SegmentJournal],
+        maxsize: int = 10_000,
+        batch_size: int = 256,
+        policy: str = "block",
+        block_timeout_s: float | None = 5.0,
+        on_written: Callable[[list[dict[str, Any]], list[Position]], None] | None = None,
+    ):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"policy must be one of {BACKPRESSURE_POLICIES}")
+        if maxsize < 1 or batch_size < 1:
+            raise ValueError("maxsize and batch_size must be >= 1")
+        self._journal = journal
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.policy = policy
+        self.block_timeout_s = block_timeout_s
+        self.on_written = on_written
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed = 0
+
+        self._queue: deque[tuple[float, dict[str, Any]]] = deque()
+        self._in_flight = 0
+        self._oldest_in_flight: float | None = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def journal(self) -> SegmentJournal:
+        return self._journal() if callable(self._journal) else self._journal
+
+    def submit(self, payload: dict[str, Any]) -> None:
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Protocol writer is closed")
+            self._ensure_started()
+
+            if len(self._queue) >= self.maxsize:
+                if self.policy == "reject":
+                    self.rejected += 1
+                    raise ProtocolQueueFull("Protocol queue is full")
+                if self.policy == "drop-oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif not self._condition.wait_for(lambda: len(self._queue) < self.maxsize, self.block_timeout_s):
+                    self.rejected += 1
+                    raise ProtocolQueueFull("Protocol queue is full")
+
+            self._queue.append((time.monotonic(), payload))
+            self.enqueued += 1
+            self._condition.notify_all()
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="protocol-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._in_flight = len(batch)
+                self._oldest_in_flight = batch[0][0]
+                self._condition.notify_all()
+
+            payloads = [payload for _, payload in batch]
+            try:
+                with metrics.function_duration.time(function="protocol_writer.append_many"):
+                    positions = profiling.call(self.journal.append_many, payloads)
+            except Exception:
+                logger.exception("Failed to write %d protocol records", len(batch))
+                written, failed = 0, len(batch)
+            else:
+                written, failed = len(batch), 0
+                if self.on_written is not None:
+                    try:
+                        profiling.call(self.on_written, payloads, positions)
+                    except Exception:
+                        logger.exception("Protocol write hook failed for %d records", len(batch))
+
+            with self._condition:
+                self.written += written
+                self.failed += failed
+                self._in_flight = 0
+                self._oldest_in_flight = None
+                self._condition.notify_all()
+
+    def depth(self) -> int:
+        return len(self._queue) + self._in_flight
+
+    def lag_s(self) -> float:
+        with self._condition:
+            oldest = self._oldest_in_flight
+            if oldest is None and self._queue:
+                oldest = self._queue[0][0]
+        return 0.0 if oldest is None else time.monotonic() - oldest
+
+    def flush(self, timeout: float | None = None) -> bool:
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and not self._in_flight, timeout)
+
+    def close(self, timeout: float | None = None) -> bool:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        drained = self.flush(0)
+        self.journal.close()
+        return drained
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "depth": self.depth(),
+            "lag_s": round(self.lag_s(), 6),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
@@ -0,0 +1,137 @@
+"""Serve the API from several worker processes that share one warm copy of the tables.
+
+    python -m ballistics.serve [--workers N] [--host HOST] [--port PORT] [--no-compile]
+
+Run from ``services/ballistics-core``. The parent process compiles stale tables to .btbl files,
+maps and loads every table, profile and heightmap (ballistics.warmup), binds the socket and only
+then forks the workers: the tables are read-only file mappings, so their pages are shared by all
+workers through the page cache, and each worker starts with warm caches and a ready ``/ready``.
+The parent restarts workers that die and forwards SIGINT/SIGTERM to them.
+
+Each worker gets a slot number (``BALLISTICS_WORKER_ID``, kept by its replacement after a restart)
+and appends protocols to its own stream ``data/protocols/worker-<slot>/`` and logs to
+``logs/ballistics-core-worker-<slot>.log``: a journal segment or log file has a single writer, while
+the protocol index is one SQLite database shared by all workers.
+
+Without ``os.fork`` (Windows) the workers are uvicorn's spawned processes; each one warms up in
+the background after start and reports ``/ready`` once done.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from . import warmup
+
+logger = logging.getLogger("ballistics-core.serve")
+
+APP = "app:app"
+# A worker that dies within this many seconds of its start is not restarted: it would crash-loop.
+MIN_WORKER_LIFETIME_S = 5.0
+
+
+def _run_worker(sock: socket.socket, args: argparse.Namespace) -> int:
+    # Imported in the worker: the app starts logging and protocol threads, which must not be forked.
+    import uvicorn
+
+    from app import app
+
+    config = uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+    return 0
+
+
+def _fork_worker(sock: socket.socket, args: argparse.Namespace, slot: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 1
+    try:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.environ[warmup.WORKER_ENV] = str(slot)
+        code = _run_worker(sock, args)
+    except BaseException:  # noqa: BLE001 - the worker must never return into the parent's loop
+        logger.exception("Worker %s failed", os.getpid())
+    finally:
+        os._exit(code)
+
+
+def serve_forked(args: argparse.Namespace) -> int:
+    sock = socket.create_server((args.host, args.port), backlog=2048)
+    sock.set_inheritable(True)
+    # pid -> (slot, start time)
+    workers = {_fork_worker(sock, args, slot): (slot, time.monotonic()) for slot in range(args.workers)}
+    stopping = False
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    logger.info("Serving on %s:%s with %d workers", args.host, args.port, args.workers)
+
+    failed = False
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker = workers.pop(pid, None)
+        if worker is None or stopping:
+            continue
+        slot, started = worker
+        code = os.waitstatus_to_exitcode(status)
+        if time.monotonic() - started < MIN_WORKER_LIFETIME_S:
+            logger.error("Worker %s exited with %s right after start, not restarting", pid, code)
+            failed = True
+            continue
+        logger.warning("Worker %s exited with %s, restarting", pid, code)
+        workers[_fork_worker(sock, args, slot)] = (slot, time.monotonic())
+    sock.close()
+    return 1 if failed else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ballistics.serve", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per core)")
+    parser.add_argument("--no-compile", action="store_true", help="do not compile stale tables before loading them")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be >= 1")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(name)s | %(levelname)s | %(message)s")
+
+    if not hasattr(os, "fork"):
+        import uvicorn
+
+        uvicorn.run(APP, host=args.host, port=args.port, workers=args.workers, log_level=args.log_level)
+        return 0
+
+    state = warmup.warm_start(compile=not args.no_compile)
+    logger.info(
+        "Warm start: %d tables (%d compiled), %d profiles, terrain %s in %.2f s",
+        state.tables,
+        state.compiled,
+        state.profiles,
+        "loaded" if state.terrain else "absent",
+        state.duration_s,
+    )
+    return serve_forked(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
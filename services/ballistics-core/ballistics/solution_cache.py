@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Callable, Hashable, TypeVar
+
+from . import data_store, metrics
+from .cache import FileSignature, LRUCache, file_signature
+from .models import Coordinates, FireMissionRequest, FireMissionResult, WeatherInput
+
+SOLUTION_CACHE_SIZE = 4096
+SOLUTION_TTL_S = 600.0
+POSITION_GRID_M = 1.0
+ALTITUDE_STEP_M = 1.0
+# Bucket widths per WeatherInput field.
+WEATHER_STEPS = {
+    "temperature_c": 0.5,
+    "pressure_hpa": 0.25,
+    "humidity_pct": 1.0,
+    "wind_speed_ms": 0.25,
+    "wind_direction_deg": 1.0,
+}
+_WEATHER_FIELDS = tuple(WEATHER_STEPS)
+
+T = TypeVar("T")
+
+
+class SourceTrackedCache(LRUCache):
+    """Values computed from data files, e.g. solutions or coverage rasters.
+
+    Concurrent misses on one key share a single computation (see LRUCache._join_flight). An entry
+    lives for ``ttl_s`` and is dropped as soon as any table, profile or directory read
+    while computing it changes; like FileCache, those are re-stat'ed at most once per
+    ``revalidate_interval_s``. Cached values are shared: treat them as read-only.
+    """
+
+    def __init__(self, maxsize: int, ttl_s: float, revalidate_interval_s: float = 1.0):
+        super().__init__(maxsize)
+        self.ttl_s = ttl_s
+        self.revalidate_interval_s = revalidate_interval_s
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _is_current(self, key: Hashable, entry: tuple, now: float) -> bool:
+        value, sources, created_at, checked_at = entry
+        if now - created_at >= self.ttl_s:
+            self.expirations += 1
+            return False
+        if now - checked_at >= self.revalidate_interval_s:
+            if any(file_signature(path) != signature for path, signature in sources):
+                self.invalidations += 1
+                return False
+            self._data[key] = (value, sources, created_at, now)
+        return True
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], T]) -> T:
+        with self._lock:
+            entry = self._data.get(key)
+            now = time.monotonic()
+            if entry is not None:
+                if self._is_current(key, entry, now):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._data[key]
+            self.misses += 1
+            flight, leader = self._join_flight(key)
+        if not leader:
+            return flight.result()
+
+        # Compute outside the lock; errors are not cached, so a fixed table takes effect at once.
+        try:
+            with data_store.track_sources() as paths:
+                value = compute()
+        except BaseException as exc:
+            self._land_flight(key, flight, error=exc)
+            raise
+        sources: tuple[tuple[Path, FileSignature | None], ...] = tuple(
+            (path, file_signature(path)) for path in dict.fromkeys(paths)
+        )
+        self.put(key, (value, sources, now, now))
+        self._land_flight(key, flight, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self.expirations = 0
+            self.invalidations = 0
+
+    def stats(self) -> dict[str, float]:
+        stats = super().stats()
+        stats["expirations"] = self.expirations
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+class SolutionCache(SourceTrackedCache):
+    """Fire mission solutions keyed by the request snapped to a grid.
+
+    The solver runs on the snapped request, so every request in a bucket gets the same answer
+    whichever came first; only ``range_m`` and ``azimuth_deg`` are the request's own (see
+    with_request_geometry). See SourceTrackedCache for expiry and invalidation.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = SOLUTION_CACHE_SIZE,
+        ttl_s: float = SOLUTION_TTL_S,
+        grid_m: float = POSITION_GRID_M,
+        altitude_step_m: float = ALTITUDE_STEP_M,
+        weather_steps: dict[str, float] | None = None,
+        revalidate_interval_s: float = 1.0,
+    ):
+        super().__init__(maxsize, ttl_s, revalidate_interval_s)
+        self.grid_m = grid_m
+        self.altitude_step_m = altitude_step_m
+        self.weather_steps = {**WEATHER_STEPS, **(weather_steps or {})}
+        if grid_m <= 0 or altitude_step_m <= 0 or any(self.weather_steps[name] <= 0 for name in _WEATHER_FIELDS):
+            raise ValueError("quantization steps must be > 0")
+        self._position_scale = 1.0 / grid_m
+        self._altitude_scale = 1.0 / altitude_step_m
+        self._weather_scales = tuple(1.0 / self.weather_steps[name] for name in _WEATHER_FIELDS)
+
+    def key(self, req: FireMissionRequest) -> Hashable:
+        # Bucket indices rather than snapped floats: a multiply and a round per field keeps the
+        # key (and so a cache hit) in the low microseconds.
+        grid, altitude = self._position_scale, self._altitude_scale
+        temperature, pressure, humidity, wind_speed, wind_direction = self._weather_scales
+        weather = req.weather
+        return (
+            req.barrel_profile_id,
+            req.ammo_type.value,
+            req.charge,
+            req.trajectory,
+            req.selection,
+            req.weather_model,
+            round(req.shooter.x * grid),
+            round(req.shooter.y * grid),
+            round(req.shooter_alt_m * altitude),
+            round(req.target.x * grid),
+            round(req.target.y * grid),
+            round(req.target_alt_m * altitude),
+            round(weather.temperature_c * temperature),
+            round(weather.pressure_hpa * pressure),
+            round(weather.humidity_pct * humidity),
+            round(weather.wind_speed_ms * wind_speed),
+            round((weather.wind_direction_deg % 360.0) * wind_direction) % round(360.0 * wind_direction),
+        )
+
+    def quantize(self, req: FireMissionRequest, key: Hashable | None = None) -> FireMissionRequest:
+        """The request the cached solution for ``req`` is computed from (bucket centres)."""
+        (_, _, _, _, _, _, sx, sy, salt, tx, ty, talt, *weather) = key if key is not None else self.key(req)
+        grid, altitude = self.grid_m, self.altitude_step_m
+        return replace(
+            req,
+            shooter=Coordinates(x=sx * grid, y=sy * grid),
+            target=Coordinates(x=tx * grid, y=ty * grid),
+            shooter_alt_m=salt * altitude,
+            target_alt_m=talt * altitude,
+            weather=WeatherInput(
+                **{name: index * self.weather_steps[name] for name, index in zip(_WEATHER_FIELDS, weather)}
+            ),
+        )
+
+    def get_or_solve(
+        self, req: FireMissionRequest, solve: Callable[[FireMissionRequest], FireMissionResult]
+    ) -> FireMissionResult:
+        key = self.key(req)
+        return self.with_request_geometry(req, self.get_or_compute(key, lambda: solve(self.quantize(req, key))))
+
+    @staticmethod
+    def with_request_geometry(req: FireMissionRequest, result: FireMissionResult) -> FireMissionResult:
+        """``result`` with the range and azimuth of ``req`` rather than of its bucket centre."""
+        dx = req.target.x - req.shooter.x
+        dy = req.target.y - req.shooter.y
+        range_m = round(math.hypot(dx, dy), 3)
+        azimuth_deg = round((math.degrees(math.atan2(dx, dy)) + 360.0) % 360.0, 3)
+        if range_m == result.range_m and azimuth_deg == result.azimuth_deg:
+            return result
+        return replace(result, range_m=range_m, azimuth_deg=azimuth_deg)
+
+
+solution_cache = SolutionCache()
+metrics.register_cache_stats(lambda: {"solver.solutions": solution_cache.stats()})
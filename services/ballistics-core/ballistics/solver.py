@@ -1,36 +1,301 @@
 from __future__ import annotations
 
 import math
+from dataclasses import replace
 
-from .data_store import load_ballistic_table, load_gun_profile
-from .models import FireMissionRequest, FireMissionResult
+from .data_store import (
+    find_ballistic_table_file,
+    load_ballistic_table,
+    load_gun_profile,
+    load_npz_table,
+    load_terrain,
+)
+from .metrics import timed
+from .models import ChargeOption, Coordinates, FireMissionRequest, FireMissionResult, WeatherInput
+from .solution_cache import solution_cache
+from .table_engine import TRAJECTORIES, BallisticTable, TableSolution
+from .terrain import TerrainModel
+from .trajectory import solve_point_mass
+
+DEFAULT_MILS_PER_CIRCLE = 6400.0
+WEATHER_MODELS = ("table", "point_mass")
+# Ranking for charge="auto"; ties fall back to the other measure.
+SELECTION_KEYS = {
+    "min_time_of_flight": lambda option: (option.flight_time_s, option.max_ordinate_m),
+    "flattest": lambda option: (option.max_ordinate_m, option.flight_time_s),
+}
 
 
 def _distance(shooter_x: float, shooter_y: float, target_x: float, target_y: float) -> float:
     return math.hypot(target_x - shooter_x, target_y - shooter_y)
 
 
+def mils_per_radian(profile: dict) -> float:
+    mil_system = profile.get("mil_system") or {}
+    mils_per_circle = mil_system.get("mils_per_circle", DEFAULT_MILS_PER_CIRCLE)
+    return float(mils_per_circle) / (2 * math.pi)
+
+
+def wear_factor(profile: dict) -> float:
+    """The barrel's muzzle velocity relative to a new one's, i.e. to the firing tables'."""
+    return float(profile.get("wear_factor", 1.0))
+
+
+def velocity_factor(weather: WeatherInput, profile: dict) -> float:
+    """Effective muzzle velocity factor of the legacy model for guns without NPZ tables.
+
+    Its temperature and pressure terms are rough multipliers, not firing table corrections: the
+    table path applies only wear_factor and leaves the weather to ``weather_model="point_mass"``.
+    """
+    density_factor = 1.0 + ((weather.pressure_hpa - 1013.25) / 1013.25) * 0.1
+    temperature_factor = 1.0 - ((weather.temperature_c - 15.0) / 100.0)
+    return wear_factor(profile) * temperature_factor / density_factor
+
+
+def table_range_scale(velocity: float) -> float:
+    """Table range per metre of actual range at ``velocity`` times the table's muzzle velocity.
+
+    Ranges (and heights) grow with the square of the muzzle velocity, flight times with it: the
+    table is read at the range a new barrel's round would fly, and its times are scaled by ``velocity``.
+    """
+    if velocity <= 0:
+        raise ValueError("wear_factor must be > 0")
+    return 1.0 / (velocity * velocity)
+
+
+def wind_components(weather: WeatherInput, azimuth_deg: float) -> tuple[float, float]:
+    wind_angle = math.radians(weather.wind_direction_deg - azimuth_deg)
+    return weather.wind_speed_ms * math.sin(wind_angle), weather.wind_speed_ms * math.cos(wind_angle)
+
+
+def _wind_corrected(table: BallisticTable, charge: int, range_m: float, wind_head: float) -> TableSolution | None:
+    # rdelta1 is the range change per 1 m/s of head wind, so aim long (or short) by that amount.
+    # The correction depends on the aimed range itself; two passes converge well below table resolution.
+    solution = table.solve(charge, range_m)
+    for _ in range(2):
+        if solution is None:
+            break
+        solution = table.solve(charge, range_m - wind_head * solution.range_delta_per_ms)
+    return solution
+
+
+def solve_with_table(
+    table: BallisticTable,
+    charge: int,
+    range_m: float,
+    azimuth_deg: float,
+    altitude_delta: float,
+    weather: WeatherInput,
+    mils_per_rad: float,
+    velocity: float = 1.0,
+) -> FireMissionResult:
+    """``velocity`` is the barrel's muzzle velocity relative to the table's (see wear_factor)."""
+    wind_cross, wind_head = wind_components(weather, azimuth_deg)
+    solution = _wind_corrected(table, charge, range_m * table_range_scale(velocity), wind_head)
+    if solution is None:
+        if table.branch(charge) is None:
+            raise ValueError(f"Charge {charge} is not available in {table.trajectory} trajectory table")
+        raise ValueError(f"Range {range_m:.1f} m is outside {table.trajectory} trajectory limits for charge {charge}")
+
+    site_mils = math.atan2(altitude_delta, max(1.0, range_m)) * mils_per_rad
+
+    return FireMissionResult(
+        azimuth_deg=round(azimuth_deg, 3),
+        elevation_mils=round(solution.elevation_mil + site_mils, 3),
+        flight_time_s=round(solution.flight_time_s * velocity, 3),
+        range_m=round(range_m, 3),
+        drift_m=round(wind_cross * solution.drift_per_ms * velocity, 3),
+    )
+
+
+def charge_options(
+    table: BallisticTable,
+    range_m: float,
+    azimuth_deg: float,
+    altitude_delta: float,
+    weather: WeatherInput,
+    mils_per_rad: float,
+    velocity: float = 1.0,
+) -> list[ChargeOption]:
+    """Every charge of ``table`` that reaches ``range_m``, with the same corrections as solve_with_table."""
+    wind_cross, wind_head = wind_components(weather, azimuth_deg)
+    site_mils = math.atan2(altitude_delta, max(1.0, range_m)) * mils_per_rad
+    scale = table_range_scale(velocity)
+    # A scalar sweep: for a single target, bisecting the pre-built branches of all charges is about
+    # three times faster than one numpy pass over them, whose per-call overhead dominates.
+    solutions = [_wind_corrected(table, charge, range_m * scale, wind_head) for charge in table.charges]
+    return [
+        ChargeOption(
+            charge=solution.charge,
+            trajectory=table.trajectory,
+            elevation_mils=round(solution.elevation_mil + site_mils, 3),
+            flight_time_s=round(solution.flight_time_s * velocity, 3),
+            max_ordinate_m=round(solution.max_ordinate_m / scale, 3),
+            drift_m=round(wind_cross * solution.drift_per_ms * velocity, 3),
+        )
+        for solution in solutions
+        if solution is not None
+    ]
+
+
+def _limit(profile: dict, name: str, default: float) -> float:
+    value = profile.get(name)
+    return float(value) if isinstance(value, (int, float)) else default
+
+
+def _check_traverse(profile: dict, azimuth_deg: float) -> None:
+    sector = profile.get("traverse_sector_deg")
+    if not isinstance(sector, (int, float)) or sector >= 360:
+        return
+    center = _limit(profile, "heading_center_deg", 0.0)
+    offset = (azimuth_deg - center + 180.0) % 360.0 - 180.0
+    if abs(offset) > sector / 2:
+        raise ValueError(
+            f"Azimuth {azimuth_deg:.1f} deg is outside the traverse sector {center:g} +/- {sector / 2:g} deg"
+        )
+
+
+def _solve_auto_charge(
+    req: FireMissionRequest, profile: dict, range_m: float, azimuth_deg: float
+) -> FireMissionResult:
+    if req.selection not in SELECTION_KEYS:
+        raise ValueError(f"selection must be one of {tuple(SELECTION_KEYS)}")
+    min_range = _limit(profile, "min_range_m", 0.0)
+    max_range = _limit(profile, "max_range_m", math.inf)
+    if not min_range <= range_m <= max_range:
+        raise ValueError(f"Range {range_m:.1f} m is outside gun limits {min_range:g}-{max_range:g} m")
+    _check_traverse(profile, azimuth_deg)
+
+    options: list[ChargeOption] = []
+    tables = 0
+    for trajectory in TRAJECTORIES:
+        table_file = find_ballistic_table_file(req.ammo_type.value, req.barrel_profile_id, trajectory)
+        if table_file is None:
+            continue
+        tables += 1
+        options.extend(
+            charge_options(
+                load_npz_table(table_file),
+                range_m,
+                azimuth_deg,
+                req.target_alt_m - req.shooter_alt_m,
+                req.weather,
+                mils_per_radian(profile),
+                wear_factor(profile),
+            )
+        )
+    if not tables:
+        raise ValueError(f"charge=auto needs trajectory tables for {req.barrel_profile_id} {req.ammo_type.value}")
+
+    min_elevation = _limit(profile, "min_elevation_mil", -math.inf)
+    max_elevation = _limit(profile, "max_elevation_mil", math.inf)
+    options = [option for option in options if min_elevation <= option.elevation_mils <= max_elevation]
+    if not options:
+        raise ValueError(f"No charge reaches {range_m:.1f} m within the gun's elevation limits")
+    # The direct table (0-250 mil) repeats rows of the low one: one option per charge and elevation,
+    # taken from the first table in TRAJECTORIES order.
+    unique: dict[tuple[int, float], ChargeOption] = {}
+    for option in options:
+        unique.setdefault((option.charge, option.elevation_mils), option)
+    options = list(unique.values())
+
+    options.sort(key=SELECTION_KEYS[req.selection])
+    best = options[0]
+    return FireMissionResult(
+        azimuth_deg=round(azimuth_deg, 3),
+        elevation_mils=best.elevation_mils,
+        flight_time_s=best.flight_time_s,
+        range_m=round(range_m, 3),
+        drift_m=best.drift_m,
+        charge=best.charge,
+        trajectory=best.trajectory,
+        alternatives=options[1:],
+    )
+
+
+def terrain_height(terrain: TerrainModel, point: Coordinates, name: str) -> float:
+    height = terrain.height(point.x, point.y)
+    if height is None:
+        raise ValueError(f"No terrain height at the {name} position ({point.x:.1f}, {point.y:.1f})")
+    return height
+
+
+def fill_altitudes(req: FireMissionRequest) -> FireMissionRequest:
+    """``req`` with omitted shooter/target altitudes read from the terrain heightmap."""
+    if req.shooter_alt_m is not None and req.target_alt_m is not None:
+        return req
+    terrain = load_terrain()
+    if terrain is None:
+        raise ValueError("shooter_alt_m and target_alt_m are required when no terrain heightmap is configured")
+    shooter_alt_m, target_alt_m = req.shooter_alt_m, req.target_alt_m
+    if shooter_alt_m is None:
+        shooter_alt_m = terrain_height(terrain, req.shooter, "shooter")
+    if target_alt_m is None:
+        target_alt_m = terrain_height(terrain, req.target, "target")
+    return replace(req, shooter_alt_m=shooter_alt_m, target_alt_m=target_alt_m)
+
+
+@timed("solve_fire_mission")
 def solve_fire_mission(req: FireMissionRequest) -> FireMissionResult:
-    ballistic = load_ballistic_table(req.ammo_type.value, req.charge, req.barrel_profile_id)
+    """Solves through the solution cache; see ballistics.solution_cache for the quantization.
+
+    Both altitudes must be set, like for compute_fire_mission: callers fill omitted ones with
+    fill_altitudes first, once, so the cache key and the protocol see the same request.
+    """
+    return solution_cache.get_or_solve(req, compute_fire_mission)
+
+
+def compute_fire_mission(req: FireMissionRequest) -> FireMissionResult:
     profile = load_gun_profile(req.barrel_profile_id)
 
     dx = req.target.x - req.shooter.x
     dy = req.target.y - req.shooter.y
     range_m = _distance(req.shooter.x, req.shooter.y, req.target.x, req.target.y)
     azimuth_deg = (math.degrees(math.atan2(dx, dy)) + 360.0) % 360.0
+    if req.weather_model not in WEATHER_MODELS:
+        raise ValueError(f"weather_model must be one of {WEATHER_MODELS}")
+    if req.charge == "auto":
+        if req.weather_model == "point_mass":
+            raise ValueError("weather_model=point_mass needs a fixed charge")
+        return _solve_auto_charge(req, profile, range_m, azimuth_deg)
 
-    density_factor = 1.0 + ((req.weather.pressure_hpa - 1013.25) / 1013.25) * 0.1
-    temperature_factor = 1.0 - ((req.weather.temperature_c - 15.0) / 100.0)
-    barrel_wear_factor = profile.get("wear_factor", 1.0)
-    altitude_delta = req.target_alt_m - req.shooter_alt_m
+    table_file = find_ballistic_table_file(req.ammo_type.value, req.barrel_profile_id, req.trajectory)
+    if req.weather_model == "point_mass":
+        if table_file is None:
+            raise ValueError(
+                f"weather_model=point_mass needs a {req.trajectory} trajectory table for "
+                f"{req.barrel_profile_id} {req.ammo_type.value}"
+            )
+        return solve_point_mass(
+            table_file,
+            req.charge,
+            range_m,
+            azimuth_deg,
+            req.target_alt_m - req.shooter_alt_m,
+            req.weather,
+            mils_per_radian(profile),
+            wear_factor(profile),
+        )
+    if table_file is not None:
+        return solve_with_table(
+            load_npz_table(table_file),
+            req.charge,
+            range_m,
+            azimuth_deg,
+            req.target_alt_m - req.shooter_alt_m,
+            req.weather,
+            mils_per_radian(profile),
+            wear_factor(profile),
+        )
 
-    base_velocity = ballistic["muzzle_velocity_ms"] * barrel_wear_factor
-    effective_velocity = max(40.0, base_velocity * temperature_factor / density_factor)
+    ballistic = load_ballistic_table(req.ammo_type.value, req.charge, req.barrel_profile_id)
+    altitude_delta = req.target_alt_m - req.shooter_alt_m
+    effective_velocity = max(40.0, ballistic["muzzle_velocity_ms"] * velocity_factor(req.weather, profile))
 
     elevation_rad = math.atan2(altitude_delta, max(1.0, range_m)) + (range_m / effective_velocity) / 120.0
     elevation_mils = elevation_rad * 1000
 
-    wind_cross = req.weather.wind_speed_ms * math.sin(math.radians(req.weather.wind_direction_deg - azimuth_deg))
+    wind_cross, _ = wind_components(req.weather, azimuth_deg)
     drift_m = wind_cross * range_m / effective_velocity
     flight_time_s = range_m / effective_velocity
 
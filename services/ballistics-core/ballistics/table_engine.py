@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import ast
+import math
+import struct
+import sys
+import zipfile
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import compiled_format
+
+try:
+    import numpy as np
+except ModuleNotFoundError:  # pragma: no cover - numpy only accelerates batch interpolation
+    np = None
+
+HAS_NUMPY = np is not None
+TRAJECTORIES = ("low", "high", "direct")
+
+_NPY_TYPECODES = {"f4": "f", "f8": "d", "i4": "i", "i8": "q"}
+_COLUMNS = ("tof", "drift1", "rdelta1", "maxy")
+
+
+@dataclass(frozen=True)
+class TableSolution:
+    charge: int
+    trajectory: str
+    range_m: float
+    elevation_mil: float
+    flight_time_s: float
+    drift_per_ms: float
+    range_delta_per_ms: float
+    max_ordinate_m: float
+
+
+def parse_npy(data: bytes) -> array:
+    if data[:6] != b"\x93NUMPY":
+        raise ValueError("Not an .npy payload")
+
+    if data[6] <= 1:
+        (header_len,) = struct.unpack_from("<H", data, 8)
+        offset = 10
+    else:
+        (header_len,) = struct.unpack_from("<I", data, 8)
+        offset = 12
+
+    header = ast.literal_eval(data[offset : offset + header_len].decode("latin1"))
+    descr = header["descr"]
+    typecode = _NPY_TYPECODES.get(descr[1:])
+    if typecode is None or header.get("fortran_order"):
+        raise ValueError(f"Unsupported .npy dtype: {descr}")
+
+    count = math.prod(header["shape"])
+    values = array(typecode)
+    start = offset + header_len
+    values.frombytes(data[start : start + count * values.itemsize])
+    if (descr[0] == ">") != (sys.byteorder == "big"):
+        values.byteswap()
+    return values
+
+
+def format_npy(values: array) -> bytes:
+    """``values`` as a version 1.0 .npy payload (little-endian, 1-D), readable by parse_npy and numpy."""
+    descr = next((code for code, typecode in _NPY_TYPECODES.items() if typecode == values.typecode), None)
+    if descr is None:
+        raise ValueError(f"Unsupported array typecode: {values.typecode}")
+    header = f"{{'descr': '<{descr}', 'fortran_order': False, 'shape': ({len(values)},), }}"
+    # numpy pads the header with spaces so the data starts 64-byte aligned.
+    header += " " * (-(10 + len(header) + 1) % 64) + "\n"
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1") + values.tobytes()
+
+
+def write_npz(path: Path, arrays: dict[str, array]) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, values in arrays.items():
+            archive.writestr(f"{name}.npy", format_npy(values))
+
+
+def read_npz(path: Path) -> dict[str, array]:
+    arrays: dict[str, array] = {}
+    with zipfile.ZipFile(path, "r") as archive:
+        for name in archive.namelist():
+            if name.endswith(".npy"):
+                arrays[name[:-4]] = parse_npy(archive.read(name))
+    return arrays
+
+
+def _monotonic_indices(ranges: array, descending: bool) -> list[int]:
+    finite = [i for i, value in enumerate(ranges) if math.isfinite(value)]
+    if not finite:
+        return []
+
+    peak = max(finite, key=ranges.__getitem__)
+    walk = range(peak + 1, len(ranges)) if descending else range(peak - 1, -1, -1)
+    indices = [peak]
+    for i in walk:
+        value = ranges[i]
+        if math.isfinite(value) and value < ranges[indices[-1]]:
+            indices.append(i)
+    indices.reverse()
+    return indices
+
+
+class RangeBranch:
+    # ranges must be strictly increasing; every sequence only needs len() and indexing, so lists
+    # and memoryviews over a compiled table file both work.
+    def __init__(self, ranges, elevations, columns):
+        self.ranges = ranges
+        self.elevations = elevations
+        self.columns = columns
+        self._vectors = None
+
+    @classmethod
+    def from_arrays(cls, elevations: array, ranges: array, columns: dict[str, array], descending: bool) -> RangeBranch:
+        indices = _monotonic_indices(ranges, descending)
+        return cls(
+            [float(ranges[i]) for i in indices],
+            [float(elevations[i]) for i in indices],
+            {
+                name: [float(values[i]) if i < len(values) else 0.0 for i in indices]
+                for name, values in columns.items()
+            },
+        )
+
+    @property
+    def min_range(self) -> float:
+        return self.ranges[0] if self.ranges else math.inf
+
+    @property
+    def max_range(self) -> float:
+        return self.ranges[-1] if self.ranges else -math.inf
+
+    def interpolate(self, range_m: float) -> dict[str, float] | None:
+        ranges = self.ranges
+        if len(ranges) < 2 or not ranges[0] <= range_m <= ranges[-1]:
+            return None
+
+        right = min(max(bisect_left(ranges, range_m), 1), len(ranges) - 1)
+        left = right - 1
+        weight = (range_m - ranges[left]) / (ranges[right] - ranges[left])
+
+        result = {"elevation": self.elevations[left] + (self.elevations[right] - self.elevations[left]) * weight}
+        for name, values in self.columns.items():
+            result[name] = values[left] + (values[right] - values[left]) * weight
+        return result
+
+    def interpolate_many(self, ranges_m, columns=None):
+        """``columns`` limits the interpolated rows (e.g. ``("elevation", "tof")``); default all."""
+        if np is None:
+            raise RuntimeError("numpy is required for vectorized interpolation")
+
+        if self._vectors is None:
+            self._vectors = {
+                "range": np.asarray(self.ranges, dtype=float),
+                "elevation": np.asarray(self.elevations, dtype=float),
+                **{name: np.asarray(values, dtype=float) for name, values in self.columns.items()},
+            }
+
+        vectors = self._vectors
+        ranges = vectors["range"]
+        names = columns if columns is not None else [name for name in vectors if name != "range"]
+        values = np.asarray(ranges_m, dtype=float)
+        if len(ranges) < 2:
+            return np.zeros(values.shape, dtype=bool), {name: np.full(values.shape, np.nan) for name in names}
+
+        mask = (values >= ranges[0]) & (values <= ranges[-1])
+        rows = {name: np.interp(values, ranges, vectors[name]) for name in names}
+        return mask, rows
+
+
+class BallisticTable:
+    def __init__(self, trajectory: str, charges: tuple[int, ...], meta: dict[str, float], branches: dict[int, RangeBranch]):
+        self.trajectory = trajectory
+        self.charges = charges
+        self.meta = meta
+        self._branches = branches
+
+    @classmethod
+    def from_arrays(cls, trajectory: str, arrays: dict[str, array]) -> BallisticTable:
+        charges = tuple(int(charge) for charge in arrays.get("charges_id", ()))
+        meta = {
+            name[len("meta_") :]: float(values[0])
+            for name, values in arrays.items()
+            if name.startswith("meta_") and len(values)
+        }
+
+        elevations = arrays.get("elev_mil", array("f"))
+        descending = trajectory == "high"
+        branches: dict[int, RangeBranch] = {}
+        for charge in charges:
+            ranges = arrays.get(f"range_c{charge}")
+            if ranges is None:
+                continue
+            columns = {name: arrays.get(f"{name}_c{charge}", array("f")) for name in _COLUMNS}
+            branches[charge] = RangeBranch.from_arrays(elevations, ranges, columns, descending)
+        return cls(trajectory, charges, meta, branches)
+
+    def branch(self, charge: int) -> RangeBranch | None:
+        return self._branches.get(charge)
+
+    def solve(self, charge: int, range_m: float) -> TableSolution | None:
+        branch = self._branches.get(charge)
+        if branch is None:
+            return None
+
+        row = branch.interpolate(range_m)
+        if row is None:
+            return None
+
+        return TableSolution(
+            charge=charge,
+            trajectory=self.trajectory,
+            range_m=range_m,
+            elevation_mil=row["elevation"],
+            flight_time_s=row["tof"],
+            drift_per_ms=row["drift1"],
+            range_delta_per_ms=row["rdelta1"],
+            max_ordinate_m=row["maxy"],
+        )
+
+
+def trajectory_from_path(path: Path) -> str:
+    stem = path.stem.lower()
+    for trajectory in TRAJECTORIES:
+        if stem.endswith(f"_{trajectory}") or stem == trajectory:
+            return trajectory
+    return stem
+
+
+def compile_table(path: Path, arrays: dict[str, array] | None = None) -> bytes:
+    """Flatten an NPZ table and its pre-computed monotonic branches into the compiled format."""
+    if arrays is None:
+        arrays = read_npz(path)
+    table = BallisticTable.from_arrays(trajectory_from_path(path), arrays)
+    compiled: dict[str, object] = dict(arrays)
+    for charge, branch in table._branches.items():
+        compiled[f"branch_c{charge}_range"] = branch.ranges
+        compiled[f"branch_c{charge}_elevation"] = branch.elevations
+        for name, values in branch.columns.items():
+            compiled[f"branch_c{charge}_{name}"] = values
+
+    attributes = {
+        "kind": "npz",
+        "trajectory": table.trajectory,
+        "charges": list(table.charges),
+        "branches": sorted(table._branches),
+        "meta": table.meta,
+        "source": compiled_format.source_attributes(path),
+    }
+    return compiled_format.encode(compiled, attributes)
+
+
+def table_from_compiled(compiled: compiled_format.CompiledBuffer) -> BallisticTable:
+    attributes = compiled.attributes
+    if attributes.get("kind") != "npz":
+        raise ValueError("Compiled table does not hold an NPZ table")
+
+    branches = {
+        charge: RangeBranch(
+            compiled.array(f"branch_c{charge}_range"),
+            compiled.array(f"branch_c{charge}_elevation"),
+            {name: compiled.array(f"branch_c{charge}_{name}") for name in _COLUMNS},
+        )
+        for charge in attributes["branches"]
+    }
+    return BallisticTable(attributes["trajectory"], tuple(attributes["charges"]), attributes["meta"], branches)
+
+
+def load_compiled_table(path: Path) -> BallisticTable:
+    return table_from_compiled(compiled_format.open_compiled(path))
+
+
+def load_table(path: Path) -> BallisticTable:
+    if path.suffix.lower() == compiled_format.COMPILED_SUFFIX:
+        return load_compiled_table(path)
+    return BallisticTable.from_arrays(trajectory_from_path(path), read_npz(path))
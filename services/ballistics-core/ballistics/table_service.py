@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from . import data_store, metrics
+from .cache import FileCache
+from .table_engine import compile_table, read_npz
+
+TABLE_FORMATS = ("json", "binary")
+ENCODED_TABLE_CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class EncodedTable:
+    digest: str
+    json_body: bytes
+    binary_body: bytes | None
+
+    def etag(self, table_format: str) -> str:
+        return f'"{self.digest}-{table_format}"'
+
+    def body(self, table_format: str) -> bytes:
+        if table_format == "binary":
+            if self.binary_body is None:
+                raise ValueError("Binary format is only available for NPZ tables")
+            return self.binary_body
+        return self.json_body
+
+
+def resolve_table_path(relative_path: str) -> Path:
+    tables_dir = data_store.TABLES_DIR.resolve()
+    path = (tables_dir / relative_path.lstrip("/")).resolve()
+    if not path.is_relative_to(tables_dir) or path.suffix.lower() not in {".npz", ".json"}:
+        raise ValueError("path must point to a .npz or .json table under tables/")
+    if not path.is_file():
+        raise FileNotFoundError(f"Table not found: {relative_path}")
+    return path
+
+
+def _charge_id(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+# Same shape as the ui-server NPZ parser, minus the row-oriented rangeTable copy of every column;
+# the browser loader rebuilds rows (and derives dElev/tofPer100m) when those are absent.
+def columnar_npz_table(arrays: dict[str, Any]) -> dict[str, Any]:
+    elev = arrays.get("elev_mil", [])
+    charges = [_charge_id(charge) for charge in arrays.get("charges_id", [])]
+    by_charge = {
+        charge: {
+            "range": list(arrays.get(f"range_c{charge}", [])),
+            "elevationMil": list(elev),
+            "tof": list(arrays.get(f"tof_c{charge}", [])),
+            "dElev": list(arrays.get(f"delev_c{charge}", [])),
+            "tofPer100m": list(arrays.get(f"tofPer100m_c{charge}", [])),
+        }
+        for charge in charges
+    }
+    drag = arrays.get("meta_air_drag")
+    mass = arrays.get("meta_mass")
+    return {
+        "format": "legacy-npz",
+        "elevMil": list(elev),
+        "charges": charges,
+        "byCharge": by_charge,
+        "meta": {
+            "dragCoeff": drag[0] if drag else None,
+            "massKg": mass[0] if mass else None,
+        },
+    }
+
+
+# The binary format is the compiled table layout (ballistics/compiled_format.py), byte-identical
+# to what `python -m ballistics.compile_tables` writes next to the NPZ file.
+@metrics.timed("table_service.encode_table")
+def _encode_table(path: Path) -> EncodedTable:
+    if path.suffix.lower() == ".npz":
+        arrays = read_npz(path)
+        payload = columnar_npz_table(arrays)
+        binary_body = compile_table(path, arrays)
+    else:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        binary_body = None
+
+    json_body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    digest = hashlib.sha1(json_body)
+    if binary_body is not None:
+        digest.update(binary_body)
+    return EncodedTable(digest=digest.hexdigest()[:20], json_body=json_body, binary_body=binary_body)
+
+
+_encoded_tables = FileCache(maxsize=ENCODED_TABLE_CACHE_SIZE)
+
+
+def load_encoded_table(relative_path: str) -> EncodedTable:
+    return _encoded_tables.get_or_load(resolve_table_path(relative_path), _encode_table)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def cache_stats() -> dict[str, float]:
+    return _encoded_tables.stats()
+
+
+metrics.register_cache_stats(lambda: {"table_service.encoded": cache_stats()})
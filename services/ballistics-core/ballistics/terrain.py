@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+from dataclasses import asdict, fields
+from pathlib import Path
+from typing import Any, Sequence
+
+from map_calibration import CalibrationModel, ControlPoint, calibrate_from_points
+
+from .cache import LRUCache
+from .table_engine import np
+
+# A heightmap is a raw little-endian float32 grid, row-major, next to a JSON header:
+#   {"data": "heightmap.f32", "width": W, "height": H, "nodata": -9999,
+#    "calibration": {"scale_x": ..., "scale_y": ..., "offset_x": ..., "offset_y": ..., ...}}
+# or, instead of "calibration", "control_points": [{"map_x", "map_y", "game_x", "game_y"}, ...]
+# with an optional "method" (see map_calibration.calibrate_from_points). Map coordinates are grid
+# positions: the sample at (row, col) sits at map point (col, row).
+DATA_SUFFIX = ".f32"
+TILE_SIZE = 256
+TILE_CACHE_SIZE = 64
+_CALIBRATION_FIELDS = tuple(field.name for field in fields(CalibrationModel) if field.name != "residuals")
+
+
+def _float32(value: float) -> float:
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+class TerrainModel:
+    """Bilinear heights over a memory-mapped heightmap; nothing is read until a lookup needs it.
+
+    Single lookups go through an LRU of tiles copied out of the mapping. Tiles overlap their
+    neighbours by one sample, so the four corners of a lookup always come from one tile.
+    """
+
+    def __init__(
+        self,
+        data,
+        width: int,
+        height: int,
+        calibration: CalibrationModel,
+        nodata: float | None = None,
+        tile_size: int = TILE_SIZE,
+        tile_cache_size: int = TILE_CACHE_SIZE,
+        data_path: Path | None = None,
+    ):
+        if width < 2 or height < 2:
+            raise ValueError("Heightmap must be at least 2 x 2 samples")
+        if tile_size < 1:
+            raise ValueError("tile_size must be >= 1")
+        self._view = memoryview(data).cast("B")
+        if len(self._view) < width * height * 4:
+            raise ValueError(f"Heightmap data holds fewer than {width} x {height} float32 samples")
+        self.columns = width
+        self.rows = height
+        self.calibration = calibration
+        self.nodata = _float32(nodata) if nodata is not None else None
+        self.tile_size = tile_size
+        self.data_path = data_path
+        self._tiles = LRUCache(tile_cache_size)
+        # Batch lookups gather straight from the mapping; only the touched pages are read.
+        self._grid = None
+        if np is not None:
+            self._grid = np.frombuffer(self._view, dtype="<f4", count=width * height).reshape(height, width)
+
+    def _load_tile(self, key: tuple[int, int]) -> tuple[array, int]:
+        row0, col0 = key[0] * self.tile_size, key[1] * self.tile_size
+        rows = min(self.tile_size + 1, self.rows - row0)
+        cols = min(self.tile_size + 1, self.columns - col0)
+        values = array("f")
+        for row in range(row0, row0 + rows):
+            start = (row * self.columns + col0) * 4
+            values.frombytes(self._view[start : start + cols * 4])
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values, cols
+
+    def height(self, x: float, y: float) -> float | None:
+        """Terrain height at game point (x, y); None outside the map or next to a nodata sample."""
+        col, row = self.calibration.to_map(x, y)
+        if not (0.0 <= col <= self.columns - 1 and 0.0 <= row <= self.rows - 1):
+            return None
+        c = min(int(col), self.columns - 2)
+        r = min(int(row), self.rows - 2)
+        key = (r // self.tile_size, c // self.tile_size)
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = self._load_tile(key)
+            self._tiles.put(key, tile)
+        values, stride = tile
+        index = (r - key[0] * self.tile_size) * stride + c - key[1] * self.tile_size
+        corners = (values[index], values[index + 1], values[index + stride], values[index + stride + 1])
+        if self.nodata is not None and self.nodata in corners:
+            return None
+        fx, fy = col - c, row - r
+        top = corners[0] + (corners[1] - corners[0]) * fx
+        bottom = corners[2] + (corners[3] - corners[2]) * fx
+        value = top + (bottom - top) * fy
+        return None if math.isnan(value) else value
+
+    # An (N, 2) numpy array gives an array with NaN where the height is unknown; any other iterable
+    # of (x, y) pairs gives a list with None, like to_game_many in map_calibration.
+    def heights(self, points) -> Any:
+        if self._grid is None or not isinstance(points, np.ndarray):
+            if self._grid is not None:
+                values = self.heights(np.asarray(list(points), dtype=np.float64).reshape(-1, 2))
+                return [None if math.isnan(value) else value for value in values.tolist()]
+            return [self.height(x, y) for x, y in points]
+
+        pairs = points.reshape(-1, 2)
+        mapped = self.calibration.to_map_many(pairs)
+        col, row = mapped[:, 0], mapped[:, 1]
+        inside = (col >= 0) & (col <= self.columns - 1) & (row >= 0) & (row <= self.rows - 1)
+        c = np.clip(np.floor(np.nan_to_num(col)), 0, self.columns - 2).astype(np.intp)
+        r = np.clip(np.floor(np.nan_to_num(row)), 0, self.rows - 2).astype(np.intp)
+        fx, fy = col - c, row - r
+        grid = self._grid
+        a, b = grid[r, c].astype(np.float64), grid[r, c + 1].astype(np.float64)
+        d, e = grid[r + 1, c].astype(np.float64), grid[r + 1, c + 1].astype(np.float64)
+        top = a + (b - a) * fx
+        value = top + (d + (e - d) * fx - top) * fy
+        if self.nodata is not None:
+            inside &= (a != self.nodata) & (b != self.nodata) & (d != self.nodata) & (e != self.nodata)
+        return np.where(inside, value, np.nan).reshape(points.shape[:-1])
+
+    def tile_stats(self) -> dict[str, float]:
+        return self._tiles.stats()
+
+
+def _calibration(header: dict[str, Any]) -> CalibrationModel:
+    if "calibration" in header:
+        values = header["calibration"]
+        return CalibrationModel(**{name: float(values[name]) for name in _CALIBRATION_FIELDS if name in values})
+    if "control_points" in header:
+        points = [ControlPoint(**point) for point in header["control_points"]]
+        return calibrate_from_points(points, header.get("method", "affine"))
+    raise ValueError("Heightmap header needs calibration or control_points")
+
+
+def open_terrain(header_path: Path) -> TerrainModel:
+    header = json.loads(header_path.read_text(encoding="utf-8"))
+    data_path = header_path.parent / header.get("data", header_path.with_suffix(DATA_SUFFIX).name)
+    with data_path.open("rb") as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    return TerrainModel(
+        mapped,
+        int(header["width"]),
+        int(header["height"]),
+        _calibration(header),
+        nodata=header.get("nodata"),
+        tile_size=int(header.get("tile_size", TILE_SIZE)),
+        data_path=data_path,
+    )
+
+
+def write_terrain(
+    header_path: Path,
+    width: int,
+    height: int,
+    values: Sequence[float],
+    calibration: CalibrationModel,
+    nodata: float | None = None,
+) -> Path:
+    """Write ``values`` (row-major, ``width * height``) as a heightmap; returns the data file's path."""
+    if len(values) != width * height:
+        raise ValueError("values must hold width x height samples")
+    data_path = header_path.with_suffix(DATA_SUFFIX)
+    samples = array("f", values)
+    if sys.byteorder != "little":
+        samples.byteswap()
+    data_path.write_bytes(samples.tobytes())
+    calibration_fields = {name: value for name, value in asdict(calibration).items() if name in _CALIBRATION_FIELDS}
+    header: dict[str, Any] = {"data": data_path.name, "width": width, "height": height, "calibration": calibration_fields}
+    if nodata is not None:
+        header["nodata"] = nodata
+    header_path.write_text(json.dumps(header, indent=2), encoding="utf-8")
+    return data_path
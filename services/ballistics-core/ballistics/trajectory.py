@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import math
+from pathlib import Path
+from typing import Any, Sequence
+
+from . import metrics
+from .data_store import load_npz_table
+from .metrics import timed
+from .models import FireMissionResult, WeatherInput
+from .solution_cache import SourceTrackedCache
+from .table_engine import BallisticTable, RangeBranch, np
+
+GRAVITY = 9.81
+# Dry air at 15 degC and 1013.25 hPa, the atmosphere the NPZ tables are computed for.
+STANDARD_DENSITY = 1.225
+DRY_AIR_GAS_CONSTANT = 287.058
+VAPOUR_GAS_CONSTANT = 461.495
+# The tables are integrated with explicit Euler at meta_dt; Heun's method at a ten times longer
+# step is as accurate and ten times cheaper. The table-relative corrections below cancel the
+# remaining step error anyway.
+STEP_SCALE = 10
+DEFAULT_DT = 0.003
+DEFAULT_MAX_TIME_S = 120.0
+# Candidate elevations per fan: every FAN_STRIDE-th elevation of the table branch; without numpy
+# the pure-Python integrator gets at most PYTHON_FAN_LANES lanes.
+FAN_STRIDE = 4
+PYTHON_FAN_LANES = 48
+VELOCITY_LANES = 32
+VELOCITY_ROUNDS = 3
+FAN_CACHE_SIZE = 256
+FAN_TTL_S = 600.0
+# Met buckets: air density ratio, head and cross wind (m/s), target altitude delta (m).
+DENSITY_STEP = 0.002
+WIND_STEP_MS = 0.25
+ALTITUDE_STEP_M = 2.0
+
+
+def air_density_ratio(weather: WeatherInput) -> float:
+    """Humid air density relative to STANDARD_DENSITY (Tetens formula for vapour pressure)."""
+    kelvin = weather.temperature_c + 273.15
+    saturation = 610.78 * math.exp(17.27 * weather.temperature_c / (weather.temperature_c + 237.3))
+    vapour = min(max(weather.humidity_pct, 0.0), 100.0) / 100.0 * saturation
+    pressure = weather.pressure_hpa * 100.0
+    density = (pressure - vapour) / (DRY_AIR_GAS_CONSTANT * kelvin) + vapour / (VAPOUR_GAS_CONSTANT * kelvin)
+    return density / STANDARD_DENSITY
+
+
+class PointMassModel:
+    """Projectile parameters from a table's meta_* arrays.
+
+    ``step_scale=1`` integrates at the table's own meta_dt, as the table builder does.
+    """
+
+    def __init__(self, meta: dict[str, float], step_scale: int = STEP_SCALE):
+        if not meta.get("air_drag") or not meta.get("mass"):
+            raise ValueError("Ballistic table has no meta_air_drag/meta_mass for the point-mass model")
+        self.drag_per_mass = meta["air_drag"] / meta["mass"]
+        self.dt = meta.get("dt", DEFAULT_DT) * step_scale
+        self.max_time_s = meta.get("ttl", DEFAULT_MAX_TIME_S)
+
+    def integrate(
+        self,
+        velocities,
+        elevations_rad,
+        density_ratio: float = 1.0,
+        head_wind_ms: float | Sequence[float] = 0.0,
+        cross_wind_ms: float | Sequence[float] = 0.0,
+        target_alt_m: float = 0.0,
+    ) -> dict[str, Any]:
+        """Fly one lane per (velocity, elevation) pair until it descends through ``target_alt_m``.
+
+        Winds are one value for all lanes or one per lane. Returns arrays (numpy) or lists
+        ``range``, ``tof``, ``drift`` and ``maxy``; lanes that never reach the target altitude
+        within ``max_time_s`` get NaN.
+        """
+        drag = self.drag_per_mass * density_ratio
+        if np is not None:
+            velocities = np.asarray(velocities, dtype=float)
+            elevations = np.asarray(elevations_rad, dtype=float)
+            head = np.broadcast_to(np.asarray(head_wind_ms, dtype=float), velocities.shape)
+            cross = np.broadcast_to(np.asarray(cross_wind_ms, dtype=float), velocities.shape)
+            return self._integrate_numpy(velocities, elevations, drag, head, cross, target_alt_m)
+        velocities, elevations = list(velocities), list(elevations_rad)
+        head = list(head_wind_ms) if isinstance(head_wind_ms, Sequence) else [head_wind_ms] * len(velocities)
+        cross = list(cross_wind_ms) if isinstance(cross_wind_ms, Sequence) else [cross_wind_ms] * len(velocities)
+        return self._integrate_python(velocities, elevations, drag, head, cross, target_alt_m)
+
+    def _integrate_numpy(self, velocities, elevations, drag, head, cross, target_alt):
+        lanes = velocities.size
+        out = {name: np.full(lanes, np.nan) for name in ("range", "tof", "drift", "maxy")}
+        index = np.arange(lanes)
+        x = np.zeros(lanes)
+        y = np.zeros(lanes)
+        z = np.zeros(lanes)
+        vx = velocities * np.cos(elevations)
+        vy = velocities * np.sin(elevations)
+        vz = np.zeros(lanes)
+        maxy = np.zeros(lanes)
+        dt, half = self.dt, self.dt / 2
+        t = 0.0
+        while index.size and t < self.max_time_s:
+            # Heun: average the drag at the start and at the Euler-predicted end of the step.
+            rx, rz = vx + head, vz - cross
+            c = drag * np.sqrt(rx * rx + vy * vy + rz * rz)
+            ax, ay, az = -c * rx, -GRAVITY - c * vy, -c * rz
+            px, py, pz = vx + ax * dt, vy + ay * dt, vz + az * dt
+            rx, rz = px + head, pz - cross
+            c = drag * np.sqrt(rx * rx + py * py + rz * rz)
+            nvx = vx + (ax - c * rx) * half
+            nvy = vy + (ay - GRAVITY - c * py) * half
+            nvz = vz + (az - c * rz) * half
+            nx = x + (vx + nvx) * half
+            ny = y + (vy + nvy) * half
+            nz = z + (vz + nvz) * half
+            t += dt
+
+            # Lanes descending below the target are done; those that were above it a step ago
+            # cross it, the rest never climbed that high and stay NaN.
+            finished = (ny < target_alt) & (nvy < 0)
+            if finished.any():
+                landed = finished & (y >= target_alt)
+                f = (y[landed] - target_alt) / (y[landed] - ny[landed])
+                lanes_landed = index[landed]
+                out["range"][lanes_landed] = x[landed] + (nx[landed] - x[landed]) * f
+                out["tof"][lanes_landed] = t - dt + dt * f
+                out["drift"][lanes_landed] = z[landed] + (nz[landed] - z[landed]) * f
+                out["maxy"][lanes_landed] = maxy[landed]
+                keep = ~finished
+                index = index[keep]
+                x, y, z, vx, vy, vz, maxy = nx[keep], ny[keep], nz[keep], nvx[keep], nvy[keep], nvz[keep], maxy[keep]
+                head, cross = head[keep], cross[keep]
+            else:
+                x, y, z, vx, vy, vz = nx, ny, nz, nvx, nvy, nvz
+            np.maximum(maxy, y, out=maxy)
+        return out
+
+    def _integrate_python(self, velocities, elevations, drag, heads, crosses, target_alt):
+        out: dict[str, list[float]] = {name: [] for name in ("range", "tof", "drift", "maxy")}
+        dt, half = self.dt, self.dt / 2
+        for velocity, elevation, head, cross in zip(velocities, elevations, heads, crosses):
+            x = y = z = vz = maxy = t = 0.0
+            vx, vy = velocity * math.cos(elevation), velocity * math.sin(elevation)
+            row = (math.nan, math.nan, math.nan, math.nan)
+            while t < self.max_time_s:
+                rx, rz = vx + head, vz - cross
+                c = drag * math.sqrt(rx * rx + vy * vy + rz * rz)
+                ax, ay, az = -c * rx, -GRAVITY - c * vy, -c * rz
+                px, py, pz = vx + ax * dt, vy + ay * dt, vz + az * dt
+                rx, rz = px + head, pz - cross
+                c = drag * math.sqrt(rx * rx + py * py + rz * rz)
+                nvx = vx + (ax - c * rx) * half
+                nvy = vy + (ay - GRAVITY - c * py) * half
+                nvz = vz + (az - c * rz) * half
+                nx, ny, nz = x + (vx + nvx) * half, y + (vy + nvy) * half, z + (vz + nvz) * half
+                t += dt
+                if ny < target_alt and nvy < 0:
+                    if y >= target_alt:
+                        f = (y - target_alt) / (y - ny)
+                        row = (x + (nx - x) * f, t - dt + dt * f, z + (nz - z) * f, maxy)
+                    break
+                x, y, z, vx, vy, vz = nx, ny, nz, nvx, nvy, nvz
+                maxy = max(maxy, y)
+            for name, value in zip(out, row):
+                out[name].append(value)
+        return out
+
+
+def _finite(value: float) -> bool:
+    return value == value and value not in (math.inf, -math.inf)
+
+
+def fit_muzzle_velocity(model: PointMassModel, elevation_rad: float, range_m: float) -> float:
+    """The muzzle velocity whose standard-atmosphere trajectory at ``elevation_rad`` lands at ``range_m``.
+
+    Batched bisection: each round flies VELOCITY_LANES candidates at once and keeps the bracket
+    around the table range.
+    """
+    low, high = 1.0, 3000.0
+    for _ in range(VELOCITY_ROUNDS):
+        step = (high - low) / (VELOCITY_LANES - 1)
+        candidates = [low + step * lane for lane in range(VELOCITY_LANES)]
+        ranges = list(model.integrate(candidates, [elevation_rad] * VELOCITY_LANES)["range"])
+        above = next((lane for lane, value in enumerate(ranges) if _finite(value) and value >= range_m), None)
+        if above is None:
+            raise ValueError(f"No muzzle velocity up to {high:g} m/s reaches the table range {range_m:.1f} m")
+        if above == 0:
+            return candidates[0]
+        low, high = candidates[above - 1], candidates[above]
+        below = ranges[above - 1]
+        if _finite(below) and ranges[above] > below:
+            # Narrow the next round around the linear estimate.
+            estimate = low + (high - low) * (range_m - below) / (ranges[above] - below)
+            width = (high - low) / 8
+            low, high = max(low, estimate - width), min(high, estimate + width)
+    return (low + high) / 2
+
+
+def _fan(
+    table: BallisticTable,
+    charge: int,
+    velocity: float,
+    mils_per_rad: float,
+    density_ratio: float,
+    head_wind_ms: float,
+    cross_wind_ms: float,
+    target_alt_m: float,
+) -> RangeBranch:
+    branch = table.branch(charge)
+    stride = FAN_STRIDE if np is not None else max(FAN_STRIDE, math.ceil(len(branch.elevations) / PYTHON_FAN_LANES))
+    elevations = list(branch.elevations[::stride])
+    if elevations[-1] != branch.elevations[-1]:
+        elevations.append(branch.elevations[-1])
+    rows = PointMassModel(table.meta).integrate(
+        [velocity] * len(elevations),
+        [elevation / mils_per_rad for elevation in elevations],
+        density_ratio,
+        head_wind_ms,
+        cross_wind_ms,
+        target_alt_m,
+    )
+    columns = {name: list(rows[name]) for name in ("tof", "drift", "maxy")}
+    return RangeBranch.from_arrays(elevations, list(rows["range"]), columns, descending=table.trajectory == "high")
+
+
+class FanCache(SourceTrackedCache):
+    """Point-mass fans (range -> elevation, tof, drift, maxy) per table, charge and met bucket."""
+
+    def __init__(self, maxsize: int = FAN_CACHE_SIZE, ttl_s: float = FAN_TTL_S):
+        super().__init__(maxsize, ttl_s)
+
+    def muzzle_velocity(self, table_file: Path, charge: int, mils_per_rad: float) -> float:
+        """Muzzle velocity of ``charge`` fitted to the middle row of its table branch."""
+
+        def fit() -> float:
+            table = load_npz_table(table_file)
+            branch = table.branch(charge)
+            if branch is None or len(branch.ranges) < 2:
+                raise ValueError(f"Charge {charge} is not available in {table.trajectory} trajectory table")
+            # Away from the flat ends of the branch, where range barely depends on velocity.
+            middle = len(branch.ranges) // 2
+            model = PointMassModel(table.meta)
+            return fit_muzzle_velocity(model, branch.elevations[middle] / mils_per_rad, branch.ranges[middle])
+
+        return self.get_or_compute(("velocity", str(table_file), charge, round(mils_per_rad, 6)), fit)
+
+    def fan(
+        self,
+        table_file: Path,
+        charge: int,
+        mils_per_rad: float,
+        density_ratio: float = 1.0,
+        head_wind_ms: float = 0.0,
+        cross_wind_ms: float = 0.0,
+        target_alt_m: float = 0.0,
+    ) -> RangeBranch:
+        # Fans are flown at the bucket centres, so every request in a bucket gets the same answer.
+        key = (
+            str(table_file),
+            charge,
+            round(mils_per_rad, 6),
+            round(density_ratio / DENSITY_STEP),
+            round(head_wind_ms / WIND_STEP_MS),
+            round(cross_wind_ms / WIND_STEP_MS),
+            round(target_alt_m / ALTITUDE_STEP_M),
+        )
+        _, _, _, density, head, cross, altitude = key
+        velocity = self.muzzle_velocity(table_file, charge, mils_per_rad)
+        return self.get_or_compute(
+            key,
+            lambda: _fan(
+                load_npz_table(table_file),
+                charge,
+                velocity,
+                mils_per_rad,
+                density * DENSITY_STEP,
+                head * WIND_STEP_MS,
+                cross * WIND_STEP_MS,
+                altitude * ALTITUDE_STEP_M,
+            ),
+        )
+
+
+fan_cache = FanCache()
+metrics.register_cache_stats(lambda: {"trajectory.fans": fan_cache.stats()})
+
+
+@timed("solve_point_mass")
+def solve_point_mass(
+    table_file: Path,
+    charge: int,
+    range_m: float,
+    azimuth_deg: float,
+    altitude_delta: float,
+    weather: WeatherInput,
+    mils_per_rad: float,
+    wear_factor: float = 1.0,
+) -> FireMissionResult:
+    """Table solution corrected by the point-mass model for ``weather`` and ``altitude_delta``.
+
+    The correction is the difference between a fan flown in the actual met and altitude and one
+    flown in the table's standard atmosphere; in standard weather on level ground it is zero.
+    The barrel's ``wear_factor`` scales the table range, times and drift as in
+    solver.solve_with_table; the solution and both fans are read at that same table range.
+    """
+    if wear_factor <= 0:
+        raise ValueError("wear_factor must be > 0")
+    table = load_npz_table(table_file)
+    table_range = range_m / (wear_factor * wear_factor)
+    solution = table.solve(charge, table_range)
+    if solution is None:
+        if table.branch(charge) is None:
+            raise ValueError(f"Charge {charge} is not available in {table.trajectory} trajectory table")
+        raise ValueError(f"Range {range_m:.1f} m is outside {table.trajectory} trajectory limits for charge {charge}")
+
+    wind_angle = math.radians(weather.wind_direction_deg - azimuth_deg)
+    standard = fan_cache.fan(table_file, charge, mils_per_rad).interpolate(table_range)
+    actual = fan_cache.fan(
+        table_file,
+        charge,
+        mils_per_rad,
+        air_density_ratio(weather),
+        weather.wind_speed_ms * math.cos(wind_angle),
+        weather.wind_speed_ms * math.sin(wind_angle),
+        altitude_delta,
+    ).interpolate(table_range)
+    if standard is None or actual is None:
+        raise ValueError(
+            f"Range {range_m:.1f} m is outside {table.trajectory} trajectory limits for charge {charge} in this weather"
+        )
+
+    flight_time_s = solution.flight_time_s + actual["tof"] - standard["tof"]
+    return FireMissionResult(
+        azimuth_deg=round(azimuth_deg, 3),
+        elevation_mils=round(solution.elevation_mil + actual["elevation"] - standard["elevation"], 3),
+        flight_time_s=round(flight_time_s * wear_factor, 3),
+        range_m=round(range_m, 3),
+        drift_m=round(actual["drift"] * wear_factor, 3),
+    )
@@ -1,68 +1,252 @@
 from __future__ import annotations
 
 import math
-
-from .models import Coordinates, TriangulationRequest, TriangulationResult
-
-
-def triangulate(req: TriangulationRequest) -> TriangulationResult:
-    intersections: list[tuple[float, float]] = []
-    polar_positions: list[tuple[float, float]] = []
-
-    for point in req.points:
-        if point.distance_m is None:
-            continue
-
-        if point.distance_m < 0:
-            raise ValueError("distance_m must be >= 0")
-
+from dataclasses import dataclass
+from typing import Iterable
+
+from .metrics import timed
+from .models import Coordinates, ErrorEllipse, TriangulationPoint, TriangulationRequest, TriangulationResult
+
+# A-priori bearing accuracy per method; line residuals are scaled by observer-to-target range,
+# so the angular error becomes a cross-track error in metres.
+BEARING_SIGMA_DEG = {"sound": 2.0, "crater": 1.0}
+MIN_SIGMA_M = 1.0
+HUBER_K = 1.345
+OUTLIER_SIGMA = 3.0
+MAX_ITERATIONS = 20
+CONVERGENCE_M = 1e-3
+CHI2_2DOF_95 = 5.991
+
+
+@dataclass(frozen=True)
+class Observation:
+    observer_x: float
+    observer_y: float
+    normal_x: float
+    normal_y: float
+    # Bearing-only observations constrain the distance to their bearing line (one degree of freedom);
+    # polar ones (bearing + distance) pin a point (two degrees of freedom).
+    point: tuple[float, float] | None = None
+
+    @classmethod
+    def from_point(cls, point: TriangulationPoint) -> Observation:
         azimuth = math.radians(point.bearing_deg)
-        x = point.observer.x + math.sin(azimuth) * point.distance_m
-        y = point.observer.y + math.cos(azimuth) * point.distance_m
-        polar_positions.append((x, y))
-
-    if polar_positions:
-        x = sum(p[0] for p in polar_positions) / len(polar_positions)
-        y = sum(p[1] for p in polar_positions) / len(polar_positions)
-
-        confidence_multiplier = 0.8 if req.method == "sound" else 0.9
-        confidence = min(1.0, confidence_multiplier * len(polar_positions) / max(1, len(req.points)))
-
-        return TriangulationResult(
-            estimated_position=Coordinates(x=round(x, 3), y=round(y, 3)),
-            confidence=round(confidence, 3),
+        east, north = math.sin(azimuth), math.cos(azimuth)
+        fix = None
+        if point.distance_m is not None:
+            if point.distance_m < 0:
+                raise ValueError("distance_m must be >= 0")
+            fix = (point.observer.x + east * point.distance_m, point.observer.y + north * point.distance_m)
+        return cls(point.observer.x, point.observer.y, north, -east, fix)
+
+    @property
+    def dof(self) -> int:
+        return 1 if self.point is None else 2
+
+    def residual(self, x: float, y: float) -> float:
+        if self.point is None:
+            return self.normal_x * (x - self.observer_x) + self.normal_y * (y - self.observer_y)
+        return math.hypot(x - self.point[0], y - self.point[1])
+
+    def sigma(self, x: float, y: float, bearing_sigma_rad: float) -> float:
+        if self.point is None:
+            distance = math.hypot(x - self.observer_x, y - self.observer_y)
+        else:
+            distance = math.hypot(self.point[0] - self.observer_x, self.point[1] - self.observer_y)
+        return max(MIN_SIGMA_M, distance * bearing_sigma_rad)
+
+
+class NormalEquations:
+    """Running 2x2 weighted least-squares system; each observation is an O(1) update."""
+
+    __slots__ = ("axx", "axy", "ayy", "bx", "by", "cc")
+
+    def __init__(self):
+        self.axx = self.axy = self.ayy = self.bx = self.by = self.cc = 0.0
+
+    def add(self, observation: Observation, weight: float = 1.0) -> None:
+        if observation.point is None:
+            nx, ny = observation.normal_x, observation.normal_y
+            offset = nx * observation.observer_x + ny * observation.observer_y
+            self.axx += weight * nx * nx
+            self.axy += weight * nx * ny
+            self.ayy += weight * ny * ny
+            self.bx += weight * nx * offset
+            self.by += weight * ny * offset
+            self.cc += weight * offset * offset
+        else:
+            px, py = observation.point
+            self.axx += weight
+            self.ayy += weight
+            self.bx += weight * px
+            self.by += weight * py
+            self.cc += weight * (px * px + py * py)
+
+    def squared_residuals(self, x: float, y: float) -> float:
+        """Weighted sum of squared residuals at (x, y), from the accumulated sums alone."""
+        value = (
+            self.axx * x * x + 2 * self.axy * x * y + self.ayy * y * y
+            - 2 * (self.bx * x + self.by * y) + self.cc
+        )
+        return max(value, 0.0)
+
+    def determinant(self) -> float:
+        return self.axx * self.ayy - self.axy * self.axy
+
+    def is_singular(self) -> bool:
+        trace = self.axx + self.ayy
+        return trace <= 0 or self.determinant() <= 1e-9 * trace * trace
+
+    def solve(self) -> tuple[float, float] | None:
+        if self.is_singular():
+            return None
+        det = self.determinant()
+        return (
+            (self.ayy * self.bx - self.axy * self.by) / det,
+            (self.axx * self.by - self.axy * self.bx) / det,
         )
 
-    for i, p1 in enumerate(req.points[:-1]):
-        for p2 in req.points[i + 1 :]:
-            a1 = math.radians(p1.bearing_deg)
-            a2 = math.radians(p2.bearing_deg)
+    def inverse(self) -> tuple[float, float, float]:
+        det = self.determinant()
+        return self.ayy / det, -self.axy / det, self.axx / det
+
+
+def error_ellipse(cxx: float, cxy: float, cyy: float, chi2: float = CHI2_2DOF_95, level: float = 0.95) -> ErrorEllipse:
+    half_trace = (cxx + cyy) / 2
+    spread = math.hypot((cxx - cyy) / 2, cxy)
+    major = max(half_trace + spread, 0.0)
+    minor = max(half_trace - spread, 0.0)
+    # Direction of the major axis as a map azimuth (clockwise from +y/north), folded to [0, 180).
+    angle = 0.5 * math.atan2(2 * cxy, cyy - cxx)
+    return ErrorEllipse(
+        semi_major_m=round(math.sqrt(chi2 * major), 3),
+        semi_minor_m=round(math.sqrt(chi2 * minor), 3),
+        orientation_deg=round(math.degrees(angle) % 180.0, 3),
+        confidence_level=level,
+    )
 
-            v1x, v1y = math.sin(a1), math.cos(a1)
-            v2x, v2y = math.sin(a2), math.cos(a2)
 
-            det = v1x * (-v2y) - (-v2x) * v1y
-            if abs(det) < 1e-6:
-                continue
+def _huber(normalized: float, reject: bool) -> float:
+    magnitude = abs(normalized)
+    if reject and magnitude > OUTLIER_SIGMA:
+        return 0.0
+    return 1.0 if magnitude <= HUBER_K else HUBER_K / magnitude
+
+
+def _weighted_system(
+    observations: list[Observation],
+    estimate: tuple[float, float],
+    bearing_sigma_rad: float,
+    robust: bool,
+    reject: bool,
+) -> tuple[NormalEquations, list[float]]:
+    system = NormalEquations()
+    weights = []
+    for observation in observations:
+        sigma = observation.sigma(*estimate, bearing_sigma_rad)
+        weight = 1.0 / (sigma * sigma)
+        if robust:
+            weight *= _huber(observation.residual(*estimate) / sigma, reject)
+        system.add(observation, weight)
+        weights.append(weight)
+    return system, weights
+
+
+def least_squares_fix(
+    observations: Iterable[Observation],
+    bearing_sigma_deg: float,
+    robust: bool = True,
+) -> tuple[tuple[float, float], NormalEquations, list[float]]:
+    observations = list(observations)
+    bearing_sigma_rad = math.radians(bearing_sigma_deg)
+
+    system = NormalEquations()
+    for observation in observations:
+        system.add(observation)
+    estimate = system.solve()
+    if estimate is None:
+        raise ValueError("Unable to triangulate with provided bearings")
 
-            dx = p2.observer.x - p1.observer.x
-            dy = p2.observer.y - p1.observer.y
-            t1 = (dx * (-v2y) - (-v2x) * dy) / det
+    # Iteratively reweighted least squares: range-dependent sigmas, plus Huber down-weighting of
+    # observations whose residual is large relative to that sigma. Once that has converged, a second
+    # round drops observations beyond OUTLIER_SIGMA entirely, since Huber alone still lets a gross
+    # outlier pull the fix along the poorly conditioned (range) axis.
+    rounds = (False, True) if robust else (False,)
+    result = None
+    for reject in rounds:
+        for _ in range(MAX_ITERATIONS):
+            system, weights = _weighted_system(observations, estimate, bearing_sigma_rad, robust, reject)
+            updated = system.solve()
+            if updated is None:
+                break
+            shift = math.hypot(updated[0] - estimate[0], updated[1] - estimate[1])
+            estimate = updated
+            result = (estimate, system, weights)
+            if shift < CONVERGENCE_M:
+                break
+    if result is None:
+        raise ValueError("Unable to triangulate with provided bearings")
+    return result
 
-            ix = p1.observer.x + v1x * t1
-            iy = p1.observer.y + v1y * t1
-            intersections.append((ix, iy))
 
-    if not intersections:
+@timed("triangulate")
+def triangulate(req: TriangulationRequest) -> TriangulationResult:
+    observations = [Observation.from_point(point) for point in req.points]
+    if not observations:
         raise ValueError("Unable to triangulate with provided bearings")
 
-    x = sum(p[0] for p in intersections) / len(intersections)
-    y = sum(p[1] for p in intersections) / len(intersections)
+    bearing_sigma_deg = req.bearing_sigma_deg
+    if bearing_sigma_deg is None:
+        bearing_sigma_deg = BEARING_SIGMA_DEG.get(req.method, 2.0)
+    if bearing_sigma_deg <= 0:
+        raise ValueError("bearing_sigma_deg must be > 0")
+    (x, y), system, weights = least_squares_fix(observations, bearing_sigma_deg, robust=req.robust == "huber")
+
+    bearing_sigma_rad = math.radians(bearing_sigma_deg)
+    chi2 = 0.0
+    residual_sq = 0.0
+    outliers = []
+    for index, (observation, weight) in enumerate(zip(observations, weights)):
+        residual = observation.residual(x, y)
+        chi2 += weight * residual * residual
+        residual_sq += residual * residual
+        if abs(residual) > OUTLIER_SIGMA * observation.sigma(x, y, bearing_sigma_rad):
+            outliers.append(index)
+
+    dof = sum(observation.dof for observation in observations) - 2
+    has_polar = any(observation.point is not None for observation in observations)
+    return build_result(
+        (x, y), system.inverse(), chi2, dof, residual_sq, len(observations), outliers, has_polar, req.method
+    )
 
-    confidence_multiplier = 0.7 if req.method == "sound" else 0.85
-    confidence = min(1.0, confidence_multiplier * len(intersections) / len(req.points))
 
+def build_result(
+    estimate: tuple[float, float],
+    inverse: tuple[float, float, float],
+    chi2: float,
+    dof: int,
+    residual_sq: float,
+    count: int,
+    outliers: list[int],
+    has_polar: bool,
+    method: str,
+) -> TriangulationResult:
+    # Scale the a-priori covariance up (never down) when residuals exceed the assumed accuracy.
+    variance_factor = max(1.0, chi2 / dof) if dof > 0 else 1.0
+    cxx, cxy, cyy = (value * variance_factor for value in inverse)
+
+    if has_polar:
+        confidence_multiplier = 0.8 if method == "sound" else 0.9
+    else:
+        confidence_multiplier = 0.7 if method == "sound" else 0.85
+    confidence = min(1.0, confidence_multiplier * (count - len(outliers)) / count)
+
+    x, y = estimate
     return TriangulationResult(
         estimated_position=Coordinates(x=round(x, 3), y=round(y, 3)),
         confidence=round(confidence, 3),
+        covariance_m2=[[round(cxx, 3), round(cxy, 3)], [round(cxy, 3), round(cyy, 3)]],
+        error_ellipse=error_ellipse(cxx, cxy, cyy),
+        rms_residual_m=round(math.sqrt(residual_sq / count), 3),
+        outliers=outliers,
     )
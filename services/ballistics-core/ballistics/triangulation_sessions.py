@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from .models import TriangulationPoint, TriangulationResult
+from .triangulation import (
+    BEARING_SIGMA_DEG,
+    OUTLIER_SIGMA,
+    NormalEquations,
+    Observation,
+    build_result,
+    least_squares_fix,
+)
+
+SESSION_TTL_S = 1800.0
+MAX_SESSIONS = 1024
+# Observations kept for an on-demand full refit; the running estimate itself only needs the sums.
+MAX_SESSION_OBSERVATIONS = 2000
+# Range assumed for weighting until the session has its first fix.
+NOMINAL_RANGE_M = 5000.0
+
+
+class TriangulationSession:
+    def __init__(self, mission_id: str, method: str):
+        self.mission_id = mission_id
+        self.method = method
+        self.bearing_sigma_rad = math.radians(BEARING_SIGMA_DEG.get(method, 2.0))
+        self.weighted = NormalEquations()
+        self.plain = NormalEquations()
+        self.observations: deque[Observation] = deque(maxlen=MAX_SESSION_OBSERVATIONS)
+        self.count = 0
+        self.dof = 0
+        self.has_polar = False
+        self.rejected: list[int] = []
+        self.estimate: tuple[float, float] | None = None
+        self.updated_at = time.monotonic()
+
+    def _sigma(self, observation: Observation) -> float:
+        if self.estimate is not None:
+            return observation.sigma(*self.estimate, self.bearing_sigma_rad)
+        if observation.point is not None:
+            return observation.sigma(*observation.point, self.bearing_sigma_rad)
+        return NOMINAL_RANGE_M * self.bearing_sigma_rad
+
+    def add(self, point: TriangulationPoint) -> bool:
+        """Fold one observation into the running sums in O(1); returns False if it was gated out."""
+        observation = Observation.from_point(point)
+        index = self.count
+        self.count += 1
+        self.observations.append(observation)
+        self.updated_at = time.monotonic()
+
+        sigma = self._sigma(observation)
+        # Only gate once the fix is over-determined; with an exact fix every newcomer looks suspect.
+        if self.estimate is not None and self.dof > 2:
+            if abs(observation.residual(*self.estimate)) > OUTLIER_SIGMA * sigma:
+                self.rejected.append(index)
+                return False
+
+        self.weighted.add(observation, 1.0 / (sigma * sigma))
+        self.plain.add(observation)
+        self.dof += observation.dof
+        self.has_polar = self.has_polar or observation.point is not None
+        self.estimate = self.weighted.solve() or self.estimate
+        return True
+
+    def result(self) -> TriangulationResult | None:
+        if self.estimate is None or self.weighted.is_singular():
+            return None
+        return build_result(
+            self.estimate,
+            self.weighted.inverse(),
+            self.weighted.squared_residuals(*self.estimate),
+            self.dof - 2,
+            self.plain.squared_residuals(*self.estimate),
+            self.count,
+            self.rejected,
+            self.has_polar,
+            self.method,
+        )
+
+    def refit(self) -> TriangulationResult | None:
+        """Full robust IRLS over the retained observations; rebuilds the running sums from it."""
+        observations = list(self.observations)
+        if not observations:
+            return None
+        try:
+            estimate, weighted, weights = least_squares_fix(
+                observations, math.degrees(self.bearing_sigma_rad), robust=True
+            )
+        except ValueError:
+            return None
+
+        offset = self.count - len(observations)
+        plain = NormalEquations()
+        self.rejected = [index for index in self.rejected if index < offset]
+        self.dof = 0
+        for index, (observation, weight) in enumerate(zip(observations, weights)):
+            if weight == 0.0:
+                self.rejected.append(offset + index)
+                continue
+            plain.add(observation)
+            self.dof += observation.dof
+        self.weighted, self.plain, self.estimate = weighted, plain, estimate
+        return self.result()
+
+    def summary(self) -> dict:
+        return {
+            "mission_id": self.mission_id,
+            "method": self.method,
+            "observations": self.count,
+            "rejected": len(self.rejected),
+            "result": self.result(),
+        }
+
+
+class TriangulationSessionStore:
+    def __init__(self, ttl_s: float = SESSION_TTL_S, maxsize: int = MAX_SESSIONS):
+        self.ttl_s = ttl_s
+        self.maxsize = maxsize
+        self.expired = 0
+        self._sessions: OrderedDict[tuple[str, str], TriangulationSession] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        # Sessions are kept in last-update order, so expired ones are always at the front.
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session.updated_at < self.ttl_s and len(self._sessions) <= self.maxsize:
+                break
+            del self._sessions[key]
+            self.expired += 1
+
+    def add(self, mission_id: str, method: str, point: TriangulationPoint) -> dict:
+        key = (mission_id, method)
+        with self._lock:
+            session = self._sessions.pop(key, None) or TriangulationSession(mission_id, method)
+            try:
+                accepted = session.add(point)
+            finally:
+                if session.count:
+                    self._sessions[key] = session
+                self._evict(time.monotonic())
+            return {**session.summary(), "accepted": accepted}
+
+    def get(self, mission_id: str, method: str, refit: bool = False) -> dict | None:
+        with self._lock:
+            self._evict(time.monotonic())
+            session = self._sessions.get((mission_id, method))
+            if session is None:
+                return None
+            if refit:
+                session.refit()
+            return session.summary()
+
+    def discard(self, mission_id: str, method: str) -> bool:
+        with self._lock:
+            return self._sessions.pop((mission_id, method), None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+sessions = TriangulationSessionStore()
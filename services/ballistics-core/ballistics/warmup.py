@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from . import compile_tables, data_store
+from .table_engine import HAS_NUMPY, BallisticTable
+
+logger = logging.getLogger("ballistics-core")
+
+# Set by ballistics.serve in each forked worker to its slot, which a restarted worker takes over.
+WORKER_ENV = "BALLISTICS_WORKER_ID"
+
+
+def worker_name() -> str | None:
+    """Names this process's own protocol stream and log files; None outside the forked launcher."""
+    worker = os.environ.get(WORKER_ENV)
+    return f"worker-{worker}" if worker else None
+
+
+@dataclass
+class WarmState:
+    ready: bool = False
+    warming: bool = False
+    tables: int = 0
+    profiles: int = 0
+    compiled: int = 0
+    terrain: bool = False
+    duration_s: float | None = None
+    errors: list[str] = field(default_factory=list)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "status": "ready" if self.ready else "warming" if self.warming else "cold",
+            "pid": os.getpid(),
+            "tables": self.tables,
+            "profiles": self.profiles,
+            "compiled": self.compiled,
+            "terrain": self.terrain,
+            "duration_s": self.duration_s,
+            "errors": list(self.errors),
+        }
+
+
+_state = WarmState()
+_lock = threading.Lock()
+
+
+def _warm_table(table: BallisticTable) -> None:
+    # Builds the numpy vectors batch and coverage interpolation would otherwise create on first use.
+    if not HAS_NUMPY:
+        return
+    for charge in table.charges:
+        branch = table.branch(charge)
+        if branch is not None and branch.ranges:
+            branch.interpolate_many([branch.ranges[0]])
+
+
+def _profile_ids() -> list[str]:
+    ids = [path.parent.name for path in sorted(data_store.TABLES_DIR.glob("*/profile.json"))]
+    ids += [path.stem for path in sorted(data_store.GUN_PROFILE_DIR.glob("*.json"))]
+    return ids
+
+
+def warm_start(compile: bool = False) -> WarmState:
+    """Loads every ballistic table, gun profile and the heightmap into the data_store caches.
+
+    With ``compile`` stale tables are first compiled to memory-mappable .btbl files (see
+    ballistics.compile_tables), so every process maps the same read-only pages instead of parsing
+    its own copy; a read-only tree falls back to parsing. Runs once per process; later calls
+    return the finished state.
+    """
+    with _lock:
+        if _state.ready:
+            return _state
+        _state.warming = True
+        started = time.perf_counter()
+        sources = compile_tables.default_sources()
+        errors: list[str] = []
+        compiled = tables = profiles = 0
+        if compile:
+            for source in sources:
+                if compile_tables.is_up_to_date(source):
+                    continue
+                try:
+                    compile_tables.write_compiled(source)
+                    compiled += 1
+                except (OSError, ValueError) as exc:
+                    errors.append(f"compile {source}: {exc}")
+
+        for source in sources:
+            try:
+                if source.suffix.lower() == ".npz":
+                    _warm_table(data_store.load_npz_table(source))
+                else:
+                    data_store.load_table_document(source)
+                tables += 1
+            except (OSError, ValueError) as exc:
+                errors.append(f"load {source}: {exc}")
+
+        for profile_id in _profile_ids():
+            try:
+                data_store.load_gun_profile(profile_id)
+                profiles += 1
+            except (OSError, ValueError) as exc:
+                errors.append(f"profile {profile_id}: {exc}")
+
+        try:
+            terrain = data_store.load_terrain() is not None
+        except (OSError, ValueError) as exc:
+            errors.append(f"terrain: {exc}")
+            terrain = False
+
+        _state.tables, _state.profiles, _state.compiled, _state.terrain = tables, profiles, compiled, terrain
+        _state.errors = errors
+        _state.duration_s = round(time.perf_counter() - started, 3)
+        _state.warming = False
+        _state.ready = True
+    for error in errors:
+        logger.warning("Warm start: %s", error)
+    return _state
+
+
+def warm_in_background() -> threading.Thread | None:
+    """Starts warm_start in a daemon thread unless this process is already warm (e.g. forked warm)."""
+    if _state.ready or _state.warming:
+        return None
+    thread = threading.Thread(target=warm_start, name="warm-start", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness() -> dict[str, Any]:
+    return _state.snapshot()
+
+
+def reset() -> None:
+    global _state
+    with _lock:
+        _state = WarmState()
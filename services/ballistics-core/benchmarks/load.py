@@ -0,0 +1,614 @@
+"""Load generator for the ballistics-core API with a mixed mission workload.
+
+    python benchmarks/load.py                                  # 30 s, 16 users, in this process
+    python benchmarks/load.py --duration 60 --concurrency 64 --mix solve=6,correction=3,triangulation=1
+    python benchmarks/load.py --url http://127.0.0.1:8000 --requests 20000 --json load.json
+
+Run from services/ballistics-core. Without --url the app is driven in this process through its
+ASGI interface: the full FastAPI stack, work pools and protocol writer, minus the socket, with
+protocols written to a scratch journal. With --url the requests go over keep-alive HTTP
+connections to a running server (e.g. ``python -m ballistics.serve``), and protocol growth is
+measured in --protocol-dir, the server's journal by default.
+
+Each user is a closed loop (the next request is sent when the answer arrives) unless --rate sets
+a total request rate; then latency counts from each request's scheduled send time, so a stalled
+server is not hidden by users that stop sending. The workload replays:
+
+- solve: fire missions over every gun in tables/, pre-validated so errors are the server's;
+- correction: streams of corrections, each applied to the previous corrected solution;
+- triangulation: sound ranging whose observer count grows from 2 to --max-observers over the run.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+if str(SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVICE_DIR))
+
+from ballistics import data_store, protocol, warmup  # noqa: E402
+from ballistics.journal import SegmentJournal  # noqa: E402
+from ballistics.models import AmmoType, Coordinates, FireMissionRequest, WeatherInput  # noqa: E402
+from ballistics.protocol_index import ProtocolIndex  # noqa: E402
+from ballistics.solver import compute_fire_mission  # noqa: E402
+
+OPERATIONS = ("solve", "correction", "triangulation")
+DEFAULT_MIX = {"solve": 6, "correction": 3, "triangulation": 1}
+DEFAULT_DURATION_S = 30.0
+DEFAULT_CONCURRENCY = 16
+# Distinct fire missions replayed; repeats exercise the solution cache like retransmitted missions.
+DEFAULT_DISTINCT = 256
+DEFAULT_MAX_OBSERVERS = 60
+CORRECTIONS_PER_STREAM = 5
+HTTP_TIMEOUT_S = 30.0
+READY_TIMEOUT_S = 60.0
+PERCENTILES = (50, 95, 99)
+FIXED_CHARGES = tuple(range(1, 9))
+
+
+@dataclass
+class Sample:
+    operation: str
+    latency_s: float
+    status: int  # 0 when the request failed without an HTTP response
+    observers: int | None = None
+
+
+@dataclass
+class Workload:
+    missions: list[dict[str, Any]]
+    solutions: list[dict[str, Any]]
+    mix: dict[str, float]
+    max_observers: int
+    guns: list[str] = field(default_factory=list)
+
+
+def _gun_profiles() -> list[tuple[str, dict]]:
+    profiles = []
+    for path in sorted(data_store.TABLES_DIR.glob("*/profile.json")):
+        profiles.append((path.parent.name, data_store.load_gun_profile(path.parent.name)))
+    return profiles
+
+
+def _random_mission(rng: random.Random, gun_id: str, profile: dict) -> FireMissionRequest:
+    min_range = float(profile.get("min_range_m") or 100.0)
+    max_range = float(profile.get("max_range_m") or 10_000.0)
+    range_m = rng.uniform(min_range, max_range)
+    half_sector = min(float(profile.get("traverse_sector_deg") or 360.0) / 2, 180.0)
+    azimuth = math.radians(float(profile.get("heading_center_deg") or 0.0) + rng.uniform(-0.9, 0.9) * half_sector)
+    shooter = Coordinates(x=rng.uniform(-5000, 5000), y=rng.uniform(-5000, 5000))
+    shooter_alt = rng.uniform(0, 300)
+    charge: int | str = rng.choice(("auto",) + FIXED_CHARGES)
+    return FireMissionRequest(
+        mission_id="load",
+        shooter=shooter,
+        target=Coordinates(x=shooter.x + range_m * math.sin(azimuth), y=shooter.y + range_m * math.cos(azimuth)),
+        shooter_alt_m=round(shooter_alt, 1),
+        target_alt_m=round(shooter_alt + rng.uniform(-50, 50), 1),
+        weather=WeatherInput(
+            temperature_c=round(rng.uniform(-10, 30), 1),
+            pressure_hpa=round(rng.uniform(980, 1030), 1),
+            humidity_pct=round(rng.uniform(20, 90)),
+            wind_speed_ms=round(rng.uniform(0, 12), 1),
+            wind_direction_deg=round(rng.uniform(0, 360)),
+        ),
+        ammo_type=AmmoType.HE,
+        charge=charge,
+        barrel_profile_id=gun_id,
+        trajectory=rng.choice(("low", "high")),
+    )
+
+
+def build_workload(
+    seed: int = 1,
+    distinct: int = DEFAULT_DISTINCT,
+    mix: dict[str, float] | None = None,
+    max_observers: int = DEFAULT_MAX_OBSERVERS,
+) -> Workload:
+    """Draws ``distinct`` random fire missions spread over the tables/ guns, keeping the ones the
+    solver accepts, so every replayed request is valid; their solutions seed the corrections."""
+    rng = random.Random(seed)
+    profiles = _gun_profiles()
+    if not profiles:
+        raise ValueError(f"no gun profiles in {data_store.TABLES_DIR}")
+    missions: list[dict[str, Any]] = []
+    solutions: list[dict[str, Any]] = []
+    guns: list[str] = []
+    per_gun = max(1, math.ceil(distinct / len(profiles)))
+    for gun_id, profile in profiles:
+        found = 0
+        for _ in range(per_gun * 30):
+            if found == per_gun:
+                break
+            req = _random_mission(rng, gun_id, profile)
+            try:
+                result = compute_fire_mission(req)
+            except (FileNotFoundError, ValueError):
+                continue
+            missions.append(req.model_dump(mode="json"))
+            solutions.append(result.model_dump(mode="json"))
+            found += 1
+        if found:
+            guns.append(gun_id)
+    if not missions:
+        raise ValueError("no fire mission in tables/ could be solved")
+    return Workload(missions, solutions, dict(mix or DEFAULT_MIX), max_observers, guns)
+
+
+def _triangulation(rng: random.Random, observers: int, mission_id: str) -> dict[str, Any]:
+    target = (rng.uniform(-8000, 8000), rng.uniform(-8000, 8000))
+    points = []
+    for _ in range(observers):
+        angle, distance = rng.uniform(0, 2 * math.pi), rng.uniform(2000, 8000)
+        x, y = target[0] + distance * math.sin(angle), target[1] + distance * math.cos(angle)
+        bearing = math.degrees(math.atan2(target[0] - x, target[1] - y)) + rng.gauss(0, 0.5)
+        points.append({"observer": {"x": x, "y": y}, "bearing_deg": bearing % 360.0})
+    return {"mission_id": mission_id, "method": "sound", "points": points}
+
+
+class InProcessTransport:
+    """Calls the ASGI app directly: routing, validation, serialization and pools, no socket."""
+
+    name = "in-process"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, payload: dict | None = None) -> tuple[int, bytes]:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("ascii"),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"loadtest"), (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 0),
+            "server": ("127.0.0.1", 80),
+        }
+        received = False
+        finished = asyncio.Event()
+        status = 0
+        chunks: list[bytes] = []
+
+        async def receive() -> dict:
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            finished.set()
+        return status, b"".join(chunks)
+
+    def close(self) -> None:
+        pass
+
+
+class HttpTransport:
+    """One keep-alive connection per sending thread; the event loop's executor holds the threads."""
+
+    name = "http"
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError("--url must look like http://host:port")
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+        self._connections: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=HTTP_TIMEOUT_S)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _send(self, method: str, path: str, body: bytes) -> tuple[int, bytes]:
+        connection = self._connection()
+        try:
+            connection.request(method, path, body=body or None, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()  # reconnects on the next request
+            raise
+
+    async def request(self, method: str, path: str, payload: dict | None = None) -> tuple[int, bytes]:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        return await asyncio.get_running_loop().run_in_executor(None, self._send, method, path, body)
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+
+class _User:
+    def __init__(self, index: int, seed: int, workload: Workload):
+        self.index = index
+        self.rng = random.Random(seed * 1_000_003 + index)
+        self.workload = workload
+        self.sent = 0
+        self.base: dict[str, Any] | None = None
+        self.stream_left = 0
+
+    def next_request(self, operation: str, progress: float) -> tuple[str, dict[str, Any], int | None]:
+        self.sent += 1
+        mission_id = f"load-{self.index}-{self.sent}"
+        if operation == "solve":
+            return "/solve-fire-mission", {**self.rng.choice(self.workload.missions), "mission_id": mission_id}, None
+        if operation == "correction":
+            if self.base is None or self.stream_left <= 0:
+                self.base = self.rng.choice(self.workload.solutions)
+                self.stream_left = CORRECTIONS_PER_STREAM
+            self.stream_left -= 1
+            # Each adjustment roughly halves the miss, as an observer walking rounds onto the target.
+            spread = 200.0 * 0.5 ** (CORRECTIONS_PER_STREAM - self.stream_left - 1)
+            offset = {"x": self.rng.gauss(0, spread), "y": self.rng.gauss(0, spread)}
+            return "/apply-correction", {"mission_id": mission_id, "base_solution": self.base, "observed_impact_offset_m": offset}, None
+        observers = 2 + round(min(1.0, progress) * (self.workload.max_observers - 2))
+        return "/triangulation/sound", _triangulation(self.rng, observers, mission_id), observers
+
+    def answered(self, operation: str, status: int, body: bytes) -> None:
+        if operation == "correction":
+            if status == 200:
+                self.base = json.loads(body)["solution"]
+            else:
+                self.stream_left = 0
+
+
+async def drive(
+    transport,
+    workload: Workload,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    duration_s: float | None = DEFAULT_DURATION_S,
+    requests: int | None = None,
+    rate: float | None = None,
+    seed: int = 1,
+) -> tuple[list[Sample], float]:
+    """Runs ``concurrency`` users until ``requests`` are sent or ``duration_s`` has passed."""
+    if requests is None and duration_s is None:
+        raise ValueError("either requests or duration_s is required")
+    operations = [name for name in OPERATIONS if workload.mix.get(name, 0) > 0]
+    weights = [workload.mix[name] for name in operations]
+    if not operations:
+        raise ValueError("the mix has no operation with a positive weight")
+    samples: list[Sample] = []
+    issued = 0
+    clock = time.perf_counter
+    started = clock()
+    deadline = started + duration_s if duration_s is not None else math.inf
+    interval = concurrency / rate if rate else 0.0
+
+    def progress() -> float:
+        if requests is not None:
+            return issued / requests
+        return (clock() - started) / duration_s
+
+    async def run_user(index: int) -> None:
+        nonlocal issued
+        user = _User(index, seed, workload)
+        # Rate-paced users are staggered so their sends spread evenly over each interval.
+        scheduled = started + interval * index / concurrency
+        while (requests is None or issued < requests) and clock() < deadline:
+            issued += 1
+            operation = user.rng.choices(operations, weights)[0]
+            path, payload, observers = user.next_request(operation, progress())
+            if interval:
+                delay = scheduled - clock()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                sent_at = scheduled
+                scheduled += interval
+            else:
+                sent_at = clock()
+            try:
+                status, body = await transport.request("POST", path, payload)
+            except (OSError, http.client.HTTPException):
+                status, body = 0, b""
+            samples.append(Sample(operation, clock() - sent_at, status, observers))
+            user.answered(operation, status, body)
+
+    await asyncio.gather(*(run_user(index) for index in range(concurrency)))
+    return samples, clock() - started
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return math.nan
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def _latency_ms(latencies: list[float]) -> dict[str, float | None]:
+    ordered = sorted(latencies)
+    if not ordered:
+        return {**{f"p{q}": None for q in PERCENTILES}, "max": None, "mean": None}
+    summary = {f"p{q}": round(percentile(ordered, q) * 1000, 3) for q in PERCENTILES}
+    summary["max"] = round(ordered[-1] * 1000, 3)
+    summary["mean"] = round(sum(ordered) / len(ordered) * 1000, 3)
+    return summary
+
+
+def _summary(samples: list[Sample], elapsed_s: float) -> dict[str, Any]:
+    errors = sum(1 for sample in samples if not 200 <= sample.status < 300)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 6) if samples else 0.0,
+        "throughput_rps": round(len(samples) / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+        "latency_ms": _latency_ms([sample.latency_s for sample in samples]),
+        "statuses": {str(status): count for status, count in sorted(Counter(sample.status for sample in samples).items())},
+    }
+
+
+def summarize(samples: list[Sample], elapsed_s: float, max_observers: int) -> dict[str, Any]:
+    report = _summary(samples, elapsed_s)
+    report["operations"] = {
+        name: _summary([sample for sample in samples if sample.operation == name], elapsed_s)
+        for name in OPERATIONS
+        if any(sample.operation == name for sample in samples)
+    }
+    triangulations = [sample for sample in samples if sample.observers is not None]
+    if triangulations:
+        # Five observer-count bands show how latency grows with the size of the fit.
+        width = max(1, math.ceil((max_observers - 1) / 5))
+        bands: dict[str, Any] = {}
+        for low in range(2, max_observers + 1, width):
+            high = min(max_observers, low + width - 1)
+            band = [sample for sample in triangulations if low <= sample.observers <= high]
+            if band:
+                bands[f"{low}-{high}"] = {"requests": len(band), "latency_ms": _latency_ms([s.latency_s for s in band])}
+        report["triangulation_by_observers"] = bands
+    return report
+
+
+def directory_usage(directory: Path) -> dict[str, int]:
+    files = [path for path in directory.rglob("*") if path.is_file()] if directory.is_dir() else []
+    sizes = []
+    for path in files:
+        try:
+            sizes.append(path.stat().st_size)
+        except OSError:  # rolled over or compressed while walking
+            pass
+    return {"files": len(sizes), "bytes": sum(sizes)}
+
+
+def _settled_usage(directory: Path, timeout_s: float = 5.0) -> dict[str, int]:
+    # A remote server writes protocols in the background; wait until the journal stops growing.
+    usage = directory_usage(directory)
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        time.sleep(0.25)
+        current = directory_usage(directory)
+        if current == usage:
+            break
+        usage = current
+    return usage
+
+
+def _protocol_growth(directory: Path, before: dict[str, int], after: dict[str, int], records: int) -> dict[str, Any]:
+    growth = after["bytes"] - before["bytes"]
+    return {
+        "directory": str(directory),
+        "bytes_before": before["bytes"],
+        "bytes_after": after["bytes"],
+        "files_after": after["files"],
+        "growth_bytes": growth,
+        "bytes_per_record": round(growth / records, 1) if records else None,
+    }
+
+
+def _wait_ready(url: str) -> None:
+    parts = urlsplit(url)
+    deadline = time.monotonic() + READY_TIMEOUT_S
+    while True:
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=5)
+            connection.request("GET", "/ready")
+            if connection.getresponse().status == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            pass
+        if time.monotonic() >= deadline:
+            raise SystemExit(f"{url} did not report /ready within {READY_TIMEOUT_S:g} s")
+        time.sleep(0.5)
+
+
+def run_in_process(workload: Workload, keep_protocols: Path | None = None, **options) -> dict[str, Any]:
+    """Drives app.app in this process against a scratch protocol journal."""
+    from app import app
+
+    if not callable(app):
+        raise SystemExit("in-process mode needs FastAPI installed; use --url against a server instead")
+    directory = keep_protocols or Path(tempfile.mkdtemp(prefix="load-protocols-"))
+    protocol.shutdown_protocols()
+    previous = protocol.configure_journal(
+        SegmentJournal(directory), ProtocolIndex(directory / protocol.PROTOCOL_INDEX_FILE)
+    )
+    try:
+        warmup.warm_start()
+        before = directory_usage(directory)
+        samples, elapsed = asyncio.run(drive(InProcessTransport(app), workload, **options))
+        protocol.flush_protocols()
+        writer = protocol.writer_stats()
+        after = directory_usage(directory)
+    finally:
+        protocol.shutdown_protocols()
+        protocol.configure_journal(previous)
+        if keep_protocols is None:
+            shutil.rmtree(directory, ignore_errors=True)
+    report = summarize(samples, elapsed, workload.max_observers)
+    report["elapsed_s"] = round(elapsed, 3)
+    report["protocols"] = _protocol_growth(directory, before, after, report["requests"] - report["errors"])
+    report["protocols"]["writer"] = writer
+    return report
+
+
+def run_http(workload: Workload, url: str, protocol_dir: Path, **options) -> dict[str, Any]:
+    _wait_ready(url)
+    transport = HttpTransport(url)
+    before = directory_usage(protocol_dir)
+
+    async def main() -> tuple[list[Sample], float]:
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(options.get("concurrency", DEFAULT_CONCURRENCY), thread_name_prefix="load")
+        )
+        return await drive(transport, workload, **options)
+
+    try:
+        samples, elapsed = asyncio.run(main())
+    finally:
+        transport.close()
+    after = _settled_usage(protocol_dir)
+    report = summarize(samples, elapsed, workload.max_observers)
+    report["elapsed_s"] = round(elapsed, 3)
+    report["protocols"] = _protocol_growth(protocol_dir, before, after, report["requests"] - report["errors"])
+    return report
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix: dict[str, float] = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}, expected one of {OPERATIONS}")
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError as exc:
+            raise argparse.ArgumentTypeError(f"bad weight for {name}: {weight!r}") from exc
+        if mix[name] < 0:
+            raise argparse.ArgumentTypeError(f"weight for {name} must be >= 0")
+    return mix
+
+
+def _format_ms(value: float | None) -> str:
+    return f"{value:9.2f}" if value is not None else "        -"
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(
+        f"{report['mode']}: {report['concurrency']} users, {report['elapsed_s']:.1f} s, {report['requests']} requests, "
+        f"{report['throughput_rps']:.1f} req/s, errors {report['error_rate'] * 100:.2f} %"
+    )
+    print(f"{'operation':<14} {'requests':>9} {'req/s':>9} {'errors':>7}      p50 ms    p95 ms    p99 ms    max ms")
+    rows = [*report["operations"].items(), ("total", report)]
+    for name, stats in rows:
+        latency = stats["latency_ms"]
+        print(
+            f"{name:<14} {stats['requests']:>9} {stats['throughput_rps']:>9.1f} {stats['errors']:>7} "
+            f"{_format_ms(latency['p50'])} {_format_ms(latency['p95'])} {_format_ms(latency['p99'])} {_format_ms(latency['max'])}"
+        )
+    for band, stats in report.get("triangulation_by_observers", {}).items():
+        latency = stats["latency_ms"]
+        print(f"  triangulation {band:>7} observers: {stats['requests']:>6} requests, p50 {latency['p50']:.2f} ms, p99 {latency['p99']:.2f} ms")
+    growth = report["protocols"]
+    per_record = f", {growth['bytes_per_record']:.0f} B per record" if growth["bytes_per_record"] is not None else ""
+    print(f"protocols: +{growth['growth_bytes'] / 1024:.1f} KiB, {growth['files_after']} files{per_record}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Ballistics core load generator")
+    parser.add_argument("--url", help="drive a running server over HTTP instead of the app in this process")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="simultaneous users")
+    parser.add_argument("--duration", type=float, help=f"seconds to run (default {DEFAULT_DURATION_S:g} without --requests)")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--rate", type=float, help="total requests per second (default: as fast as answered)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="weights, e.g. solve=6,correction=3,triangulation=1")
+    parser.add_argument("--distinct", type=int, default=DEFAULT_DISTINCT, help="distinct fire missions replayed")
+    parser.add_argument("--max-observers", type=int, default=DEFAULT_MAX_OBSERVERS, help="triangulation observers at the end")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--protocol-dir", type=Path, default=protocol.PROTOCOL_DIR, help="server journal (with --url)")
+    parser.add_argument("--keep-protocols", type=Path, help="in-process: write protocols here instead of a scratch dir")
+    parser.add_argument("--log-info-sample", type=float, default=0.01, help="in-process: INFO log sampling rate")
+    parser.add_argument("--json", type=Path, help="write the report as JSON")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.distinct < 1 or args.max_observers < 2:
+        parser.error("--concurrency and --distinct must be >= 1, --max-observers >= 2")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be > 0")
+    duration = args.duration if args.duration is not None else (None if args.requests else DEFAULT_DURATION_S)
+
+    workload = build_workload(args.seed, args.distinct, args.mix, args.max_observers)
+    options = {
+        "concurrency": args.concurrency,
+        "duration_s": duration,
+        "requests": args.requests,
+        "rate": args.rate,
+        "seed": args.seed,
+    }
+    started_at = datetime.now(tz=timezone.utc).isoformat(timespec="seconds")
+    if args.url:
+        report = run_http(workload, args.url, args.protocol_dir, **options)
+    else:
+        # Set before app.py configures its logger; one INFO line per request would flood the console.
+        from ballistics.logging_setup import INFO_SAMPLE_ENV
+
+        os.environ.setdefault(INFO_SAMPLE_ENV, str(args.log_info_sample))
+        report = run_in_process(workload, args.keep_protocols, **options)
+
+    report = {
+        "mode": "http" if args.url else "in-process",
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "mix": workload.mix,
+        "distinct_missions": len(workload.missions),
+        "guns": workload.guns,
+        "meta": {
+            "created_at": started_at,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        **report,
+    }
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,462 @@
+"""Micro-benchmarks for the ballistics core.
+
+    python benchmarks/run.py                          # run and print
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json [--threshold 0.25]
+
+Run from services/ballistics-core. --compare exits with status 1 when any benchmark's best time
+per call (min over repeats) is slower than the baseline by more than the threshold (0.25 = 25 %).
+Timings are normalised by a fixed pure-Python reference workload measured in the same run, so a
+baseline from a faster or slower machine still compares meaningfully; flagged benchmarks are
+re-measured before they count as regressions. Benchmarks dominated by disk latency register a
+wider threshold of their own.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+if str(SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVICE_DIR))
+
+from ballistics import data_store, protocol, trajectory  # noqa: E402
+from ballistics.corrections import apply_correction  # noqa: E402
+from ballistics.coverage import compute_coverage, coverage_cache  # noqa: E402
+from ballistics.journal import SegmentJournal  # noqa: E402
+from ballistics.models import (  # noqa: E402
+    AmmoType,
+    BatchFireMissionResult,
+    BatchSolution,
+    Coordinates,
+    CorrectionRequest,
+    CoverageRequest,
+    FireMissionRequest,
+    FireMissionResult,
+    TriangulationPoint,
+    TriangulationRequest,
+    WeatherInput,
+)
+from ballistics.protocol_index import ProtocolIndex  # noqa: E402
+from ballistics.solution_cache import solution_cache  # noqa: E402
+from ballistics.solver import compute_fire_mission, solve_fire_mission  # noqa: E402
+from ballistics.table_engine import HAS_NUMPY  # noqa: E402
+from ballistics.terrain import open_terrain, write_terrain  # noqa: E402
+from ballistics.trajectory import fan_cache  # noqa: E402
+from ballistics.triangulation import triangulate  # noqa: E402
+from map_calibration import CalibrationModel, ControlPoint, calibrate_from_points  # noqa: E402
+
+DEFAULT_THRESHOLD = 0.25
+RETRIES = 2
+MIN_RUN_S = 0.1
+REPEATS = 7
+MILS_PER_RAD = 6400 / (2 * math.pi)
+
+Benchmark = Callable[[], Callable[[], object]]
+BENCHMARKS: dict[str, Benchmark] = {}
+THRESHOLDS: dict[str, float] = {}
+
+
+def benchmark(name: str, threshold: float | None = None):
+    # Each registered function does its setup and returns the zero-argument callable to time.
+    def register(setup: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = setup
+        if threshold is not None:
+            THRESHOLDS[name] = threshold
+        return setup
+
+    return register
+
+
+def _fire_mission(trajectory: str = "low") -> FireMissionRequest:
+    return FireMissionRequest(
+        mission_id="bench",
+        shooter=Coordinates(x=0, y=0),
+        target=Coordinates(x=3200, y=2400),
+        shooter_alt_m=120,
+        target_alt_m=160,
+        weather=WeatherInput(wind_speed_ms=6, wind_direction_deg=250),
+        ammo_type=AmmoType.HE,
+        charge=5,
+        barrel_profile_id="m777",
+        trajectory=trajectory,
+    )
+
+
+# The m777_* cases time the solver itself (warm table caches, no solution cache).
+@benchmark("solve_fire_mission.m777_low")
+def _solve_low():
+    req = _fire_mission()
+    compute_fire_mission(req)
+    return lambda: compute_fire_mission(req)
+
+
+@benchmark("solve_fire_mission.m777_high")
+def _solve_high():
+    req = _fire_mission("high")
+    compute_fire_mission(req)
+    return lambda: compute_fire_mission(req)
+
+
+@benchmark("solve_fire_mission.auto_charge")
+def _solve_auto():
+    req = replace(_fire_mission(), target=Coordinates(x=500, y=4000), charge="auto")
+    compute_fire_mission(req)
+    return lambda: compute_fire_mission(req)
+
+
+@benchmark("solve_fire_mission.point_mass")
+def _solve_point_mass():
+    # Warm fans: the per-request cost of the point-mass correction.
+    req = replace(_fire_mission(), weather_model="point_mass")
+    compute_fire_mission(req)
+    return lambda: compute_fire_mission(req)
+
+
+@benchmark("trajectory.fan_m777")
+def _trajectory_fan():
+    # One cold fan: every fourth elevation of the charge 5 branch integrated in the bench weather.
+    table_file = data_store.find_ballistic_table_file("HE", "m777", "low")
+    table = data_store.load_npz_table(table_file)
+    velocity = fan_cache.muzzle_velocity(table_file, 5, MILS_PER_RAD)
+    return lambda: trajectory._fan(table, 5, velocity, MILS_PER_RAD, 0.98, 4.2, -3.1, 40.0)
+
+
+@benchmark("coverage.m777_25m")
+def _coverage():
+    # The profile's full traverse sector at 25 m, with wind (three interpolation passes per charge).
+    req = CoverageRequest(
+        shooter=Coordinates(x=0, y=0),
+        barrel_profile_id="m777",
+        shooter_alt_m=120,
+        weather=WeatherInput(wind_speed_ms=6, wind_direction_deg=250),
+    )
+    compute_coverage(req)
+    return lambda: compute_coverage(req)
+
+
+@benchmark("solve_fire_mission.cached")
+def _solve_cached():
+    req = _fire_mission()
+    solve_fire_mission(req)
+    return lambda: solve_fire_mission(req)
+
+
+@benchmark("apply_correction")
+def _correction():
+    req = CorrectionRequest(
+        mission_id="bench",
+        base_solution=FireMissionResult(azimuth_deg=120, elevation_mils=400, flight_time_s=8, range_m=900, drift_m=12),
+        observed_impact_offset_m=Coordinates(x=20, y=-15),
+    )
+    return lambda: apply_correction(req)
+
+
+@benchmark("model_dump.fire_mission")
+def _dump_fire_mission():
+    req = _fire_mission()
+    return lambda: req.model_dump()
+
+
+@benchmark("model_dump.batch_result_100")
+def _dump_batch_result():
+    solution = FireMissionResult(azimuth_deg=53.1, elevation_mils=412.5, flight_time_s=19.2, range_m=4000, drift_m=3.4)
+    result = BatchFireMissionResult(
+        solutions=[BatchSolution(gun_id=f"gun-{index}", aim_point_index=index, solution=solution) for index in range(100)],
+        solved=100,
+        failed=0,
+    )
+    return lambda: result.model_dump()
+
+
+@benchmark("model_validate.fire_mission")
+def _validate_fire_mission():
+    payload = _fire_mission().model_dump()
+    return lambda: FireMissionRequest.model_validate(payload)
+
+
+def _bearings(count: int) -> TriangulationRequest:
+    rng = random.Random(count)
+    target = (4000.0, 6000.0)
+    points = []
+    for _ in range(count):
+        x, y = rng.uniform(-2000, 2000), rng.uniform(-500, 500)
+        bearing = math.degrees(math.atan2(target[0] - x, target[1] - y)) + rng.gauss(0, 1.0)
+        points.append(TriangulationPoint(observer=Coordinates(x=x, y=y), bearing_deg=bearing))
+    return TriangulationRequest(mission_id="bench", method="sound", points=points)
+
+
+def _triangulate(count: int) -> Benchmark:
+    def setup():
+        req = _bearings(count)
+        return lambda: triangulate(req)
+
+    return setup
+
+
+for _count in (2, 20, 200):
+    benchmark(f"triangulate.{_count}_observers")(_triangulate(_count))
+
+
+@benchmark("load_ballistic_table.cold")
+def _table_cold():
+    def run():
+        data_store.clear_caches()
+        return data_store.load_ballistic_table("HE", 3, "m777")
+
+    return run
+
+
+@benchmark("load_ballistic_table.warm")
+def _table_warm():
+    data_store.load_ballistic_table("HE", 3, "m777")
+    return lambda: data_store.load_ballistic_table("HE", 3, "m777")
+
+
+@benchmark("load_gun_profile.cold")
+def _profile_cold():
+    def run():
+        data_store.clear_caches()
+        return data_store.load_gun_profile("m777")
+
+    return run
+
+
+@benchmark("load_gun_profile.warm")
+def _profile_warm():
+    data_store.load_gun_profile("m777")
+    return lambda: data_store.load_gun_profile("m777")
+
+
+_scratch_dirs: list[Path] = []
+
+
+def _scratch_journal() -> None:
+    directory = Path(tempfile.mkdtemp(prefix="bench-protocols-"))
+    _scratch_dirs.append(directory)
+    protocol.shutdown_protocols()
+    protocol.configure_journal(SegmentJournal(directory), ProtocolIndex(directory / protocol.PROTOCOL_INDEX_FILE))
+
+
+@benchmark("save_protocol.enqueue")
+def _save_protocol():
+    _scratch_journal()
+    payload = {"target": {"x": 2400, "y": 1800}, "charge": 3}
+    return lambda: protocol.save_protocol("bench", "solve-fire-mission", payload, payload)
+
+
+@benchmark("save_protocol.durable", threshold=1.0)
+def _save_protocol_durable():
+    _scratch_journal()
+    payload = {"target": {"x": 2400, "y": 1800}, "charge": 3}
+
+    def run():
+        protocol.save_protocol("bench", "solve-fire-mission", payload, payload)
+        protocol.flush_protocols()
+
+    return run
+
+
+def _scratch_terrain(size: int = 1024):
+    directory = Path(tempfile.mkdtemp(prefix="bench-terrain-"))
+    _scratch_dirs.append(directory)
+    header = directory / "heightmap.json"
+    values = [100 + 20 * math.sin(row / 50) * math.cos(col / 70) for row in range(size) for col in range(size)]
+    write_terrain(header, size, size, values, CalibrationModel(scale_x=10, scale_y=-10, offset_x=0, offset_y=size * 10))
+    return open_terrain(header)
+
+
+@benchmark("terrain.height")
+def _terrain_height():
+    terrain = _scratch_terrain()
+    terrain.height(3210.5, 4321.5)
+    return lambda: terrain.height(3210.5, 4321.5)
+
+
+@benchmark("terrain.heights_10k")
+def _terrain_heights():
+    terrain = _scratch_terrain()
+    rng = random.Random(0)
+    points = [(rng.uniform(0, 10_000), rng.uniform(0, 10_000)) for _ in range(10_000)]
+    if HAS_NUMPY:
+        import numpy as np
+
+        points = np.asarray(points)
+    return lambda: terrain.heights(points)
+
+
+def _control_points(count: int = 12) -> list[ControlPoint]:
+    rng = random.Random(count)
+    angle = math.radians(7)
+    points = []
+    for _ in range(count):
+        x, y = rng.uniform(0, 4000), rng.uniform(0, 4000)
+        points.append(
+            ControlPoint(
+                x, y, 2.5 * (math.cos(angle) * x - math.sin(angle) * y), 2.5 * (math.sin(angle) * x + math.cos(angle) * y)
+            )
+        )
+    return points
+
+
+@benchmark("calibrate_from_points.affine_12")
+def _calibrate():
+    points = _control_points()
+    return lambda: calibrate_from_points(points)
+
+
+@benchmark("calibration.to_game")
+def _to_game():
+    model = calibrate_from_points(_control_points())
+    return lambda: model.to_game(1234.5, 2345.6)
+
+
+@benchmark("calibration.to_game_many_10k")
+def _to_game_many():
+    model = calibrate_from_points(_control_points())
+    rng = random.Random(0)
+    points = [(rng.uniform(0, 4000), rng.uniform(0, 4000)) for _ in range(10_000)]
+    return lambda: model.to_game_many(points)
+
+
+def measure(func: Callable[[], object], min_run_s: float = MIN_RUN_S, repeats: int = REPEATS) -> dict[str, float]:
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_run_s or loops >= 1_000_000:
+            break
+        loops = max(loops * 2, int(loops * min_run_s / max(elapsed, 1e-9)))
+
+    samples = [elapsed / loops]
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - started) / loops)
+    return {"median_s": statistics.median(samples), "min_s": min(samples), "loops": loops}
+
+
+def _reference_workload() -> float:
+    values = {str(index): math.sqrt(index) * math.sin(index) for index in range(1000)}
+    return sum(values[key] for key in sorted(values))
+
+
+def reference_time(min_run_s: float = MIN_RUN_S) -> float:
+    return measure(_reference_workload, min_run_s)["min_s"]
+
+
+def run_benchmarks(
+    patterns: list[str] | None = None, min_run_s: float = MIN_RUN_S, exact: bool = False
+) -> dict[str, dict[str, float]]:
+    results = {}
+    try:
+        for name, setup in BENCHMARKS.items():
+            if patterns and not any(name == pattern if exact else pattern in name for pattern in patterns):
+                continue
+            results[name] = measure(setup(), min_run_s)
+    finally:
+        protocol.shutdown_protocols()
+        if _scratch_dirs:
+            protocol.configure_journal(None)
+        while _scratch_dirs:
+            shutil.rmtree(_scratch_dirs.pop(), ignore_errors=True)
+        data_store.clear_caches()
+        solution_cache.clear()
+        coverage_cache.clear()
+        fan_cache.clear()
+    return results
+
+
+def compare(
+    baseline: dict,
+    results: dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    reference_s: float | None = None,
+) -> list[tuple[str, float | None, str]]:
+    # Without a reference time on both sides the ratio is the raw time ratio.
+    speed = 1.0
+    baseline_reference = baseline.get("meta", {}).get("reference_s")
+    if reference_s and baseline_reference:
+        speed = baseline_reference / reference_s
+
+    rows = []
+    for name, current in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            rows.append((name, None, "new"))
+            continue
+        ratio = current["min_s"] * speed / reference["min_s"]
+        allowed = max(threshold, THRESHOLDS.get(name, threshold))
+        rows.append((name, ratio, "REGRESSION" if ratio > 1 + allowed else "ok"))
+    return rows
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.0f} ns"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Ballistics core micro-benchmarks")
+    parser.add_argument("--save", type=Path, help="write results as a JSON baseline")
+    parser.add_argument("--compare", type=Path, help="compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown ratio")
+    parser.add_argument("--filter", action="append", help="only run benchmarks whose name contains this")
+    parser.add_argument("--min-time", type=float, default=MIN_RUN_S, help="seconds per timing sample")
+    args = parser.parse_args(argv)
+
+    reference_s = reference_time(args.min_time)
+    results = run_benchmarks(args.filter, args.min_time)
+    baseline = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    rows = compare(baseline, results, args.threshold, reference_s) if baseline else [(name, None, "") for name in results]
+
+    for _ in range(RETRIES):
+        flagged = [name for name, _, verdict in rows if verdict == "REGRESSION"]
+        if not flagged:
+            break
+        reference_s = min(reference_s, reference_time(args.min_time))
+        for name, retry in run_benchmarks(flagged, args.min_time, exact=True).items():
+            if retry["min_s"] < results[name]["min_s"]:
+                results[name] = retry
+        rows = compare(baseline, results, args.threshold, reference_s)
+
+    width = max(map(len, results), default=0)
+    for name, ratio, verdict in rows:
+        change = f"{ratio:6.2f}x" if ratio is not None else "       "
+        print(f"{name:<{width}}  {_format_time(results[name]['min_s'])}  {change}  {verdict}".rstrip())
+
+    if args.save:
+        document = {
+            "meta": {
+                "created_at": datetime.now(tz=timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "numpy": HAS_NUMPY,
+                "reference_s": reference_s,
+            },
+            "results": results,
+        }
+        args.save.write_text(json.dumps(document, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    return 1 if any(verdict == "REGRESSION" for _, _, verdict in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
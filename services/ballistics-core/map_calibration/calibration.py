@@ -1,6 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import math
+from array import array
+from dataclasses import dataclass, field, replace
+from functools import cached_property
+from typing import Iterable, Literal, Sequence
+
+try:
+    import numpy as np
+except ModuleNotFoundError:  # pragma: no cover - numpy only accelerates batch transforms
+    np = None
+
+CalibrationMethod = Literal["affine", "projective"]
+Matrix = tuple[tuple[float, float, float], tuple[float, float, float], tuple[float, float, float]]
 
 
 @dataclass
@@ -11,21 +23,145 @@ class ControlPoint:
     game_y: float
 
 
-@dataclass
+# game_x = (scale_x * map_x + shear_x * map_y + offset_x) / w
+# game_y = (shear_y * map_x + scale_y * map_y + offset_y) / w
+# w      = perspective_x * map_x + perspective_y * map_y + 1
+@dataclass(frozen=True)
 class CalibrationModel:
     scale_x: float
     scale_y: float
     offset_x: float
     offset_y: float
+    shear_x: float = 0.0
+    shear_y: float = 0.0
+    perspective_x: float = 0.0
+    perspective_y: float = 0.0
+    residuals: list[float] = field(default_factory=list, compare=False)
+
+    @property
+    def rms_residual(self) -> float:
+        if not self.residuals:
+            return 0.0
+        return math.sqrt(sum(value * value for value in self.residuals) / len(self.residuals))
+
+    @property
+    def is_affine(self) -> bool:
+        return self.perspective_x == 0.0 and self.perspective_y == 0.0
+
+    @cached_property
+    def matrix(self) -> Matrix:
+        return (
+            (self.scale_x, self.shear_x, self.offset_x),
+            (self.shear_y, self.scale_y, self.offset_y),
+            (self.perspective_x, self.perspective_y, 1.0),
+        )
+
+    @cached_property
+    def inverse(self) -> Matrix:
+        (a, b, c), (d, e, f), (g, h, i) = self.matrix
+        det = a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+        if abs(det) < 1e-15:
+            raise ValueError("Calibration is not invertible")
+        return (
+            ((e * i - f * h) / det, (c * h - b * i) / det, (b * f - c * e) / det),
+            ((f * g - d * i) / det, (a * i - c * g) / det, (c * d - a * f) / det),
+            ((d * h - e * g) / det, (b * g - a * h) / det, (a * e - b * d) / det),
+        )
 
     def to_game(self, map_x: float, map_y: float) -> tuple[float, float]:
-        return (map_x * self.scale_x + self.offset_x, map_y * self.scale_y + self.offset_y)
+        return _apply(self.matrix, map_x, map_y)
 
+    def to_map(self, game_x: float, game_y: float) -> tuple[float, float]:
+        return _apply(self.inverse, game_x, game_y)
+
+    def to_game_many(self, points):
+        """Transform many map points at once; see ``_apply_many`` for the accepted inputs."""
+        return _apply_many(self.matrix, points)
+
+    def to_map_many(self, points):
+        return _apply_many(self.inverse, points)
+
+
+def _apply(matrix: Matrix, x: float, y: float) -> tuple[float, float]:
+    (a, b, c), (d, e, f), (g, h, i) = matrix
+    w = g * x + h * y + i
+    return ((a * x + b * y + c) / w, (d * x + e * y + f) / w)
+
+
+# Accepts a numpy (N, 2) array (returns one), a flat buffer of interleaved float64 x/y values such
+# as array("d") or memoryview (returns array("d")), or any iterable of (x, y) pairs (returns a list).
+def _apply_many(matrix: Matrix, points):
+    if np is not None and isinstance(points, np.ndarray):
+        return _apply_numpy(matrix, points.reshape(-1, 2)).reshape(points.shape)
+
+    if isinstance(points, (array, memoryview, bytes, bytearray)):
+        raw = isinstance(points, (bytes, bytearray))
+        if np is not None:
+            flat = np.frombuffer(points, dtype=np.float64) if raw else np.asarray(points, dtype=np.float64)
+            return array("d", _apply_numpy(matrix, flat.reshape(-1, 2)).ravel().tobytes())
+        values = array("d", points) if raw or not isinstance(points, array) else points
+        out = array("d", bytes(8 * len(values)))
+        for index in range(0, len(values) - 1, 2):
+            out[index], out[index + 1] = _apply(matrix, values[index], values[index + 1])
+        return out
+
+    if np is not None:
+        pairs = np.asarray(list(points), dtype=np.float64).reshape(-1, 2)
+        return [tuple(row) for row in _apply_numpy(matrix, pairs).tolist()]
+    return [_apply(matrix, x, y) for x, y in points]
+
+
+def _apply_numpy(matrix: Matrix, pairs):
+    transform = np.asarray(matrix, dtype=np.float64)
+    homogeneous = pairs @ transform[:, :2].T + transform[:, 2]
+    return homogeneous[:, :2] / homogeneous[:, 2:3]
 
-def calibrate_from_points(points: list[ControlPoint]) -> CalibrationModel:
-    if len(points) < 2:
-        raise ValueError("At least two control points are required")
 
+def _solve(system: list[list[float]], rhs: list[float]) -> list[float]:
+    """Gaussian elimination with partial pivoting for the small normal-equation systems."""
+    size = len(rhs)
+    rows = [row[:] + [value] for row, value in zip(system, rhs)]
+    scale = max((abs(value) for row in system for value in row), default=0.0)
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda index: abs(rows[index][column]))
+        if abs(rows[pivot][column]) <= 1e-12 * max(scale, 1.0):
+            raise ValueError("Control points are degenerate (collinear or duplicated)")
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for index in range(column + 1, size):
+            factor = rows[index][column] / rows[column][column]
+            if factor:
+                for k in range(column, size + 1):
+                    rows[index][k] -= factor * rows[column][k]
+    solution = [0.0] * size
+    for column in range(size - 1, -1, -1):
+        total = rows[column][size] - sum(rows[column][k] * solution[k] for k in range(column + 1, size))
+        solution[column] = total / rows[column][column]
+    return solution
+
+
+def _least_squares(design: Iterable[Sequence[float]], targets: Iterable[float], size: int) -> list[float]:
+    normal = [[0.0] * size for _ in range(size)]
+    rhs = [0.0] * size
+    for row, target in zip(design, targets):
+        for i in range(size):
+            rhs[i] += row[i] * target
+            for j in range(i, size):
+                normal[i][j] += row[i] * row[j]
+    for i in range(size):
+        for j in range(i):
+            normal[i][j] = normal[j][i]
+    return _solve(normal, rhs)
+
+
+def _normalization(xs: list[float], ys: list[float]) -> tuple[float, float, float]:
+    # Centre on the centroid and scale to unit RMS distance so the normal equations stay well
+    # conditioned for map pixels and game metres alike.
+    cx, cy = sum(xs) / len(xs), sum(ys) / len(ys)
+    spread = math.sqrt(sum((x - cx) ** 2 + (y - cy) ** 2 for x, y in zip(xs, ys)) / len(xs))
+    return cx, cy, (1.0 / spread if spread > 0 else 1.0)
+
+
+def _two_point_model(points: list[ControlPoint]) -> CalibrationModel:
     p1, p2 = points[0], points[1]
     map_dx = p2.map_x - p1.map_x
     map_dy = p2.map_y - p1.map_y
@@ -36,5 +172,67 @@ def calibrate_from_points(points: list[ControlPoint]) -> CalibrationModel:
     scale_y = (p2.game_y - p1.game_y) / map_dy
     offset_x = p1.game_x - p1.map_x * scale_x
     offset_y = p1.game_y - p1.map_y * scale_y
-
     return CalibrationModel(scale_x=scale_x, scale_y=scale_y, offset_x=offset_x, offset_y=offset_y)
+
+
+def _fit_matrix(points: list[ControlPoint], method: CalibrationMethod) -> Matrix:
+    mcx, mcy, ms = _normalization([p.map_x for p in points], [p.map_y for p in points])
+    gcx, gcy, gs = _normalization([p.game_x for p in points], [p.game_y for p in points])
+    source = [((p.map_x - mcx) * ms, (p.map_y - mcy) * ms) for p in points]
+    target = [((p.game_x - gcx) * gs, (p.game_y - gcy) * gs) for p in points]
+
+    if method == "affine":
+        design = [(x, y, 1.0) for x, y in source]
+        a, b, c = _least_squares(design, (u for u, _ in target), 3)
+        d, e, f = _least_squares(design, (v for _, v in target), 3)
+        g = h = 0.0
+    else:
+        # Linearised (DLT) projective fit: u * (g x + h y + 1) = a x + b y + c, same for v.
+        design, rhs = [], []
+        for (x, y), (u, v) in zip(source, target):
+            design.append((x, y, 1.0, 0.0, 0.0, 0.0, -u * x, -u * y))
+            rhs.append(u)
+            design.append((0.0, 0.0, 0.0, x, y, 1.0, -v * x, -v * y))
+            rhs.append(v)
+        a, b, c, d, e, f, g, h = _least_squares(design, rhs, 8)
+
+    # Undo the normalisations: M = T_game^-1 * H * T_map.
+    normalized = ((a, b, c), (d, e, f), (g, h, 1.0))
+    to_map_frame = ((ms, 0.0, -mcx * ms), (0.0, ms, -mcy * ms), (0.0, 0.0, 1.0))
+    from_game_frame = ((1.0 / gs, 0.0, gcx), (0.0, 1.0 / gs, gcy), (0.0, 0.0, 1.0))
+    matrix = _multiply(from_game_frame, _multiply(normalized, to_map_frame))
+    w = matrix[2][2]
+    return tuple(tuple(value / w for value in row) for row in matrix)  # type: ignore[return-value]
+
+
+def _multiply(left: Matrix, right: Matrix) -> Matrix:
+    return tuple(
+        tuple(sum(left[i][k] * right[k][j] for k in range(3)) for j in range(3)) for i in range(3)
+    )  # type: ignore[return-value]
+
+
+def calibrate_from_points(points: list[ControlPoint], method: CalibrationMethod = "affine") -> CalibrationModel:
+    """Least-squares fit over all control points.
+
+    Two points give the axis-aligned scale/offset fit; ``affine`` needs three non-collinear points
+    and ``projective`` four. ``residuals`` holds each control point's game-space error.
+    """
+    if method not in ("affine", "projective"):
+        raise ValueError("method must be affine or projective")
+    if len(points) < 2:
+        raise ValueError("At least two control points are required")
+    if len(points) == 2:
+        return _two_point_model(points)
+    if method == "projective" and len(points) < 4:
+        raise ValueError("At least four control points are required for a projective calibration")
+
+    (a, b, c), (d, e, f), (g, h, _) = _fit_matrix(points, method)
+    model = CalibrationModel(
+        scale_x=a, scale_y=e, offset_x=c, offset_y=f, shear_x=b, shear_y=d, perspective_x=g, perspective_y=h
+    )
+    predicted = model.to_game_many([(point.map_x, point.map_y) for point in points])
+    residuals = [
+        math.hypot(game_x - point.game_x, game_y - point.game_y)
+        for (game_x, game_y), point in zip(predicted, points)
+    ]
+    return replace(model, residuals=residuals)
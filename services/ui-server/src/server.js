@@ -1,6 +1,6 @@
 import { createServer } from 'node:http';
 import { readFileSync, existsSync, readdirSync, statSync, mkdirSync, writeFileSync, unlinkSync } from 'node:fs';
-import { extname, resolve } from 'node:path';
+import { extname, relative, resolve, sep } from 'node:path';
 import { execFile, execFileSync } from 'node:child_process';
 import { fileURLToPath } from 'node:url';
 
@@ -11,6 +11,8 @@ const uploadsRoot = resolve(root, 'data/uploads/map-images');
 const tablesRoot = resolve(root, 'tables');
 const appsRoot = resolve(root, 'apps');
 const port = Number(process.env.UI_PORT ?? 8080);
+const ballisticsCoreUrl = process.env.BALLISTICS_CORE_URL ?? 'http://127.0.0.1:8000';
+const ballisticsCoreRetryMs = 10_000;
 const maxMapImageBytes = 150 * 1024 * 1024;
 
 const mimeTypes = {
@@ -79,7 +81,7 @@ function runPythonScript(script, filePath) {
   throw new Error(`Unable to parse NPZ table. Python runtime was not found. Tried: ${errors.join(' | ')}`);
 }
 
-function parseNpzTable(filePath) {
+function parseNpzTableLocally(filePath) {
   const script = `
 import json, zipfile, struct
 from pathlib import Path
@@ -168,20 +170,65 @@ print(json.dumps({
     }
 }))
 `
-  const raw = runPythonScript(script, filePath);
-  return JSON.parse(raw);
+  return runPythonScript(script, filePath);
 }
 
-function parseTableFile(filePath) {
+// Tables parsed by ballistics-core, revalidated with If-None-Match: relative path -> { etag, body }.
+const coreTableCache = new Map();
+// Subprocess fallback results, reused while the file is unchanged: path -> { mtimeMs, size, body }.
+const localTableCache = new Map();
+let ballisticsCoreUnavailableUntil = 0;
+
+async function fetchTableFromCore(filePath) {
+  const relativePath = relative(tablesRoot, filePath).split(sep).join('/');
+  const cached = coreTableCache.get(relativePath);
+  const response = await fetch(`${ballisticsCoreUrl}/tables?path=${encodeURIComponent(relativePath)}`, {
+    headers: cached?.etag ? { 'If-None-Match': cached.etag } : {},
+    signal: AbortSignal.timeout(2000),
+  });
+  if (response.status === 304 && cached) return cached.body;
+  if (!response.ok) throw new Error(`ballistics-core responded with ${response.status}`);
+
+  const entry = { etag: response.headers.get('etag'), body: await response.text() };
+  coreTableCache.set(relativePath, entry);
+  return entry.body;
+}
+
+function parseNpzTableCached(filePath) {
+  const { mtimeMs, size } = statSync(filePath);
+  const cached = localTableCache.get(filePath);
+  if (cached && cached.mtimeMs === mtimeMs && cached.size === size) return cached.body;
+
+  const body = parseNpzTableLocally(filePath);
+  localTableCache.set(filePath, { mtimeMs, size, body });
+  return body;
+}
+
+async function loadNpzTableBody(filePath) {
+  if (Date.now() >= ballisticsCoreUnavailableUntil) {
+    try {
+      return await fetchTableFromCore(filePath);
+    } catch {
+      ballisticsCoreUnavailableUntil = Date.now() + ballisticsCoreRetryMs;
+    }
+  }
+  return parseNpzTableCached(filePath);
+}
+
+async function loadTableBody(filePath) {
   const ext = extname(filePath).toLowerCase();
   if (ext === '.json') {
     const parsed = safeReadJson(filePath);
     if (!parsed) {
       throw new Error(`Invalid JSON table: ${filePath}`);
     }
-    return parsed;
+    return JSON.stringify(parsed);
   }
-  return parseNpzTable(filePath);
+  return loadNpzTableBody(filePath);
+}
+
+async function parseTableFile(filePath) {
+  return JSON.parse(await loadTableBody(filePath));
 }
 
 function inferMilsPerCircle(gunId, gunProfile = {}, primaryTable = null) {
@@ -283,7 +330,7 @@ async function buildWeaponFromCatalog(weaponId) {
   let primaryTable = null;
   if (primaryTableFile) {
     const filePath = resolve(projectilePath, primaryTableFile);
-    primaryTable = parseTableFile(filePath);
+    primaryTable = await parseTableFile(filePath);
   }
 
   return {
@@ -463,7 +510,9 @@ const server = createServer(async (req, res) => {
       return;
     }
     try {
-      sendJson(res, 200, parseTableFile(filePath));
+      const body = await loadTableBody(filePath);
+      res.writeHead(200, { 'Content-Type': 'application/json; charset=utf-8' });
+      res.end(body);
     } catch (error) {
       sendJson(res, 500, { error: String(error?.message || error || 'Failed to parse table.') });
     }
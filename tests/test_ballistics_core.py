@@ -1,13 +1,28 @@
-from pathlib import Path
+import asyncio
+import os
 import sys
+from dataclasses import replace
+from pathlib import Path
 
 import pytest
 
 sys.path.append("services/ballistics-core")
 
-from app import apply_correction_endpoint, solve_fire_mission_endpoint, triangulation_endpoint  # noqa: E402
+from app import (  # noqa: E402
+    apply_correction_endpoint,
+    solve_fire_mission_batch_endpoint,
+    solve_fire_mission_endpoint,
+    table_endpoint,
+    triangulation_endpoint,
+    triangulation_session_delete_endpoint,
+    triangulation_session_endpoint,
+    triangulation_session_update_endpoint,
+)
 from ballistics.models import (  # noqa: E402
+    AimPoint,
     AmmoType,
+    BatchFireMissionRequest,
+    BatteryGun,
     Coordinates,
     CorrectionRequest,
     FireMissionRequest,
@@ -16,6 +31,27 @@ from ballistics.models import (  # noqa: E402
     TriangulationRequest,
     WeatherInput,
 )
+from ballistics.protocol import load_protocol  # noqa: E402
+from ballistics.triangulation import triangulate  # noqa: E402
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _runtime_dirs(tmp_path_factory):
+    """Protocols and logs written during the run go to a temporary directory, not data/ and logs/."""
+    from ballistics import logging_setup, protocol
+
+    runtime = tmp_path_factory.mktemp("runtime")
+    protocol_dir = protocol.PROTOCOL_DIR
+    protocol.shutdown_protocols()
+    protocol.configure_journal(None)
+    protocol.PROTOCOL_DIR = runtime / "protocols"
+    logging_setup.shutdown_logging("ballistics-core")
+    logging_setup.configure_logger(log_dir=runtime / "logs")
+    yield runtime
+    protocol.shutdown_protocols()
+    protocol.configure_journal(None)
+    protocol.PROTOCOL_DIR = protocol_dir
+    logging_setup.shutdown_logging("ballistics-core")
 
 
 def test_solve_fire_mission_and_protocol_saved():
@@ -36,11 +72,12 @@ def test_solve_fire_mission_and_protocol_saved():
         charge=3,
         barrel_profile_id="m777",
     )
-    response = solve_fire_mission_endpoint(req)
+    response = asyncio.run(solve_fire_mission_endpoint(req))
 
     assert "solution" in response
-    protocol_file = Path("data/protocols") / f"{response['protocol_id']}.json"
-    assert protocol_file.exists()
+    protocol = load_protocol(response["protocol_id"])
+    assert protocol["mission_id"] == "mission-1"
+    assert protocol["operation"] == "solve-fire-mission"
 
 
 def test_apply_correction_and_triangulation():
@@ -60,7 +97,7 @@ def test_apply_correction_and_triangulation():
             TriangulationPoint(observer=Coordinates(x=1000, y=0), bearing_deg=315),
         ],
     )
-    triangulation_response = triangulation_endpoint("sound", triangulation_req)
+    triangulation_response = asyncio.run(triangulation_endpoint("sound", triangulation_req))
     assert triangulation_response["result"].confidence > 0
 
 
@@ -77,7 +114,7 @@ def test_triangulation_from_single_observer_polar_measurement():
         ],
     )
 
-    triangulation_response = triangulation_endpoint("crater", triangulation_req)
+    triangulation_response = asyncio.run(triangulation_endpoint("crater", triangulation_req))
     estimated = triangulation_response["result"].estimated_position
 
     assert estimated.x == 400
@@ -99,6 +136,1198 @@ def test_triangulation_rejects_negative_polar_distance():
     )
 
     with pytest.raises(Exception) as exc:
-        triangulation_endpoint("crater", triangulation_req)
+        asyncio.run(triangulation_endpoint("crater", triangulation_req))
 
     assert "distance_m must be >= 0" in str(exc.value)
+
+
+def test_triangulation_least_squares_rejects_outlier_bearing():
+    import math
+
+    target = (4000.0, 6000.0)
+    observers = [(x, y) for x in range(-2000, 2001, 500) for y in (-400, 0, 400)]
+    points = [
+        TriangulationPoint(
+            observer=Coordinates(x=x, y=y),
+            bearing_deg=math.degrees(math.atan2(target[0] - x, target[1] - y)),
+        )
+        for x, y in observers
+    ]
+    points[0].bearing_deg += 20
+
+    robust = asyncio.run(
+        triangulation_endpoint("sound", TriangulationRequest(mission_id="m-4", method="sound", points=points))
+    )
+    result = robust["result"]
+    assert result.estimated_position.x == pytest.approx(target[0], abs=1.0)
+    assert result.estimated_position.y == pytest.approx(target[1], abs=1.0)
+    assert result.outliers == [0]
+    assert 0 < result.error_ellipse.semi_minor_m <= result.error_ellipse.semi_major_m
+    assert result.covariance_m2[0][1] == result.covariance_m2[1][0]
+
+    plain = asyncio.run(
+        triangulation_endpoint(
+            "sound", TriangulationRequest(mission_id="m-4", method="sound", points=points, robust="none")
+        )
+    )["result"]
+    plain_error = math.hypot(plain.estimated_position.x - target[0], plain.estimated_position.y - target[1])
+    assert plain_error > 10
+
+
+def test_triangulation_session_updates_incrementally_and_expires():
+    import math
+
+    from ballistics.triangulation_sessions import TriangulationSessionStore
+
+    target = (4000.0, 6000.0)
+    points = [
+        TriangulationPoint(
+            observer=Coordinates(x=x, y=y),
+            bearing_deg=math.degrees(math.atan2(target[0] - x, target[1] - y)),
+        )
+        for x, y in [(-2000, 0), (0, -400), (2000, 0), (-1000, 400), (1000, 400)]
+    ]
+    outlier = TriangulationPoint(observer=Coordinates(x=500, y=0), bearing_deg=5)
+
+    first = triangulation_session_update_endpoint("sound", "cb-session", points[0])
+    assert first["accepted"] and first["result"] is None
+    for point in points[1:3]:
+        update = triangulation_session_update_endpoint("sound", "cb-session", point)
+    assert update["result"].estimated_position.x == pytest.approx(target[0], abs=0.5)
+
+    gated = triangulation_session_update_endpoint("sound", "cb-session", outlier)
+    assert not gated["accepted"] and gated["result"].outliers == [3]
+    for point in points[3:]:
+        triangulation_session_update_endpoint("sound", "cb-session", point)
+
+    refit = triangulation_session_endpoint("sound", "cb-session", refit=True)
+    batch = triangulate(TriangulationRequest(mission_id="cb-session", method="sound", points=[*points, outlier]))
+    assert refit["observations"] == 6
+    assert refit["result"].estimated_position == batch.estimated_position
+    assert refit["result"].outliers == [3]
+
+    triangulation_session_delete_endpoint("sound", "cb-session")
+    with pytest.raises(Exception) as exc:
+        triangulation_session_endpoint("sound", "cb-session")
+    assert exc.value.status_code == 404
+
+    store = TriangulationSessionStore(ttl_s=0.0)
+    store.add("cb-ttl", "crater", points[0])
+    assert store.get("cb-ttl", "crater") is None
+    assert store.expired == 1
+
+
+def test_map_calibration_least_squares_affine_and_batch_transforms():
+    import math
+    from array import array
+
+    from map_calibration import ControlPoint, calibrate_from_points
+
+    angle = math.radians(7)
+
+    def to_game(x, y):
+        return (
+            2.5 * (math.cos(angle) * x - math.sin(angle) * y) + 1000,
+            2.5 * (math.sin(angle) * x + math.cos(angle) * y) - 300,
+        )
+
+    corners = [(0, 0), (4000, 0), (0, 4000), (4000, 4000), (2000, 1000)]
+    points = [ControlPoint(x, y, *to_game(x, y)) for x, y in corners]
+    points[-1].game_x += 3.0
+
+    model = calibrate_from_points(points)
+    assert model.shear_x != 0 and model.is_affine
+    assert len(model.residuals) == len(points)
+    assert max(model.residuals) == model.residuals[-1] and 0 < model.rms_residual < 3.0
+    assert model.to_game(1000, 2000) == pytest.approx(to_game(1000, 2000), abs=2.0)
+
+    def flat(pairs):
+        return [value for pair in pairs for value in pair]
+
+    queries = [(10.0, 20.0), (3500.0, 1200.0)]
+    expected = [model.to_game(x, y) for x, y in queries]
+    assert flat(model.to_game_many(queries)) == pytest.approx(flat(expected))
+    assert list(model.to_game_many(array("d", flat(queries)))) == pytest.approx(flat(expected))
+    assert flat(model.to_map_many(expected)) == pytest.approx(flat(queries))
+
+    projective = calibrate_from_points(points, method="projective")
+    assert projective.rms_residual <= model.rms_residual + 1e-6
+
+    legacy = calibrate_from_points([points[0], points[3]])
+    assert legacy.shear_x == 0 and legacy.to_game(4000, 4000) == pytest.approx(to_game(4000, 4000))
+
+    with pytest.raises(ValueError):
+        calibrate_from_points([ControlPoint(i, i, i, i) for i in range(3)])
+
+
+def test_benchmark_compare_normalizes_by_reference_and_flags_regressions():
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location("ballistics_benchmarks", "services/ballistics-core/benchmarks/run.py")
+    benchmarks = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(benchmarks)
+
+    baseline = {
+        "meta": {"reference_s": 1e-4},
+        "results": {"solve": {"min_s": 1e-5}, "load": {"min_s": 2e-5}},
+    }
+    # The current machine is twice as slow overall; only "load" got slower beyond that.
+    current = {"solve": {"min_s": 2e-5}, "load": {"min_s": 6e-5}, "fresh": {"min_s": 1e-6}}
+    rows = {name: (ratio, verdict) for name, ratio, verdict in benchmarks.compare(baseline, current, 0.25, 2e-4)}
+
+    assert rows["solve"] == (pytest.approx(1.0), "ok")
+    assert rows["load"] == (pytest.approx(1.5), "REGRESSION")
+    assert rows["fresh"] == (None, "new")
+    assert set(benchmarks.BENCHMARKS) >= {"triangulate.200_observers", "save_protocol.enqueue"}
+
+
+def _m777_request(target: Coordinates, trajectory: str = "low", charge: int = 3) -> FireMissionRequest:
+    return FireMissionRequest(
+        mission_id="m777-table",
+        shooter=Coordinates(x=0, y=0),
+        target=target,
+        shooter_alt_m=100,
+        target_alt_m=100,
+        weather=WeatherInput(),
+        ammo_type=AmmoType.HE,
+        charge=charge,
+        barrel_profile_id="m777",
+        trajectory=trajectory,
+    )
+
+
+def test_table_engine_interpolates_npz_range_table():
+    from ballistics.data_store import find_ballistic_table_file, load_npz_table
+    from ballistics.table_engine import read_npz
+
+    table_file = find_ballistic_table_file("HE", "m777", "low")
+    arrays = read_npz(table_file)
+    table = load_npz_table(table_file)
+    assert load_npz_table(table_file) is table
+    assert table.charges == (1, 2, 3, 4, 5)
+
+    node = 400
+    table_range = arrays["range_c3"][node]
+    solution = table.solve(3, table_range)
+    assert solution.elevation_mil == pytest.approx(arrays["elev_mil"][node], abs=1e-3)
+    assert solution.flight_time_s == pytest.approx(arrays["tof_c3"][node], abs=1e-3)
+
+    midpoint = table.solve(3, (arrays["range_c3"][node] + arrays["range_c3"][node + 1]) / 2)
+    assert arrays["elev_mil"][node] < midpoint.elevation_mil < arrays["elev_mil"][node + 1]
+
+
+def test_solve_fire_mission_uses_table_for_high_and_low_trajectory():
+    target = Coordinates(x=3000, y=0)
+    low = asyncio.run(solve_fire_mission_endpoint(_m777_request(target, "low", 5)))["solution"]
+    high = asyncio.run(solve_fire_mission_endpoint(_m777_request(target, "high", 5)))["solution"]
+
+    assert low.azimuth_deg == 90
+    assert low.range_m == 3000
+    assert low.elevation_mils < 800 < high.elevation_mils
+    assert low.flight_time_s < high.flight_time_s
+
+
+def test_table_solution_applies_barrel_wear_and_leaves_weather_to_point_mass():
+    from ballistics.data_store import find_ballistic_table_file, load_npz_table
+    from ballistics.solver import compute_fire_mission
+
+    target = Coordinates(x=0, y=2500)
+    standard = compute_fire_mission(_m777_request(target))
+    # The M777 profile's wear_factor 0.98: the table is read where a new barrel's round would land.
+    table = load_npz_table(find_ballistic_table_file("M107_155MM_HE", "m777", "low"))
+    worn = table.solve(3, 2500 / 0.98**2)
+    assert standard.elevation_mils == pytest.approx(worn.elevation_mil, abs=0.001)
+    assert standard.flight_time_s == pytest.approx(worn.flight_time_s * 0.98, abs=0.001)
+
+    def solve(weather_model: str = "table", **weather) -> FireMissionResult:
+        req = replace(_m777_request(target), weather=WeatherInput(**weather), weather_model=weather_model)
+        return compute_fire_mission(req)
+
+    # Temperature and pressure stay at table standard in the table model...
+    assert solve(temperature_c=-10, pressure_hpa=1040) == standard
+    # ...and go through the air density in the point-mass model: denser air, more drag, aim higher.
+    cold = solve("point_mass", temperature_c=-10).elevation_mils
+    hot = solve("point_mass", temperature_c=35).elevation_mils
+    low_pressure = solve("point_mass", pressure_hpa=980).elevation_mils
+    assert hot < low_pressure < standard.elevation_mils < cold
+    assert cold - standard.elevation_mils < 20
+
+def test_solve_fire_mission_rejects_range_outside_table():
+    with pytest.raises(Exception) as exc:
+        asyncio.run(solve_fire_mission_endpoint(_m777_request(Coordinates(x=20000, y=0))))
+
+    assert "outside low trajectory limits" in str(exc.value)
+
+
+def test_data_store_caches_profiles_and_invalidates_on_mtime(tmp_path, monkeypatch):
+    import os
+
+    from ballistics import data_store
+
+    gun_dir = tmp_path / "Test-Gun"
+    gun_dir.mkdir()
+    profile_file = gun_dir / "profile.json"
+    profile_file.write_text('{"wear_factor": 0.9}', encoding="utf-8")
+
+    monkeypatch.setattr(data_store, "TABLES_DIR", tmp_path)
+    monkeypatch.setattr(data_store._json_cache, "revalidate_interval_s", 0)
+    data_store.clear_caches()
+
+    assert data_store.load_gun_profile("test-gun")["wear_factor"] == 0.9
+    assert data_store.load_gun_profile("TEST-GUN")["wear_factor"] == 0.9
+    stats = data_store.cache_stats()["json"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+    profile_file.write_text('{"wear_factor": 0.75}', encoding="utf-8")
+    mtime = profile_file.stat().st_mtime_ns + 1_000_000_000
+    os.utime(profile_file, ns=(mtime, mtime))
+
+    assert data_store.load_gun_profile("test-gun")["wear_factor"] == 0.75
+    assert data_store.cache_stats()["json"]["invalidations"] == 1
+    data_store.clear_caches()
+
+
+def test_compiled_tables_are_memory_mapped_and_ignored_when_stale(tmp_path):
+    import os
+    import shutil
+
+    from ballistics import compile_tables, data_store
+    from ballistics.table_engine import load_table
+
+    source = tmp_path / "ballistic_high.npz"
+    shutil.copy2(data_store.TABLES_DIR / "M777" / "M107_155MM_HE" / "ballistic_high.npz", source)
+    legacy = tmp_path / "he-charge-3.json"
+    shutil.copy2(data_store.BALLISTIC_TABLE_DIR / "he-charge-3.json", legacy)
+
+    assert compile_tables.run([source, legacy], check=True) == 1
+    assert compile_tables.run([source, legacy]) == 0
+    assert compile_tables.run([source, legacy], check=True) == 0
+
+    reference = load_table(source)
+    compiled = data_store._read_table(source)
+    assert isinstance(compiled.branch(3).ranges, memoryview)
+    assert compiled.charges == reference.charges
+    for charge in reference.charges:
+        branch = reference.branch(charge)
+        for range_m in (branch.min_range, (branch.min_range + branch.max_range) / 2, branch.max_range):
+            assert compiled.solve(charge, range_m) == reference.solve(charge, range_m)
+
+    assert data_store._read_table_json(legacy) == data_store._read_json(legacy)
+
+    mtime = source.stat().st_mtime_ns + 1_000_000_000
+    os.utime(source, ns=(mtime, mtime))
+    assert isinstance(data_store._read_table(source).branch(3).ranges, list)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    from ballistics.cache import LRUCache
+
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_batch_fire_mission_matches_single_solves(monkeypatch, vectorized):
+    from ballistics import batch
+
+    if vectorized and not batch.HAS_NUMPY:
+        pytest.skip("numpy is not installed")
+    monkeypatch.setattr(batch, "HAS_NUMPY", vectorized)
+
+    weather = WeatherInput(temperature_c=27, pressure_hpa=990, wind_speed_ms=6, wind_direction_deg=40)
+    guns = [BatteryGun(gun_id=f"gun-{i}", position=Coordinates(x=i * 50, y=0), alt_m=100 + i) for i in range(3)]
+    aim_points = [AimPoint(x=1200, y=2400), AimPoint(x=1300, y=2500, alt_m=80), AimPoint(x=40000, y=0)]
+    req = BatchFireMissionRequest(
+        mission_id="battery-1",
+        guns=guns,
+        aim_points=aim_points,
+        target_alt_m=120,
+        weather=weather,
+        ammo_type=AmmoType.HE,
+        charge=4,
+        barrel_profile_id="m777",
+    )
+
+    response = asyncio.run(solve_fire_mission_batch_endpoint(req))
+    result = response["result"]
+    assert result.solved == 6
+    assert result.failed == 3
+    assert len(result.solutions) == 9
+
+    second = result.solutions[1]
+    single = FireMissionRequest(
+        mission_id="battery-1",
+        shooter=guns[0].position,
+        target=Coordinates(x=1300, y=2500),
+        shooter_alt_m=100,
+        target_alt_m=80,
+        weather=weather,
+        ammo_type=AmmoType.HE,
+        charge=4,
+        barrel_profile_id="m777",
+    )
+    assert second.gun_id == "gun-0"
+    assert second.solution == asyncio.run(solve_fire_mission_endpoint(single))["solution"]
+    assert "outside low trajectory limits" in result.solutions[2].error
+
+
+def test_protocol_journal_rolls_over_compresses_and_applies_retention(tmp_path):
+    import threading
+
+    from ballistics.journal import SegmentJournal
+
+    journal = SegmentJournal(tmp_path, segment_max_bytes=512, compression="gzip", max_segments=4)
+    threads = [
+        threading.Thread(target=lambda i=i: journal.append({"protocol_id": str(i), "payload": "x" * 40}))
+        for i in range(40)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+
+    segments = journal.segments()
+    assert len(segments) <= 4
+    assert all(path.suffix == ".gz" for path in segments[:-1])
+
+    ids = [record["protocol_id"] for record in journal.iter_records()]
+    assert len(ids) == len(set(ids))
+    assert "39" in ids or "38" in ids
+
+    reopened = SegmentJournal(tmp_path, segment_max_bytes=512, max_segments=4)
+    reopened.append({"protocol_id": "after-restart"})
+    assert list(reopened.iter_records())[-1]["protocol_id"] == "after-restart"
+    reopened.close()
+
+
+class _GatedJournal:
+    def __init__(self):
+        import threading
+
+        self.gate = threading.Event()
+        self.records = []
+
+    def append_many(self, payloads):
+        self.gate.wait(5)
+        self.records.extend(payloads)
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("policy", ["drop-oldest", "reject"])
+def test_protocol_writer_backpressure_and_flush_on_close(policy):
+    from ballistics.protocol_writer import ProtocolQueueFull, ProtocolWriter
+
+    journal = _GatedJournal()
+    writer = ProtocolWriter(journal, maxsize=2, batch_size=10, policy=policy)
+    writer.submit({"n": 0})
+    assert not writer.flush(timeout=0.2)  # first record is held by the gated journal
+
+    writer.submit({"n": 1})
+    writer.submit({"n": 2})
+    if policy == "reject":
+        with pytest.raises(ProtocolQueueFull):
+            writer.submit({"n": 3})
+    else:
+        writer.submit({"n": 3})
+
+    journal.gate.set()
+    assert writer.close(timeout=5)
+    written = [record["n"] for record in journal.records]
+    if policy == "reject":
+        assert written == [0, 1, 2]
+        assert writer.rejected == 1
+    else:
+        assert written == [0, 2, 3]
+        assert writer.dropped == 1
+
+
+def test_protocol_query_pages_by_cursor_and_exports_ndjson(tmp_path):
+    import json
+
+    from ballistics import protocol
+    from ballistics.journal import SegmentJournal
+
+    previous_writer = protocol.configure_writer(None)
+    if previous_writer is not None:
+        previous_writer.close()
+    previous_journal = protocol.configure_journal(SegmentJournal(tmp_path, segment_max_bytes=2048))
+    try:
+        ids = [
+            protocol.save_protocol(f"mission-{i % 2}", "apply-correction", {"n": i}, {}).protocol_id
+            for i in range(30)
+        ]
+
+        first = protocol.query_protocols(mission_id="mission-1", limit=10)
+        second = protocol.query_protocols(mission_id="mission-1", cursor=first["next_cursor"], limit=10)
+        assert [item["input_data"]["n"] for item in first["items"] + second["items"]] == list(range(1, 30, 2))
+        assert second["next_cursor"] is None
+        assert protocol.query_protocols(operation="solve-fire-mission")["items"] == []
+        assert protocol.query_protocols(until="2000-01-01T00:00:00")["items"] == []
+        assert protocol.load_protocol(ids[7])["input_data"] == {"n": 7}
+
+        exported = [json.loads(line) for line in protocol.export_protocols(mission_id="mission-0")]
+        assert [item["protocol_id"] for item in exported] == ids[::2]
+
+        with pytest.raises(ValueError):
+            protocol.query_protocols(since="yesterday")
+
+        # Retention drops the index rows of the segments it removes, so pages stay full.
+        protocol.shutdown_protocols()
+        protocol.configure_journal(
+            SegmentJournal(tmp_path / "retained", segment_max_bytes=2048, compression=None, max_segments=3)
+        )
+        for i in range(120):
+            protocol.save_protocol("mission-r", "apply-correction", {"n": i}, {})
+            protocol.flush_protocols()
+        journal, index = protocol.get_journal(), protocol.get_index()
+        assert len(journal.segments()) == 3
+        kept = [json.loads(line)["input_data"]["n"] for _, _, line in journal.scan()]
+        assert len(index.query(limit=1000)) == len(kept) < 120
+
+        # A segment removed after its rows were queried (or by another process) is skipped.
+        journal.segments()[0].unlink()
+        kept = [json.loads(line)["input_data"]["n"] for _, _, line in journal.scan()]
+        pages, cursor = [], None
+        while True:
+            page = protocol.query_protocols(cursor=cursor, limit=7)
+            pages.append([item["input_data"]["n"] for item in page["items"]])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert all(len(page) == 7 for page in pages[:-1])
+        assert sum(pages, []) == kept
+    finally:
+        protocol.shutdown_protocols()
+        protocol.configure_journal(previous_journal)
+
+
+def _write_protocols_as_worker(directory, slot, count):
+    from ballistics import protocol, warmup
+    from ballistics.journal import SegmentJournal
+    from ballistics.protocol_index import ProtocolIndex
+
+    # Forked from the test process: drop its writer, whose thread did not survive the fork.
+    protocol.configure_writer(None)
+    os.environ[warmup.WORKER_ENV] = str(slot)
+    protocol.configure_journal(
+        SegmentJournal(directory, segment_max_bytes=2048, stream=warmup.worker_name()),
+        ProtocolIndex(directory / protocol.PROTOCOL_INDEX_FILE),
+    )
+    for i in range(count):
+        protocol.save_protocol(f"mission-{slot}", "apply-correction", {"slot": slot, "n": i}, {})
+    protocol.shutdown_protocols()
+
+
+def test_forked_workers_write_separate_protocol_streams_into_one_index(tmp_path, monkeypatch):
+    import json
+    import multiprocessing
+
+    from ballistics import protocol, warmup
+    from ballistics.journal import SegmentJournal
+    from ballistics.logging_setup import configure_logger, shutdown_logging
+    from ballistics.protocol_index import ProtocolIndex
+
+    workers = [
+        multiprocessing.get_context("fork").Process(target=_write_protocols_as_worker, args=(tmp_path, slot, 60))
+        for slot in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+
+    journal = SegmentJournal(tmp_path)
+    assert journal.streams() == ["worker-0", "worker-1", "worker-2"]
+    assert all(path.suffix == ".gz" for stream in journal.streams() for path in journal.segments(stream)[:-1])
+
+    previous_writer = protocol.configure_writer(None)
+    if previous_writer is not None:
+        previous_writer.close()
+    previous_journal = protocol.configure_journal(journal, ProtocolIndex(tmp_path / protocol.PROTOCOL_INDEX_FILE))
+    try:
+        records = [json.loads(line) for line in protocol.export_protocols()]
+        assert len(records) == 180
+        assert sorted((r["input_data"]["slot"], r["input_data"]["n"]) for r in records) == [
+            (slot, n) for slot in range(3) for n in range(60)
+        ]
+        for record in records[::17]:
+            assert protocol.load_protocol(record["protocol_id"]) == record
+        page = protocol.query_protocols(mission_id="mission-2", limit=1000)["items"]
+        assert [item["input_data"]["n"] for item in page] == list(range(60))
+    finally:
+        protocol.shutdown_protocols()
+        protocol.configure_journal(previous_journal)
+
+    monkeypatch.setenv(warmup.WORKER_ENV, "1")
+    configure_logger("forked-worker-log", log_dir=tmp_path).warning("from worker 1")
+    shutdown_logging("forked-worker-log")
+    assert (tmp_path / "forked-worker-log-worker-1.log").exists()
+
+
+def test_table_endpoint_serves_cached_columnar_and_binary_tables_with_etag():
+    import json
+
+    from ballistics.compiled_format import CompiledBuffer
+
+    path = "M777/M107_155MM_HE/ballistic_low.npz"
+    response = table_endpoint(path, "json", None)
+    assert response.status_code == 200
+    table = json.loads(response.body)
+    assert table["charges"] == ["1", "2", "3", "4", "5"]
+    assert "rangeTable" not in table["byCharge"]["1"]
+    assert len(table["byCharge"]["3"]["range"]) == len(table["elevMil"])
+
+    etag = response.headers["ETag"]
+    assert table_endpoint(path, "json", etag).status_code == 304
+
+    binary = table_endpoint(path, "binary", etag)
+    assert binary.status_code == 200
+    compiled = CompiledBuffer(binary.body)
+    assert compiled.attributes["trajectory"] == "low"
+    assert compiled.entries["range_c3"]["offset"] % 16 == 0
+    assert compiled.array("range_c3")[0] == pytest.approx(table["byCharge"]["3"]["range"][0])
+
+    with pytest.raises(Exception) as exc:
+        table_endpoint("../services/ballistics-core/app.py", "json", None)
+    assert "tables/" in str(exc.value.detail)
+
+
+def test_metrics_endpoint_exposes_latency_counters_and_cache_ratios():
+    from app import metrics_endpoint
+    from ballistics import metrics
+
+    req = TriangulationRequest(
+        mission_id="metrics-1",
+        method="sound",
+        points=[
+            TriangulationPoint(observer=Coordinates(x=0, y=0), bearing_deg=45),
+            TriangulationPoint(observer=Coordinates(x=1000, y=0), bearing_deg=315),
+        ],
+    )
+    before = metrics.requests_total.value(endpoint="POST /triangulation/{method}", status="200")
+    asyncio.run(triangulation_endpoint("sound", req))
+    with pytest.raises(Exception):
+        asyncio.run(triangulation_endpoint("radar", req))
+    table_endpoint("M777/M107_155MM_HE/ballistic_low.npz", "json", None)
+
+    response = metrics_endpoint()
+    assert response.media_type.startswith("text/plain; version=0.0.4")
+    text = response.body.decode("utf-8")
+    assert metrics.requests_total.value(endpoint="POST /triangulation/{method}", status="200") == before + 1
+    assert 'ballistics_request_errors_total{endpoint="POST /triangulation/{method}",status="400"}' in text
+    assert 'ballistics_request_duration_seconds_bucket{endpoint="POST /triangulation/{method}",le="+Inf"}' in text
+    assert 'ballistics_function_duration_seconds_count{function="triangulate"}' in text
+    assert 'ballistics_operations_total{operation="triangulation-sound"}' in text
+    assert 'ballistics_cache_hit_ratio{cache="table_service.encoded"}' in text
+    assert "ballistics_protocol_queue_depth " in text
+    assert "# TYPE ballistics_request_duration_seconds histogram" in text
+
+
+def test_profiler_captures_next_requests_to_pstats_and_collapsed_stacks(tmp_path, monkeypatch):
+    import pstats
+
+    from app import profile_start_endpoint, profile_status_endpoint, profile_stop_endpoint
+    from ballistics import profiling
+
+    with pytest.raises(Exception) as exc:
+        profile_start_endpoint(requests=2)
+    assert exc.value.status_code == 404
+
+    monkeypatch.setenv(profiling.ENABLE_ENV, "1")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    assert profile_start_endpoint(requests=2)["requests_remaining"] == 2
+    with pytest.raises(Exception) as exc:
+        profile_start_endpoint(requests=2)
+    assert exc.value.status_code == 409
+
+    req = FireMissionRequest(
+        mission_id="profile-1",
+        shooter=Coordinates(x=0, y=0),
+        target=Coordinates(x=400, y=700),
+        shooter_alt_m=120,
+        target_alt_m=130,
+        weather=WeatherInput(wind_speed_ms=2, wind_direction_deg=90),
+        ammo_type=AmmoType.HE,
+        charge=3,
+        barrel_profile_id="m777",
+    )
+    from ballistics.data_store import clear_caches
+
+    clear_caches()
+    asyncio.run(solve_fire_mission_endpoint(req))
+    assert profile_status_endpoint()["requests_remaining"] == 1
+    asyncio.run(solve_fire_mission_endpoint(req))
+
+    status = profile_status_endpoint()
+    assert status["active"] is False
+    last = status["last"]
+    assert last["profiled_calls"] >= 2
+    functions = {name for _, _, name in pstats.Stats(last["pstats"]).stats}
+    assert {"solve_fire_mission", "load_npz_table", "save_protocol"} <= functions
+    collapsed = Path(last["collapsed"]).read_text(encoding="utf-8").splitlines()
+    assert any("solver.solve_fire_mission" in line and "data_store." in line for line in collapsed)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed)
+
+    with pytest.raises(Exception) as exc:
+        profile_stop_endpoint()
+    assert exc.value.status_code == 404
+
+
+def test_logging_queue_writes_json_lines_and_samples_info(tmp_path):
+    import json
+    import logging
+
+    from ballistics.logging_setup import QueueHandler, configure_logger, shutdown_logging
+
+    logger = configure_logger("ballistics-test", json_lines=True, info_sample_rate=0.25, log_dir=tmp_path)
+    assert all(isinstance(handler, QueueHandler) for handler in logger.handlers)
+    try:
+        for index in range(8):
+            logger.info("correction %d", index, extra={"mission_id": "m-1", "operation": "apply-correction"})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed", extra={"mission_id": "m-1", "duration_ms": 1.5})
+    finally:
+        shutdown_logging("ballistics-test")
+    assert not logger.handlers
+
+    lines = [json.loads(line) for line in (tmp_path / "ballistics-test.jsonl").read_text(encoding="utf-8").splitlines()]
+    infos = [line for line in lines if line["level"] == "INFO"]
+    assert [line["message"] for line in infos] == ["correction 0", "correction 4"]
+    assert infos[0]["mission_id"] == "m-1" and infos[0]["operation"] == "apply-correction"
+    error = json.loads((tmp_path / "ballistics-test-errors.jsonl").read_text(encoding="utf-8"))
+    assert error["duration_ms"] == 1.5 and "ValueError: boom" in error["exception"]
+    assert logging.getLogger("ballistics-core").handlers
+
+
+def test_solution_cache_quantizes_requests_and_invalidates_on_table_change(tmp_path, monkeypatch):
+    import math
+    import os
+    import shutil
+
+    from ballistics import data_store, solver
+    from ballistics.solution_cache import SolutionCache
+
+    shutil.copytree(data_store.TABLES_DIR / "M777", tmp_path / "M777")
+    monkeypatch.setattr(data_store, "TABLES_DIR", tmp_path)
+    for cache in (data_store._directory_index, data_store._json_cache, data_store._table_cache):
+        monkeypatch.setattr(cache, "revalidate_interval_s", 0)
+    data_store.clear_caches()
+    cache = SolutionCache(ttl_s=60, revalidate_interval_s=0)
+
+    def request(x: float, wind_direction: float) -> FireMissionRequest:
+        return FireMissionRequest(
+            mission_id="registered-target",
+            shooter=Coordinates(x=0, y=0),
+            target=Coordinates(x=x, y=2400),
+            shooter_alt_m=120,
+            target_alt_m=160,
+            weather=WeatherInput(wind_speed_ms=6, wind_direction_deg=wind_direction),
+            ammo_type=AmmoType.HE,
+            charge=5,
+            barrel_profile_id="m777",
+        )
+
+    first = cache.get_or_solve(request(3200.3, 250.2), solver.compute_fire_mission)
+    centre = solver.compute_fire_mission(request(3200, 250))
+    # The bucket centre's solution, stamped with each request's own range and azimuth.
+    assert first == replace(centre, range_m=round(math.hypot(3200.3, 2400), 3), azimuth_deg=first.azimuth_deg)
+    assert first.azimuth_deg != centre.azimuth_deg
+    hit = cache.get_or_solve(request(3199.8, 249.9), solver.compute_fire_mission)
+    assert hit == replace(first, range_m=round(math.hypot(3199.8, 2400), 3), azimuth_deg=hit.azimuth_deg)
+    assert cache.with_request_geometry(request(3200.3, 250.2), hit) == first
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert cache.key(request(3200, 359.7)) == cache.key(request(3200, 0.2))
+
+    table = tmp_path / "M777" / "M107_155MM_HE" / "ballistic_low.npz"
+    mtime = table.stat().st_mtime_ns + 1_000_000_000
+    os.utime(table, ns=(mtime, mtime))
+    assert cache.get_or_solve(request(3200, 250), solver.compute_fire_mission) == centre
+    assert cache.stats()["invalidations"] == 1
+
+    cache.ttl_s = 0
+    cache.get_or_solve(request(3200, 250), solver.compute_fire_mission)
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["misses"] == 3
+    data_store.clear_caches()
+
+
+def test_auto_charge_ranks_all_charges_and_trajectories_within_gun_limits():
+    from ballistics.solver import compute_fire_mission
+
+    def request(target: Coordinates, selection: str = "min_time_of_flight") -> FireMissionRequest:
+        return FireMissionRequest(
+            mission_id="auto-1",
+            shooter=Coordinates(x=0, y=0),
+            target=target,
+            shooter_alt_m=100,
+            target_alt_m=120,
+            weather=WeatherInput(wind_speed_ms=5, wind_direction_deg=200),
+            ammo_type=AmmoType.HE,
+            charge="auto",
+            barrel_profile_id="m777",
+            selection=selection,
+        )
+
+    response = asyncio.run(solve_fire_mission_endpoint(request(Coordinates(x=500, y=3800))))
+    fastest = response["solution"]
+    options = [fastest, *fastest.alternatives]
+    # Every charge reaching 3833 m in the direct table has the same row in the low one.
+    assert {option.trajectory for option in options} == {"low", "high"}
+    assert len({(option.charge, option.elevation_mils) for option in options}) == len(options)
+    assert (fastest.charge, fastest.elevation_mils) not in {
+        (option.charge, option.elevation_mils) for option in fastest.alternatives
+    }
+    assert [option.flight_time_s for option in options] == sorted(option.flight_time_s for option in options)
+    assert all(-58 <= option.elevation_mils <= 1250 for option in options)
+
+    fixed = compute_fire_mission(
+        replace(request(Coordinates(x=500, y=3800)), charge=fastest.charge, trajectory=fastest.trajectory)
+    )
+    assert (fixed.elevation_mils, fixed.flight_time_s) == (fastest.elevation_mils, fastest.flight_time_s)
+
+    flattest = compute_fire_mission(request(Coordinates(x=500, y=3800), "flattest"))
+    assert flattest.trajectory != "high"
+    heights = [option.max_ordinate_m for option in flattest.alternatives]
+    assert heights == sorted(heights)
+
+    with pytest.raises(Exception) as exc:
+        asyncio.run(solve_fire_mission_endpoint(request(Coordinates(x=4000, y=500))))
+    assert "traverse sector" in str(exc.value.detail)
+    with pytest.raises(ValueError, match="outside gun limits"):
+        compute_fire_mission(request(Coordinates(x=0, y=9000)))
+
+
+def test_coverage_raster_streams_tiles_matching_auto_charge_solutions():
+    import base64
+    import json
+
+    np = pytest.importorskip("numpy")
+    from app import coverage_endpoint
+    from ballistics.coverage import coverage_cache, get_coverage, stream_coverage
+    from ballistics.models import CoverageRequest
+    from ballistics.solver import compute_fire_mission
+
+    coverage_cache.clear()
+    weather = WeatherInput(temperature_c=5, pressure_hpa=1025, wind_speed_ms=5, wind_direction_deg=200)
+    req = CoverageRequest(shooter=Coordinates(x=1000, y=2000), barrel_profile_id="m777", weather=weather, tile_size=32)
+    raster = get_coverage(req)
+    assert get_coverage(replace(req, tile_size=16)) is raster
+    assert coverage_cache.stats()["hits"] == 1
+
+    header, *tiles = [json.loads(line) for line in stream_coverage(raster, req.tile_size)]
+    assert header["traverse_sector_deg"] == 30 and header["max_range_m"] <= 5500
+    assert header["reachable_cells"] == sum(
+        int((np.frombuffer(base64.b64decode(tile["charge"]), dtype="<i1") >= 0).sum()) for tile in tiles
+    )
+
+    tile = tiles[len(tiles) // 2]
+    charges = np.frombuffer(base64.b64decode(tile["charge"]), dtype="<i1").reshape(tile["height"], tile["width"])
+    elevations = np.frombuffer(base64.b64decode(tile["elevation_mils"]), dtype="<f4").reshape(charges.shape)
+    row, col = (int(index[0]) for index in np.nonzero(charges >= 0))
+    target = Coordinates(
+        x=header["origin_x"] + (tile["col"] + col + 0.5) * header["resolution_m"],
+        y=header["origin_y"] + (tile["row"] + row + 0.5) * header["resolution_m"],
+    )
+    solution = compute_fire_mission(
+        FireMissionRequest(
+            mission_id="coverage-1",
+            shooter=req.shooter,
+            target=target,
+            shooter_alt_m=0,
+            target_alt_m=0,
+            weather=weather,
+            ammo_type=AmmoType.HE,
+            charge="auto",
+            barrel_profile_id="m777",
+        )
+    )
+    assert solution.charge == charges[row, col]
+    assert solution.elevation_mils == pytest.approx(float(elevations[row, col]), abs=0.01)
+
+    # Every reachable cell lies within the 30 degree sector around north.
+    rows, cols = np.nonzero(raster.reachable)
+    dx = raster.origin_x + (cols + 0.5) * raster.resolution_m - req.shooter.x
+    dy = raster.origin_y + (rows + 0.5) * raster.resolution_m - req.shooter.y
+    assert np.abs(np.degrees(np.arctan2(dx, dy))).max() <= 15
+
+    with pytest.raises(Exception) as exc:
+        asyncio.run(coverage_endpoint(replace(req, tile_size=0)))
+    assert exc.value.status_code == 400
+    coverage_cache.clear()
+
+
+def test_terrain_heightmap_fills_omitted_altitudes(tmp_path, monkeypatch):
+    from ballistics import data_store
+    from ballistics.batch import solve_fire_mission_batch
+    from ballistics.solver import compute_fire_mission, fill_altitudes
+    from ballistics.terrain import write_terrain
+    from map_calibration import CalibrationModel
+
+    # 10 m samples, row 0 along the northern edge; heights form a plane, which bilinear
+    # interpolation reproduces exactly.
+    width, height = 300, 400
+    calibration = CalibrationModel(scale_x=10, scale_y=-10, offset_x=-500, offset_y=3500)
+    values = [
+        -9999.0 if (row, col) == (5, 5) else 100 + 0.01 * (col * 10 - 500) + 0.02 * (3500 - row * 10)
+        for row in range(height)
+        for col in range(width)
+    ]
+    header = tmp_path / "heightmap.json"
+    write_terrain(header, width, height, values, calibration, nodata=-9999)
+    monkeypatch.setenv(data_store.TERRAIN_ENV, str(header))
+    data_store.clear_caches()
+    try:
+        terrain = data_store.load_terrain()
+        assert terrain.height(1234.5, 2345.5) == pytest.approx(100 + 12.345 + 46.91, abs=1e-3)
+        assert terrain.height(-600, 0) is None
+        assert terrain.height(-450, 3450) is None  # next to the nodata sample
+        points = [(1234.5, 2345.5), (-600, 0), (2400.1, -300.7)]
+        assert terrain.heights(points) == pytest.approx([terrain.height(x, y) for x, y in points], abs=1e-3)
+        assert terrain.tile_stats()["size"] >= 1
+
+        req = FireMissionRequest(
+            mission_id="terrain-1",
+            shooter=Coordinates(x=0, y=0),
+            target=Coordinates(x=500, y=2400),
+            weather=WeatherInput(),
+            ammo_type=AmmoType.HE,
+            charge=3,
+            barrel_profile_id="m777",
+        )
+        response = asyncio.run(solve_fire_mission_endpoint(req))
+        explicit = replace(req, shooter_alt_m=terrain.height(0, 0), target_alt_m=terrain.height(500, 2400))
+        assert response["solution"] == compute_fire_mission(explicit)
+        assert load_protocol(response["protocol_id"])["input_data"]["target_alt_m"] == pytest.approx(153)
+
+        batch = solve_fire_mission_batch(
+            BatchFireMissionRequest(
+                mission_id="terrain-2",
+                guns=[BatteryGun(gun_id="g1", position=Coordinates(x=0, y=0))],
+                aim_points=[AimPoint(x=500, y=2400), AimPoint(x=500, y=1400)],
+                weather=WeatherInput(),
+                ammo_type=AmmoType.HE,
+                charge=3,
+                barrel_profile_id="m777",
+            )
+        )
+        assert batch.solutions[0].solution == response["solution"]
+        assert batch.solutions[1].solution.elevation_mils != batch.solutions[0].solution.elevation_mils
+
+        with pytest.raises(ValueError, match="No terrain height at the target"):
+            fill_altitudes(replace(req, target=Coordinates(x=5000, y=0)))
+
+        # The original positional order still binds, and an altitude passed positionally
+        # is rejected rather than taken for the weather.
+        assert list(req.model_dump())[:9] == [
+            "mission_id", "shooter", "target", "shooter_alt_m", "target_alt_m",
+            "weather", "ammo_type", "charge", "barrel_profile_id",
+        ]
+        assert FireMissionRequest(
+            "terrain-3", req.shooter, req.target, WeatherInput(), AmmoType.HE, 3, "m777"
+        ) == replace(req, mission_id="terrain-3")
+        with pytest.raises(TypeError):
+            FireMissionRequest(
+                "terrain-3", req.shooter, req.target, 100, 100, WeatherInput(), AmmoType.HE, 3, "m777"
+            )
+    finally:
+        data_store.clear_caches()
+
+
+def test_point_mass_integrator_reproduces_table_and_corrects_for_weather():
+    import math
+
+    from ballistics.data_store import find_ballistic_table_file, load_npz_table
+    from ballistics.solver import compute_fire_mission
+    from ballistics.table_engine import read_npz
+    from ballistics.trajectory import PointMassModel, fan_cache
+
+    table_file = find_ballistic_table_file("HE", "m777", "low")
+    arrays = read_npz(table_file)
+    table = load_npz_table(table_file)
+    mils_per_rad = 6400 / (2 * math.pi)
+    model = PointMassModel(table.meta)
+    velocity = fan_cache.muzzle_velocity(table_file, 3, mils_per_rad)
+
+    # The fitted velocity flies the table's own rows, crosswind drift included.
+    rows = [200, 600, 1000]
+    elevations = [float(arrays["elev_mil"][row]) / mils_per_rad for row in rows]
+    flown = model.integrate([velocity] * 3, elevations, cross_wind_ms=table.meta["wind_eps"])
+    for lane, row in enumerate(rows):
+        assert flown["range"][lane] == pytest.approx(float(arrays["range_c3"][row]), abs=2.0)
+        assert flown["tof"][lane] == pytest.approx(float(arrays["tof_c3"][row]), abs=0.05)
+        assert flown["drift"][lane] == pytest.approx(float(arrays["drift1_c3"][row]), abs=0.1)
+    # The pure-Python fallback integrates the same way.
+    fallback = model._integrate_python([velocity], elevations[:1], model.drag_per_mass, [0.0], [1.0], 0.0)
+    assert fallback["range"][0] == pytest.approx(flown["range"][0], abs=1e-6)
+
+    # In the table's standard atmosphere the correction vanishes.
+    target = Coordinates(x=0, y=3000)
+    standard = compute_fire_mission(_m777_request(target))
+    icao = replace(_m777_request(target), weather=WeatherInput(humidity_pct=0), weather_model="point_mass")
+    assert compute_fire_mission(icao).elevation_mils == pytest.approx(standard.elevation_mils, abs=0.01)
+
+    # Thin hot air flies further, a head wind shorter, and a higher target needs more elevation.
+    thin = compute_fire_mission(replace(icao, weather=WeatherInput(temperature_c=35, pressure_hpa=950)))
+    head_wind = compute_fire_mission(replace(icao, weather=WeatherInput(humidity_pct=0, wind_speed_ms=10)))
+    uphill = compute_fire_mission(replace(icao, target_alt_m=300))
+    assert thin.elevation_mils < standard.elevation_mils < head_wind.elevation_mils < uphill.elevation_mils
+    assert head_wind.drift_m == pytest.approx(0.0, abs=0.01)
+
+    # A worn barrel at range D flies like a new one at D / wear**2: table row and correction fans alike.
+    from ballistics.trajectory import solve_point_mass
+
+    cold = WeatherInput(temperature_c=-10, wind_speed_ms=8, wind_direction_deg=60)
+    worn = solve_point_mass(table_file, 3, 2500, 0, 0, cold, mils_per_rad, wear_factor=0.9)
+    new = solve_point_mass(table_file, 3, 2500 / 0.81, 0, 0, cold, mils_per_rad)
+    assert worn.elevation_mils == pytest.approx(new.elevation_mils, abs=0.002)
+    assert worn.flight_time_s == pytest.approx(new.flight_time_s * 0.9, abs=0.002)
+    assert worn.drift_m == pytest.approx(new.drift_m * 0.9, abs=0.002)
+
+    with pytest.raises(ValueError, match="fixed charge"):
+        compute_fire_mission(replace(icao, charge="auto"))
+
+
+def test_build_tables_reproduces_npz_layout_and_resumes_from_checkpoints(tmp_path, monkeypatch):
+    import json
+
+    from ballistics import build_tables, data_store
+    from ballistics.table_engine import read_npz
+
+    shipped_dir = data_store.TABLES_DIR / "M777" / "M107_155MM_HE"
+    projectile_dir = tmp_path / "M777" / "M107_155MM_HE"
+    projectile_dir.mkdir(parents=True)
+    (tmp_path / "M777" / "profile.json").write_text((data_store.TABLES_DIR / "M777" / "profile.json").read_text())
+    profile = json.loads((shipped_dir / "profile.json").read_text())
+    profile.update(
+        muzzle_velocity_by_charge={"1": 140, "5": 428}, step_mil=25, trajectories={"low": [25, 650]}
+    )
+    (projectile_dir / "profile.json").write_text(json.dumps(profile))
+    spec = build_tables.load_spec(projectile_dir)
+
+    # Interrupt the run after charge 1: its checkpoint survives and the rerun only sweeps charge 5.
+    sweep = build_tables.sweep_charge
+
+    def interrupted(spec, charge):
+        if charge == 5:
+            raise KeyboardInterrupt
+        return sweep(spec, charge)
+
+    monkeypatch.setattr(build_tables, "sweep_charge", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        build_tables.build([spec], workers=1, report=lambda message: None)
+    assert spec.checkpoint(1).is_file() and not spec.outputs()
+
+    monkeypatch.setattr(build_tables, "sweep_charge", sweep)
+    messages: list[str] = []
+    assert build_tables.build([spec], workers=1, report=messages.append) == [projectile_dir / "ballistic_low.npz"]
+    assert messages[0].startswith("resumed    M777/M107_155MM_HE charge 1")
+    assert messages[1].startswith("[1/1] M777/M107_155MM_HE charge 5")
+    assert not (projectile_dir / build_tables.CHECKPOINT_DIR).exists()
+
+    built = read_npz(projectile_dir / "ballistic_low.npz")
+    shipped = read_npz(shipped_dir / "ballistic_low.npz")
+    assert list(built) == [name for name in shipped if not name.endswith(("_c2", "_c3", "_c4"))]
+    assert list(built["charges_id"]) == [1, 5]
+    rows = [round(elevation * 2) for elevation in built["elev_mil"]]
+    for name in ("range_c1", "tof_c5", "maxy_c5", "drift1_c5", "rdelta1_c5"):
+        assert list(built[name]) == pytest.approx([shipped[name][row] for row in rows], rel=1e-5, abs=1e-4)
+
+    # One more step of span is another checkpoint, and a checkpoint that does not cover the
+    # elevations (e.g. left behind by the narrower span) is swept again instead of resumed.
+    wider = replace(spec, spans={"low": (25, 675)})
+    assert wider.checkpoint(1) != spec.checkpoint(1)
+    build_tables._write_atomic(wider.checkpoint(1), build_tables.sweep_charge(spec, 1)[0])
+    messages.clear()
+    build_tables.build([wider], workers=1, report=messages.append)
+    assert messages[0] == f"discarded  M777/M107_155MM_HE charge 1: {wider.checkpoint(1).name} does not match the profile"
+    assert len(read_npz(projectile_dir / "ballistic_low.npz")["range_c1"]) == len(wider.elevations()) == 27
+
+
+def test_models_are_slotted_and_round_trip_through_compiled_codecs():
+    import json
+    from datetime import datetime, timezone
+
+    from ballistics.models import ChargeOption, ProtocolRecord
+    from ballistics.protocol import serialize_protocol
+
+    req = replace(_m777_request(Coordinates(x=0, y=3000)), charge="auto", shooter_alt_m=None)
+    assert not hasattr(req, "__dict__")
+    payload = req.model_dump(mode="json")
+    assert payload["ammo_type"] == "HE" and payload["charge"] == "auto" and payload["shooter_alt_m"] is None
+    assert payload["shooter"] == {"x": 0, "y": 0}
+    assert FireMissionRequest.model_validate(json.loads(req.model_dump_json())) == req
+    # Omitted optional fields take their defaults, missing required ones are rejected.
+    required = ("mission_id", "shooter", "target", "weather", "ammo_type", "charge", "barrel_profile_id")
+    minimal = {key: payload[key] for key in required}
+    assert FireMissionRequest.model_validate(minimal).trajectory == "low"
+    with pytest.raises(ValueError, match="missing field 'target'"):
+        FireMissionRequest.model_validate({key: value for key, value in minimal.items() if key != "target"})
+    with pytest.raises(ValueError):
+        FireMissionRequest.model_validate({**minimal, "ammo_type": "NUKE"})
+
+    result = FireMissionResult(
+        azimuth_deg=1, elevation_mils=2, flight_time_s=3, range_m=4, drift_m=5, charge=3, trajectory="low",
+        alternatives=[
+            ChargeOption(charge=4, trajectory="high", elevation_mils=1, flight_time_s=2, max_ordinate_m=3, drift_m=4)
+        ],
+    )
+    assert FireMissionResult.model_validate(result.model_dump()) == result
+
+    created_at = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    input_data = {"nested": {"values": [1, 2]}}
+    record = ProtocolRecord("p-1", "m-1", created_at, "solve-fire-mission", input_data, {})
+    serialized = serialize_protocol(record)
+    assert serialized["created_at"] == "2026-01-02T03:04:05+00:00"
+    assert serialized["input_data"] is input_data
+    assert ProtocolRecord.model_validate(serialized) == record
+
+
+def test_warm_start_loads_every_source_and_gates_readiness(tmp_path):
+    from app import ready_endpoint
+    from ballistics import compile_tables, warmup
+    from ballistics.logging_setup import configure_logger, shutdown_logging
+
+    warmup.reset()
+    with pytest.raises(Exception) as exc:
+        ready_endpoint()
+    assert exc.value.status_code == 503 and "cold" in exc.value.detail
+
+    state = warmup.warm_start()
+    assert state.ready and not state.errors
+    assert state.tables == len(compile_tables.default_sources())
+    assert state.profiles >= 1
+    ready = ready_endpoint()
+    assert ready["status"] == "ready" and ready["tables"] == state.tables
+    assert warmup.warm_start() is state
+    assert warmup.warm_in_background() is None
+
+    log_dir = tmp_path / "logs"
+    logger = configure_logger("ballistics-lazy", log_dir=log_dir)
+    assert not log_dir.exists()
+    logger.info("first record")
+    shutdown_logging("ballistics-lazy")
+    assert (log_dir / "ballistics-lazy.log").exists()
+
+
+def test_concurrent_loads_and_solves_share_one_flight_and_pools_shed_load(tmp_path):
+    import threading
+    import time
+
+    from ballistics import offload
+    from ballistics.cache import FileCache
+    from ballistics.offload import PoolConfig, PoolSaturated, PoolTimeout, WorkPool
+
+    path = tmp_path / "table.json"
+    path.write_text("{}", encoding="utf-8")
+    cache = FileCache()
+    loads = []
+
+    def slow_load(p):
+        loads.append(p)
+        time.sleep(0.05)
+        return {"path": str(p)}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load(path, slow_load))) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1 and len(results) == 6 and all(result is results[0] for result in results)
+    assert cache.stats()["coalesced"] == 5
+
+    gate = threading.Event()
+    calls = []
+
+    def blocked(value):
+        calls.append(value)
+        gate.wait(5)
+        return value * 2
+
+    async def burst():
+        pool = WorkPool("test", PoolConfig(workers=1, queue=1, timeout_s=5))
+        slow = WorkPool("slow", PoolConfig(workers=1, queue=1, timeout_s=0.1))
+        try:
+            first = asyncio.ensure_future(pool.run(blocked, 21, key="same"))
+            second = asyncio.ensure_future(pool.run(blocked, 21, key="same"))
+            queued = asyncio.ensure_future(pool.run(blocked, 1))
+            await asyncio.sleep(0.05)
+            with pytest.raises(PoolSaturated):
+                await pool.run(blocked, 2)
+            running = asyncio.ensure_future(slow.run(blocked, 3))
+            await asyncio.sleep(0)
+            with pytest.raises(PoolTimeout):
+                await slow.run(blocked, 4)
+            with pytest.raises(PoolTimeout):
+                await running
+            gate.set()
+            assert await first == await second == 42 and await queued == 2
+            return pool.stats(), slow.stats()
+        finally:
+            gate.set()
+            pool.shutdown()
+            slow.shutdown()
+
+    stats, slow_stats = asyncio.run(burst())
+    # The timed-out call was still queued, so it was dropped without running.
+    assert sorted(calls) == [1, 3, 21]
+    assert stats["coalesced"] == 1 and stats["rejected"] == 1 and stats["submitted"] == 2
+    assert slow_stats["timeouts"] == 2 and slow_stats["submitted"] == 2
+
+    gate.clear()
+    offload.configure_pool("solve", PoolConfig(workers=1, queue=0, timeout_s=5))
+
+    async def overloaded():
+        busy = asyncio.ensure_future(offload.run("solve", blocked, 0))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(Exception) as exc:
+                await solve_fire_mission_endpoint(_m777_request(Coordinates(x=500, y=4000)))
+        finally:
+            gate.set()
+            await busy
+        return exc.value
+
+    error = asyncio.run(overloaded())
+    offload.shutdown_pools()
+    assert error.status_code == 503 and error.headers == {"Retry-After": "1"}
+
+
+def test_load_harness_drives_mixed_workload_in_process_and_reports_percentiles(tmp_path):
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location("ballistics_load", "services/ballistics-core/benchmarks/load.py")
+    load = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = load  # dataclasses look their module up while being created
+    spec.loader.exec_module(load)
+
+    workload = load.build_workload(seed=3, distinct=16, max_observers=12)
+    assert "M777" in workload.guns and len(workload.missions) == len(workload.solutions) >= 8
+
+    report = load.run_in_process(workload, keep_protocols=tmp_path, concurrency=4, duration_s=None, requests=60)
+    assert report["requests"] == 60 and report["errors"] == 0 and report["statuses"] == {"200": 60}
+    assert set(report["operations"]) == {"solve", "correction", "triangulation"}
+    latency = report["latency_ms"]
+    assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    assert sum(band["requests"] for band in report["triangulation_by_observers"].values()) == (
+        report["operations"]["triangulation"]["requests"]
+    )
+    assert report["protocols"]["writer"]["written"] == 60
+    assert report["protocols"]["growth_bytes"] > 0 and report["protocols"]["directory"] == str(tmp_path)
+
+    assert load.parse_mix("solve=2,triangulation") == {"solve": 2.0, "triangulation": 1.0}
+    assert load.percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0